@@ -0,0 +1,282 @@
+"""
+
+Benchmark is used to measure the performance of the communication on any Linux machine, without the ROV.
+
+** Functionality **
+
+Running the module runs the server with a simulated Arduino for each identifier in the server's 'ARDUINO_IDS' (on
+pseudo-terminals), drives it with a scripted surface client at the given rate, and then streams synthetic frames through
+a video stream to a local client (see the 'simulation' module). The following measurements are printed at the end:
+
+    - Control - the rate of the messages sent by the surface client, and the rate of the exchanges with each Arduino.
+    - Round trip - the percentiles of the time between sending a message to the server and receiving its reply.
+    - Surface to thruster - the percentiles of the time between sending a new thruster value to the server and the
+      simulated Arduino receiving it.
+    - Video - the rate of the frames received and the average number of bytes per frame.
+    - Messages - the size of the surface's command and of the server's reply (holding each of the surface's transmission
+      keys), and the time to encode and decode each of them, with each codec of the 'message_encoding' module.
+    - Metrics - the totals of the counters and the percentiles of the histograms recorded by the communication itself
+      (see the 'metrics' module).
+
+Use the '--help' option to see the options.
+
+** Example **
+
+To measure the control at 200 messages per second, and the raw video frames, for 10 seconds each, call:
+
+    python benchmark.py --rate 200 --codec raw --duration 10
+
+To measure the control with the surface's messages encoded as MessagePack, call:
+
+    python benchmark.py --surface-codec msgpack
+
+"""
+
+import communication.data_manager as dm
+from argparse import ArgumentParser
+from bisect import bisect_right
+from communication.framing import FrameParser
+from communication.metrics import snapshot, summary
+from communication.server import Server, ARDUINO_IDS
+from communication.simulation import SimulatedArduino, SurfaceClient, SyntheticCapture, THRUSTER
+from communication.message_encoding import CodecError, CODECS as MESSAGE_CODECS, DEFAULT_CODEC
+from communication.video_encoding import CODECS
+from communication.video_stream import VideoStream
+from socket import create_connection
+from time import monotonic, perf_counter, sleep
+
+# Declare the percentiles reported
+PERCENTILES = (50, 90, 99)
+
+# Declare the number of times each message is encoded and decoded
+ITERATIONS = 10000
+
+
+def _summary(values: list) -> str:
+    """
+
+    Function used to format the percentiles of the given times.
+
+    :param values: Times (seconds)
+    :return: Percentiles and the maximum, in milliseconds
+
+    """
+
+    if not values:
+        return "no samples"
+
+    values = sorted(values)
+    parts = ["p{} {:.2f}".format(p, values[min(len(values) - 1, len(values) * p // 100)] * 1000) for p in PERCENTILES]
+
+    return "{}, max {:.2f} ms ({} samples)".format(", ".join(parts), values[-1] * 1000, len(values))
+
+
+def _latencies(sent: list, received: list) -> list:
+    """
+
+    Function used to match the thruster values received by the Arduino with the messages they were sent in.
+
+    :param sent: List of the time and the data of each message sent
+    :param received: List of the time and the thruster value of each change received
+    :return: List of the times it took for each value to arrive
+
+    """
+
+    # Collect the times each value was sent at
+    times = {}
+    for timestamp, data in sent:
+        if THRUSTER in data:
+            times.setdefault(data[THRUSTER], []).append(timestamp)
+
+    # Match each value received with the last time it was sent before
+    latencies = []
+    for timestamp, value in received:
+        position = bisect_right(times.get(value, ()), timestamp)
+        if position:
+            latencies.append(timestamp - times[value][position - 1])
+
+    return latencies
+
+
+def _messages() -> dict:
+    """
+
+    Function used to build the messages exchanged with the surface, with a realistic value of each key.
+
+    :return: Dictionary mapping the name of each message to its data
+
+    """
+
+    # Inner function to pick a value by the type of the key - a pulse width, a reading, or a status
+    def value(number: int, key: str):
+        kind = next((name for prefix, name in dm.TYPES.items() if key.startswith(prefix)), None)
+        if kind is None:
+            return number % 2
+        return 1500 + 10 * number if kind.startswith("int") else 0.123456789 * (number + 1)
+
+    return {
+        "command": {key: value(number, key) for number, key in enumerate(sorted(dm.DEFAULT))},
+        "reply": {key: value(number, key) for number, key in enumerate(sorted(dm.transmission_keys(dm.SURFACE)))}
+    }
+
+
+def benchmark_control(port: int, rate: float, duration: float, codec=DEFAULT_CODEC):
+    """
+
+    Function used to measure the exchanges between the surface, the server and the Arduino-s.
+
+    :param port: Server's port
+    :param rate: Number of messages sent by the surface per second
+    :param duration: Time (seconds) to measure for
+    :param codec: Name of the codec negotiated by the surface client
+
+    """
+
+    # Record each change of the thruster value received by the thrusters' Arduino
+    received = []
+
+    def on_data(timestamp, data):
+        if THRUSTER in data and (not received or received[-1][1] != data[THRUSTER]):
+            received.append((timestamp, data[THRUSTER]))
+
+    # Create and start the simulated Arduino-s
+    arduinos = [SimulatedArduino(arduino_id, callback=on_data if arduino_id == dm.ARDUINO_T else None)
+                for arduino_id in ARDUINO_IDS]
+    for arduino in arduinos:
+        arduino.start()
+
+    # Run the server with the simulated Arduino-s
+    server = Server(ip="127.0.0.1", port=port, ports=[arduino.port for arduino in arduinos])
+    server.run()
+
+    try:
+
+        # Wait for each Arduino to be connected
+        deadline = monotonic() + 10
+        while not all(arduino.exchanges for arduino in arduinos) and monotonic() < deadline:
+            sleep(0.1)
+
+        # Drive the server as the surface does
+        client = SurfaceClient("127.0.0.1", port, rate=rate, codec=codec)
+        exchanges = [arduino.exchanges for arduino in arduinos]
+        start = monotonic()
+        count = client.run(duration)
+        elapsed = monotonic() - start
+        exchanges = [arduino.exchanges - before for arduino, before in zip(arduinos, exchanges)]
+
+    finally:
+        server.stop()
+
+    # Inform about the results
+    print("Control ({}): {:.1f} messages per second sent by the surface, Arduino exchanges per second: {}".format(
+        codec, count / elapsed, ", ".join("{} {:.1f}".format(arduino_id, exchange / elapsed)
+                                          for arduino_id, exchange in zip(ARDUINO_IDS, exchanges))))
+    print("Round trip: {}".format(_summary(client.round_trips)))
+    print("Surface to thruster: {}".format(_summary(_latencies(client.sent, received))))
+
+
+def benchmark_video(port: int, codec: str, fps: float, resolution: tuple, duration: float):
+    """
+
+    Function used to measure the frames streamed by a video stream.
+
+    :param port: Stream's port
+    :param codec: Name of the codec to encode the frames with
+    :param fps: Number of frames generated per second
+    :param resolution: Tuple of width and height of the frames
+    :param duration: Time (seconds) to measure for
+
+    """
+
+    # Create the synthetic camera and stream its frames
+    capture = SyntheticCapture(fps=fps, resolution=resolution)
+    stream = VideoStream("127.0.0.1", port, codec=codec, transport="stream", source=capture.ring(0))
+
+    # Let the program exit while the stream waits for another client
+    stream._process.daemon = True
+    stream.run()
+    capture.start()
+
+    # Receive the frames for the given duration
+    client = create_connection(("127.0.0.1", port))
+    parser = FrameParser("length", max_size=1 << 26)
+    frames, size = 0, 0
+
+    start = monotonic()
+    while monotonic() - start < duration:
+        for message in parser.feed(client.recv(1 << 20)):
+            frames += 1
+            size += len(message)
+
+    elapsed = monotonic() - start
+    client.close()
+
+    # Inform about the results
+    print("Video ({}, {}x{}): {:.1f} frames per second, {:.0f} bytes per frame".format(
+        codec, *resolution, frames / elapsed, size / max(frames, 1)))
+
+
+def benchmark_messages(iterations=ITERATIONS):
+    """
+
+    Function used to measure the size of the messages exchanged with the surface, and the time to encode and decode
+    them, with each codec.
+
+    :param iterations: Number of times each message is encoded and decoded
+
+    """
+
+    messages = _messages()
+
+    for name, codec in MESSAGE_CODECS.items():
+        try:
+            codec = codec()
+        except CodecError as e:
+            print("Messages ({}): {}".format(name, e))
+            continue
+
+        parts = []
+
+        # Measure the encoding and the decoding separately, each message is copied as if it was sent
+        for message, data in messages.items():
+            start = perf_counter()
+            for _ in range(iterations):
+                encoded = bytes(codec.encode(data))
+            encoding = (perf_counter() - start) / iterations
+
+            start = perf_counter()
+            for _ in range(iterations):
+                codec.decode(encoded)
+            decoding = (perf_counter() - start) / iterations
+
+            parts.append("{} {} bytes, encode {:.1f} us, decode {:.1f} us".format(
+                message, len(encoded), encoding * 1e6, decoding * 1e6))
+
+        print("Messages ({}): {}".format(name, ", ".join(parts)))
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Measure the communication with the hardware simulated")
+    parser.add_argument("--duration", type=float, default=5, help="Time (seconds) to measure each part for")
+    parser.add_argument("--rate", type=float, default=100, help="Messages sent by the surface per second")
+    parser.add_argument("--port", type=int, default=50200, help="Server's port, the video stream uses the next one")
+    parser.add_argument("--codec", choices=CODECS, default="jpeg", help="Codec to encode the frames with")
+    parser.add_argument("--surface-codec", choices=MESSAGE_CODECS, default=DEFAULT_CODEC,
+                        help="Codec negotiated by the surface client")
+    parser.add_argument("--fps", type=float, default=30, help="Frames generated per second")
+    parser.add_argument("--width", type=int, default=640, help="Width of the frames")
+    parser.add_argument("--height", type=int, default=480, help="Height of the frames")
+    arguments = parser.parse_args()
+
+    # Start with empty data
+    dm.clear()
+
+    # Measure the control first, since the server's processes must be started before any threads
+    benchmark_control(arguments.port, arguments.rate, arguments.duration, arguments.surface_codec)
+    benchmark_video(arguments.port + 1, arguments.codec, arguments.fps, (arguments.width, arguments.height),
+                    arguments.duration)
+    benchmark_messages()
+
+    # Inform about the communication's own measurements
+    print(summary(snapshot()))
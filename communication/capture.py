@@ -0,0 +1,325 @@
+"""
+
+Capture is used to grab the frames of each camera independently, in the background.
+
+** Functionality **
+
+By importing the module you gain access to the classes 'FrameRing' and 'CaptureService'.
+
+You should create an instance of 'CaptureService' with an iterable of camera sources (indices or paths accepted by
+cv2's 'VideoCapture') and use the 'start' function to start grabbing. By default, each camera is grabbed in its own
+thread, so a slow camera never throttles the others. Set the optional 'synchronised' parameter to True to instead grab
+all cameras at once from a single thread (for example for stereo vision) - the frames grabbed together then share the
+same sequence number and timestamp.
+
+Each camera writes into its own 'FrameRing', accessible with the 'ring' function. A ring is a fixed number of frames,
+allocated once (when the first frame's shape is known) and reused afterwards, together with the sequence number and
+the monotonic timestamp of each frame. You should use the 'latest' function of a ring (as a context manager) to access
+the newest frame - the frame won't be overwritten until the context is exited, so it can be read without copying. You
+should use the 'wait' function to block until a frame newer than the given sequence number is available.
+
+A ring can be passed as the 'source' of a 'VideoStream', which then always sends the newest frame of the camera.
+
+** Constants and other values **
+
+You should modify the '_RECONNECT_DELAY' constant to change the delay (seconds) between attempts to open a camera.
+
+** Example **
+
+To capture two cameras, and stream the first one, call:
+
+    capture = CaptureService((0, 1))
+    capture.start()
+
+    video_stream = VideoStream(source=capture.ring(0))
+
+To process the newest frame of the second camera, call:
+
+    with capture.ring(1).latest() as (frame, sequence, timestamp):
+        process(frame)
+
+"""
+
+from contextlib import contextmanager
+from threading import Condition, Thread
+from time import monotonic, sleep
+
+# Declare the delay between attempts to open a camera
+_RECONNECT_DELAY = 1
+
+
+class FrameRing:
+
+    def __init__(self, size=4):
+        """
+
+        Function used to initialise the ring.
+
+        :param size: Number of frames in the ring (at least 2, one extra frame for each concurrent reader is advised)
+
+        """
+
+        # Make sure a frame can be written while the newest one is read
+        if size < 2:
+            raise ValueError("Frame ring must hold at least 2 frames")
+
+        # Store the size information
+        self._size = size
+
+        # Declare the frames, allocated once the first frame's shape is known
+        self._frames = None
+
+        # Initialise the sequence number, timestamp and the number of readers of each frame
+        self._sequences = [0] * size
+        self._timestamps = [0.0] * size
+        self._readers = [0] * size
+
+        # Initialise the index of the newest frame
+        self._newest = None
+
+        # Initialise the condition used to protect the state and wait for new frames
+        self._condition = Condition()
+
+    def allocate(self, shape, dtype):
+        """
+
+        Function used to allocate the frames, unless they are already allocated with the same shape and type.
+
+        :param shape: Shape of each frame
+        :param dtype: Type of each frame's values
+
+        """
+
+        from numpy import empty
+
+        with self._condition:
+
+            # Reallocate only if the frames have changed
+            if self._frames is None or self._frames.shape[1:] != tuple(shape) or self._frames.dtype != dtype:
+                self._frames = empty((self._size,) + tuple(shape), dtype=dtype)
+                self._newest = None
+
+    @property
+    def allocated(self) -> bool:
+        return self._frames is not None
+
+    def acquire(self):
+        """
+
+        Function used to select the frame to write next - the oldest frame which isn't the newest and isn't being read.
+
+        :return: Tuple of the frame's index and the frame, or None if all frames are being read
+
+        """
+
+        with self._condition:
+
+            # Find the frames that can be overwritten
+            free = [index for index in range(self._size) if index != self._newest and not self._readers[index]]
+
+            if not free:
+                return None
+
+            # Select the oldest one
+            index = min(free, key=self._sequences.__getitem__)
+
+            return index, self._frames[index]
+
+    def commit(self, index: int, sequence: int, timestamp: float):
+        """
+
+        Function used to mark a written frame as the newest one.
+
+        :param index: Index of the frame
+        :param sequence: Sequence number of the frame
+        :param timestamp: Monotonic time at which the frame was grabbed
+
+        """
+
+        with self._condition:
+            self._sequences[index] = sequence
+            self._timestamps[index] = timestamp
+            self._newest = index
+
+            # Wake up the readers waiting for a new frame
+            self._condition.notify_all()
+
+    @contextmanager
+    def latest(self):
+        """
+
+        Function used to access the newest frame, which isn't overwritten until the context is exited.
+
+        :return: Tuple of the frame (None if no frame was grabbed yet), its sequence number and timestamp
+
+        """
+
+        with self._condition:
+
+            # Return an empty frame if there's none
+            if self._newest is None:
+                index = None
+            else:
+                index = self._newest
+                self._readers[index] += 1
+
+        # Yield the empty frame
+        if index is None:
+            yield None, 0, 0.0
+            return
+
+        # Yield the frame and release it once it's read
+        try:
+            yield self._frames[index], self._sequences[index], self._timestamps[index]
+        finally:
+            with self._condition:
+                self._readers[index] -= 1
+
+    @property
+    def sequence(self) -> int:
+        with self._condition:
+            return 0 if self._newest is None else self._sequences[self._newest]
+
+    def wait(self, sequence: int, timeout=None) -> bool:
+        """
+
+        Function used to block until a frame newer than the given one is available.
+
+        :param sequence: Sequence number of the last frame seen
+        :param timeout: Maximum time (seconds) to wait for, or None to wait indefinitely
+        :return: True if a newer frame is available
+
+        """
+
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._newest is not None and self._sequences[self._newest] > sequence, timeout)
+
+
+class CaptureService:
+
+    def __init__(self, sources, *, synchronised=False, ring_size=4):
+        """
+
+        Function used to initialise the capture of each camera.
+
+        :param sources: Iterable of camera sources
+        :param synchronised: Boolean to specify if all cameras should be grabbed at once from a single thread
+        :param ring_size: Number of frames in the ring of each camera
+
+        """
+
+        # Store the sources information
+        self._sources = tuple(sources)
+
+        # Create a ring for each camera
+        self._rings = tuple(FrameRing(ring_size) for _ in self._sources)
+
+        # Create a single thread for all cameras, or a thread for each camera
+        if synchronised:
+            self._threads = (Thread(target=self._run, args=(range(len(self._sources)),), daemon=True),)
+        else:
+            self._threads = tuple(Thread(target=self._run, args=((i,),), daemon=True) for i in range(len(self._sources)))
+
+    def ring(self, index: int) -> FrameRing:
+        return self._rings[index]
+
+    def _open(self, indices, captures=None) -> list:
+        """
+
+        Function used to open the cameras, retrying until all of them are opened.
+
+        :param indices: Indices of the cameras to open
+        :param captures: List of the captures already created (the open ones are kept), or None to open all cameras
+        :return: List of the opened captures
+
+        """
+
+        from cv2 import VideoCapture
+
+        # Declare the captures
+        if captures is None:
+            captures = [None] * len(indices)
+
+        while True:
+
+            # Attempt to open each camera that isn't open yet
+            for i, index in enumerate(indices):
+                if captures[i] is None or not captures[i].isOpened():
+                    captures[i] = VideoCapture(self._sources[index])
+
+            # Finish once all cameras are open
+            if all(capture.isOpened() for capture in captures):
+                return captures
+
+            print("Failed to open cameras {}, retrying...".format([self._sources[i] for i in indices]))
+            sleep(_RECONNECT_DELAY)
+
+    def _run(self, indices):
+        """
+
+        Function used to continuously grab the frames of the given cameras.
+
+        Grabbing all cameras first, and only then decoding the frames, keeps the frames of multiple cameras as close in
+        time as possible.
+
+        :param indices: Indices of the cameras to grab
+
+        """
+
+        # Open the cameras
+        captures = self._open(indices)
+
+        # Initialise the sequence number
+        sequence = 0
+
+        while True:
+
+            # Grab the frames of all cameras
+            results = [capture.grab() for capture in captures]
+            timestamp = monotonic()
+            sequence += 1
+
+            # Decode and store each frame
+            for grabbed, capture, index in zip(results, captures, indices):
+                ring = self._rings[index]
+
+                # Re-open the camera if the frame couldn't be grabbed, keeping the other cameras open
+                if not grabbed:
+                    capture.release()
+                    captures = self._open(indices, captures)
+                    break
+
+                # Allocate the ring using the first frame
+                if not ring.allocated:
+                    success, frame = capture.retrieve()
+                    if success:
+                        ring.allocate(frame.shape, frame.dtype)
+                    continue
+
+                # Select the frame to write into, skip the frame if all frames are being read
+                acquired = ring.acquire()
+                if acquired is None:
+                    continue
+
+                # Decode the frame directly into the ring
+                slot, buffer = acquired
+                success, frame = capture.retrieve(buffer)
+
+                # Handle the resolution changes by reallocating the ring
+                if success and frame is not buffer:
+                    ring.allocate(frame.shape, frame.dtype)
+                    continue
+
+                if success:
+                    ring.commit(slot, sequence, timestamp)
+
+    def start(self):
+        """
+
+        Function used to start grabbing the frames.
+
+        """
+
+        for thread in self._threads:
+            thread.start()
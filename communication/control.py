@@ -0,0 +1,170 @@
+"""
+
+Control is used to hand the surface's commands straight to the Arduino driving them, ahead of the rest of the data.
+
+** Functionality **
+
+By importing the module you gain access to the class 'ControlChannel'.
+
+You should create an instance of 'ControlChannel' for each Arduino with the keys of its commands (for example the
+thrusters' keys). Normally, you don't need to do it yourself - the data manager creates a channel for each Arduino
+transmitting any keys starting with one of its 'CONTROL_PREFIXES', and uses it within its 'set_many' and 'get_many'
+functions (see the 'data_manager' module).
+
+Use the 'submit' function to write the changed commands into the channel, together with the monotonic time they were
+received at. Each submission is numbered, and marked as pending until the 'confirm' function is called with its number
+and the version of the data manager's transaction which applied the same commands (unless a newer submission was made
+since). Use the 'read' function to consistently read the number, the confirmed version, the time and the values of the
+latest commands, from any process.
+
+The channel is kept in an anonymous shared memory segment, created with the channel and inherited by every process
+forked afterwards. It's guarded by a sequence counter, so the readers never lock, and only take a consistent copy of the
+values (as in the 'storage' module). Each command is stored in a fixed slot, holding its value encoded as in the
+'storage' module - only the values up to 8 bytes long (numbers, booleans and None) can be submitted, the other values
+are ignored.
+
+** Example **
+
+Let the thrusters' Arduino be sent the "Thr_FP" and "Thr_FS" keys. To hand it a new command, call:
+
+    channel = ControlChannel(("Thr_FP", "Thr_FS"))
+    channel.submit({"Thr_FP": 1700}, monotonic())
+
+To read the latest commands, call:
+
+    number, confirmed, timestamp, commands = channel.read()
+
+"""
+
+from communication.storage import _encode, _decode
+from mmap import mmap
+from multiprocessing import Lock
+from struct import Struct
+
+# Declare the layouts of the channel header (sequence counter, number of the submission, version of the transaction
+# confirming it and the time it was received at) and of each command's slot (tag, size and payload of the value)
+_HEADER = Struct("<I4xQQd")
+_SLOT = Struct("<cB6x8s")
+
+# Declare the maximum size of a value, and the tag of an unset slot
+_PAYLOAD_SIZE = 8
+_EMPTY = b"\x00"
+
+
+class ControlChannel:
+
+    def __init__(self, keys):
+        """
+
+        Function used to allocate the shared memory segment of the channel.
+
+        :param keys: Iterable of the keys of the commands
+
+        """
+
+        # Assign each key a slot, in alphabetical order
+        self._keys = tuple(sorted(keys))
+        self._slots = {key: slot for slot, key in enumerate(self._keys)}
+
+        # Allocate the anonymous shared segment
+        self._memory = mmap(-1, _HEADER.size + len(self._keys) * _SLOT.size)
+
+        # Initialise the lock shared by all writers
+        self._lock = Lock()
+
+    @property
+    def keys(self) -> tuple:
+        return self._keys
+
+    @staticmethod
+    def _offset(slot: int) -> int:
+        return _HEADER.size + slot * _SLOT.size
+
+    def submit(self, data: dict, timestamp: float) -> int:
+        """
+
+        Function used to write the commands which have changed into the channel, as a new pending submission.
+
+        :param data: Dictionary of key, value pairs of data, the keys without a slot are ignored
+        :param timestamp: Monotonic time at which the data was received
+        :return: Number of the submission, or 0 if no command has changed
+
+        """
+
+        # Encode the commands fitting the slots
+        slots = []
+        for key, value in data.items():
+            if key in self._slots:
+                tag, payload = _encode(value)
+                if len(payload) <= _PAYLOAD_SIZE:
+                    slots.append((self._slots[key], _SLOT.pack(tag, len(payload), payload)))
+
+        with self._lock:
+
+            # Skip the submission if no command has changed
+            slots = [(slot, packed) for slot, packed in slots
+                     if self._memory[self._offset(slot):self._offset(slot) + _SLOT.size] != packed]
+
+            if not slots:
+                return 0
+
+            # Mark the start of the write
+            sequence, number, _, _ = _HEADER.unpack_from(self._memory, 0)
+            _HEADER.pack_into(self._memory, 0, (sequence + 1) & 0xFFFFFFFF, number, 0, timestamp)
+
+            # Write the commands
+            for slot, packed in slots:
+                self._memory[self._offset(slot):self._offset(slot) + _SLOT.size] = packed
+
+            # Mark the end of the write, as a new pending submission
+            _HEADER.pack_into(self._memory, 0, (sequence + 2) & 0xFFFFFFFF, number + 1, 0, timestamp)
+
+        return number + 1
+
+    def confirm(self, number: int, version: int):
+        """
+
+        Function used to mark a submission as applied to the data manager, unless a newer one was submitted since.
+
+        :param number: Number of the submission
+        :param version: Version of the transaction which applied the commands
+
+        """
+
+        with self._lock:
+            sequence, latest, _, timestamp = _HEADER.unpack_from(self._memory, 0)
+
+            # Keep the newer submission pending
+            if latest != number:
+                return
+            _HEADER.pack_into(self._memory, 0, (sequence + 1) & 0xFFFFFFFF, number, 0, timestamp)
+            _HEADER.pack_into(self._memory, 0, (sequence + 2) & 0xFFFFFFFF, number, version, timestamp)
+
+    def read(self) -> tuple:
+        """
+
+        Function used to consistently read the latest commands.
+
+        :return: Tuple of the number of the latest submission (0 if there was none), the version which confirmed it (0
+                 while it's pending), the time it was received at and the dictionary of all commands submitted so far
+
+        """
+
+        # Retry until the commands were read without a concurrent write
+        while True:
+
+            # Read the header before the read, retry if a write is in progress
+            sequence, number, confirmed, timestamp = _HEADER.unpack_from(self._memory, 0)
+
+            if sequence & 1:
+                continue
+
+            # Read each slot
+            slots = [_SLOT.unpack_from(self._memory, self._offset(slot)) for slot in range(len(self._keys))]
+
+            # Finish if nothing was written in the meantime
+            if sequence == _HEADER.unpack_from(self._memory, 0)[0]:
+                break
+
+        return number, confirmed, timestamp, {key: _decode(tag, payload[:size])
+                                              for key, (tag, size, payload) in zip(self._keys, slots) if tag != _EMPTY}
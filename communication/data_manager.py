@@ -4,7 +4,14 @@ Data Manager is used to maintain different states of data across the system.
 
 ** Functionality **
 
-By importing the module you gain access to three global functions - 'get_data', 'set_data' and 'clear'.
+By importing the module you gain access to thirteen global functions - 'get_data', 'set_data', 'get_many', 'set_many',
+'wait_data', 'wait_descriptor', 'last_command', 'transmission_keys', 'key_types', 'clear', 'create', 'use_backend' and
+'use_recorder'.
+
+The data manager itself is only created when any of the functions is first called, so importing the module (for
+example to use its constants) is instant and touches no memory segments or files. Since the processes must share the
+same data manager, it must be created before any processes are started - the 'Server' does so when it's created, and
+you should use the 'create' function to do so explicitly otherwise. Calling it again does nothing.
 
 You should use the 'get_data' function to gain access to the available resources. You must specify the identifier, to
 let the manager know which device should it change the data for. You may specify additional arguments, which should be
@@ -20,8 +27,52 @@ You should use the 'set_data' function to change the resources. You must specify
 which device should it change the data for. For each keyword argument passed, the state of the data dictionary under the
 given key will be changed to the given value.
 
+You should use the 'get_many' and 'set_many' functions to access or change multiple values at once, for example all
+values received in a single packet. The 'get_many' function takes the identifier, an optional iterable of keys and the
+'transmit' keyword argument (with the same meaning as above), and returns the data together with its version number.
+All values returned come from the same state of the data - a reader never sees a partially applied change. The
+'set_many' function takes the identifier and a dictionary of data, applies all changes in a single transaction and
+returns the version number assigned to it. Version numbers increase with each change across all identifiers. The time
+spent in both functions is measured by the 'data.get' and 'data.set' histograms (see the 'metrics' module).
+
+You should use the 'wait_data' function to block until the surface changes any of the values to be sent to the given
+Arduino, instead of polling the data. You must specify the identifier of the Arduino, and you may specify the timeout
+(seconds) after which the function returns anyway. The function returns True if the data has changed, and works across
+the processes started after creating the data manager. Only a single process should wait for each identifier. To wait
+within an event loop instead, watch the file descriptor returned by the 'wait_descriptor' function for readability, and
+call 'wait_data' with the timeout of 0 to consume the notification.
+
+The surface's commands (the keys starting with one of the 'CONTROL_PREFIXES') take a fast path to the Arduino driving
+them. Once a change of the surface data is applied, the changed commands are handed to the Arduino's control channel
+(see the 'control' module) and the Arduino is woken up straight away - a change rejected by 'set_many' never reaches the
+channel. Any commands submitted but not yet confirmed are added to the data retrieved for the Arduino with 'get_many'
+(or 'get_data') with 'transmit' set to True. You should use the 'last_command' function to retrieve the number of the
+latest command handed to the given Arduino (0 if there was none) and the monotonic time it was received at, for example
+to measure the command's latency.
+
+The keys known upfront (the transmission keys of each device and the default keys) are compiled into a schema when the
+data manager is created (see the 'schema' module) - each key is assigned an integer identifier, a type and an owning
+device, and the data is routed between the surface and the Arduino-s by the schema's precomputed tables. The surface's
+data is passed on to the Arduino-s it's sent to, whereas the data received from an Arduino is passed on to the surface
+only if it's among the surface's transmission keys. The keys matching any of the 'TYPES' are kept in typed arrays (see
+the 'storage' module), so their values must fit their types - 'set_many' (and 'set_data') raise 'ValueError' otherwise,
+before any data is modified.
+
+You should use the 'transmission_keys' function to retrieve the keys to be sent over the network to the given device,
+sorted alphabetically. The position of each key can be used to identify it in binary protocols. You should use the
+'key_types' function to retrieve the dictionary mapping each typed key known upfront to the name of its NumPy type.
+
 You should use the 'clear' function to clear the cache (for example at start of the program) to save some memory.
 
+You should use the 'use_backend' function to replace the data manager with a new, empty one using the given backend
+(see 'BACKEND' below). It must be called before any processes are started, and before any data is set. If the data
+manager wasn't created yet, the default one is never created.
+
+You should use the 'use_recorder' function to record every change of the data (the device index, the data changed and
+the monotonic time of the change) into the given directory, or pass None to stop recording. It should be called before
+any processes are started (and after 'use_backend'), so each process records its own changes. The recordings can be
+replayed with the 'recorder' module.
+
 ** Constants and other values **
 
 Additionally, you should modify existing constants to change the behaviour of the data manager.
@@ -29,12 +80,22 @@ Additionally, you should modify existing constants to change the behaviour of th
 You should modify the 'SURFACE', 'ARDUINO_T', ... constants to change the identifier of each device. Naturally, the
 values assigned to these constants must be unique.
 
+You should modify the 'CONTROL_PREFIXES' constant to change which keys take the fast path to the Arduino-s.
+
+You should modify the 'TYPES' dictionary to change the NumPy type of the keys starting with each prefix. The other keys
+aren't typed, and may hold any value supported by the backend.
+
 You should modify the 'DEFAULT' constant to change the default connection loss values. This data will simulate receiving
 such values from the surface and can be used to specify custom behaviour on losing the connection (e.g. thrusters off).
 
 As mentioned before, you should modify the '_transmission_keys' set to include all the values that should be networked
 with the surface or Arduino-s.
 
+You should modify the 'BACKEND' constant to change where the data is kept. By default, the data is kept in the shared
+memory ("shared_memory"), which is accessible by every process started after importing the module. Set the constant to
+"memory" to keep the data within a single process (when running all communication in a single event loop), or to "disk"
+to keep the data in the on-disk cache instead. All available backends are described in the 'storage' module.
+
 ** Example **
 
 Let axis_x = 10, axis_y = 20, axis_z = -15. To save these values as surface readings into the data manager, call:
@@ -49,14 +110,27 @@ The result of printing 'data' is as follows:
 
     {'axis_x': 10, 'axis_y': 20}
 
+To save the values in a single transaction, and then retrieve them together with their version, call:
+
+    set_many(SURFACE, {"axis_x": 10, "axis_y": 20, "axis_z": -15})
+    data, version = get_many(SURFACE, ("axis_x", "axis_y"))
+
 ** Author **
 
 Kacper Florianski
 
 """
 
-from diskcache import FanoutCache
-from os import path
+from communication.control import ControlChannel
+from communication.metrics import Histogram
+from communication.schema import Schema
+from communication.storage import BACKENDS
+from os import pipe, read, set_blocking, write
+from select import select
+from time import monotonic, perf_counter
+
+# Declare the backend used to store the data
+BACKEND = "shared_memory"
 
 # Declare constants to easily access the resources
 SURFACE = 0
@@ -65,6 +139,18 @@ ARDUINO_A = "Ard_A"
 ARDUINO_M = "Ard_M"
 ARDUINO_I = "Ard_I"
 
+# Declare the prefixes of the commands handed straight to the Arduino-s
+CONTROL_PREFIXES = ("Thr_", "Mot_")
+
+# Declare the types of the keys known upfront, by their prefixes (the outputs are sent as unsigned 16-bit integers)
+TYPES = {
+    "Thr_": "uint16",
+    "Mot_": "uint16",
+    "LED_": "uint16",
+    "Sen_IMU_": "float64",
+    "time_": "float64"
+}
+
 # Declare some default values
 THRUSTER_IDLE = 1500
 LIGHT_OFF = 1100
@@ -88,7 +174,7 @@ DEFAULT = {
 
 class DataManager:
 
-    def __init__(self):
+    def __init__(self, backend=BACKEND):
         """
 
         Function used to initialise the data manager.
@@ -97,94 +183,325 @@ class DataManager:
 
             1. Modify the '_transmission_keys' set to specify which values should be transmitted to each component.
 
-        """
+            2. Modify the '_names' dictionary to change the name of each device's store.
 
-        # Declare dictionaries of data
-        self._surface = FanoutCache(path.join("cache", "surface"), shards=2)
-        self._arduino_T = FanoutCache(path.join("cache", "arduino_t"), shards=2)
-        self._arduino_A = FanoutCache(path.join("cache", "arduino_a"), shards=2)
-        self._arduino_M = FanoutCache(path.join("cache", "arduino_m"), shards=2)
-        self._arduino_I = FanoutCache(path.join("cache", "arduino_i"), shards=2)
+        :param backend: Name of the storage backend to use
 
-        # Create a dictionary mapping each index to corresponding location
-        self._data = {
-            SURFACE: self._surface,
-            ARDUINO_T: self._arduino_T,
-            ARDUINO_A: self._arduino_A,
-            ARDUINO_M: self._arduino_M,
-            ARDUINO_I: self._arduino_I
-        }
+        """
 
         # Create a dictionary mapping each index to a set of networking keys
         self._transmission_keys = {
             SURFACE: {"status_T", "status_A", "status_M", "status_I", "error_T", "error_A", "error_M", "error_I",
-                      "Sen_IMU_X", "Sen_IMU_Y", "Sen_IMU_Z", "Sen_IMU_Temp"},
+                      "Sen_IMU_X", "Sen_IMU_Y", "Sen_IMU_Z", "Sen_IMU_Temp", "time_I"},
             ARDUINO_T: {"Thr_FP", "Thr_FS", "Thr_AP", "Thr_AS", "Thr_TFP", "Thr_TFS", "Thr_TAP", "Thr_TAS"},
             ARDUINO_A: {"Mot_R", "Mot_G", "Mot_F", "LED_M"},
             ARDUINO_M: {"Thr_M"},
             ARDUINO_I: {}
         }
 
-        # Create a key to ID lookup for performance reasons
-        self._keys_lookup = {v: k for k, values in self._transmission_keys.items() if k != SURFACE for v in values}
+        # Create a dictionary mapping each index to the name of its store
+        self._names = {
+            SURFACE: "surface",
+            ARDUINO_T: "arduino_t",
+            ARDUINO_A: "arduino_a",
+            ARDUINO_M: "arduino_m",
+            ARDUINO_I: "arduino_i"
+        }
+
+        # Compile the schema of keys known upfront and the routing tables (the surface also receives the default keys)
+        self._schema = Schema(self._transmission_keys, SURFACE, DEFAULT, TYPES)
 
-    def get(self, index: int, *args, transmit=False):
+        # Initialise the backend
+        self._backend = BACKENDS[backend]({index: (name, self._schema.stores[index], self._schema.types)
+                                           for index, name in self._names.items()})
+
+        # Create a dictionary mapping each index to corresponding location
+        self._data = {index: self._backend.store(index) for index in self._names}
+
+        # Create a control channel for each Arduino driven by any commands
+        self._channels = {}
+        for index in self._names:
+            commands = [key for key in self._transmission_keys[index] if key.startswith(CONTROL_PREFIXES)]
+            if index != SURFACE and commands:
+                self._channels[index] = ControlChannel(commands)
+
+        # Declare the recorder of the changes, set with 'use_recorder'
+        self._recorder = None
+
+        # Register the metrics of the time spent reading and changing the data
+        self._get_time = Histogram("data.get")
+        self._set_time = Histogram("data.set")
+
+        # Create a non-blocking pipe for each Arduino to signal changes of its transmission data across the processes
+        self._events = {index: pipe() for index in self._names if index != SURFACE}
+        for descriptors in self._events.values():
+            for descriptor in descriptors:
+                set_blocking(descriptor, False)
+
+    def get_many(self, index: int, keys=None, *, transmit=False) -> tuple:
         """
 
-        Function used to access the cache.
+        Function used to access the cache with a single, consistent snapshot.
 
-        Returns full dictionary if no args passed, or partial data if either args are passed or transmit is set to True.
+        Returns full dictionary if no keys passed, or partial data if either keys are passed or transmit is set to True.
+        Keys that were never set are omitted.
 
         :param index: Device index to retrieve the data from
-        :param args: Keys to retrieve
+        :param keys: Iterable of keys to retrieve
         :param transmit: Boolean to specify if the transmission-only data should be retrieved
-        :return: Data stored in the data manager
+        :return: Tuple of the data stored in the data manager and its version
 
         """
 
-        # If the data retrieved is meant to be sent over the network
+        start = perf_counter()
+
+        # If the data retrieved is meant to be sent over the network, select the transmission-specific keys
         if transmit:
+            keys = [key for key in keys if key in self._transmission_keys[index]] if keys else \
+                self._transmission_keys[index]
 
-            # Return selected data or transmission-specific dictionary if no args passed
-            return {key: self._data[index][key] for key in args if key in self._transmission_keys[index]} if args else \
-                {key: self._data[index][key] for key in self._transmission_keys[index] if key in self._data[index]}
+        # Read all keys at once
+        snapshot = self._data[index].snapshot(keys)
 
-        # Return selected data or whole dictionary if no args passed
-        return {key: self._data[index][key] for key in args} if args else {key: self._data[index][key]
-                                                                           for key in self._data[index]}
+        # Add the commands handed to the Arduino which aren't applied to the snapshot yet
+        if transmit and index in self._channels:
+            number, confirmed, _, commands = self._channels[index].read()
+            if number and (not confirmed or confirmed > snapshot[1]):
+                snapshot[0].update((key, value) for key, value in commands.items() if key in keys)
 
-    def set(self, index: int, **kwargs):
+        # Measure the time spent reading
+        self._get_time.record(perf_counter() - start)
+
+        return snapshot
+
+    def set_many(self, index: int, data: dict) -> int:
         """
 
-        Function used to modify the cache.
+        Function used to modify the cache within a single transaction.
 
         :param index: Device index to retrieve the data from
-        :param kwargs: Key, value pairs of data to modify.
+        :param data: Dictionary of key, value pairs of data to modify
+        :return: Version of the modification
+        :raises ValueError: If any value doesn't fit the type of its key, in which case no data is modified
 
         """
 
-        # Iterate over all kwargs' key, value pairs
-        for key, value in kwargs.items():
+        start = perf_counter()
+
+        # Make sure the typed values fit before anything is modified
+        self._schema.check(data)
+
+        # Remember the time the commands were received at, to measure their latency
+        received = monotonic()
+
+        with self._backend.transaction() as version:
+
+            # Remember the time of the change, so the recorded changes are ordered as the versions are
+            timestamp = monotonic()
+
+            # Declare the set of Arduino-s to notify about the changes in their transmission data
+            changed = set()
 
             # If index passed is Surface
             if index == SURFACE:
 
-                # Update the corresponding Arduino transmission data
-                if key in self._keys_lookup:
-                    self._data[self._keys_lookup[key]][key] = value
+                # Update the surface data, and the corresponding Arduino transmission data
+                updates = {SURFACE: data}
+                updates.update(self._schema.split(data))
 
-                # Update the surface data
-                self._data[SURFACE][key] = value
+                # Find the Arduino-s whose transmission data has changed
+                for target, values in updates.items():
+                    if target != SURFACE and self._data[target].snapshot(values)[0] != values:
+                        changed.add(target)
 
             # If index passed is an Arduino
             else:
 
                 # Update the corresponding Arduino data
-                self._data[index][key] = value
+                updates = {index: data}
 
                 # Update the corresponding Surface transmission data
-                if key in self._data[SURFACE]:
-                    self._data[SURFACE][key] = value
+                surface = self._schema.forward(data)
+                if surface:
+                    updates[SURFACE] = surface
+
+            # Apply the updates to each store
+            for target, values in updates.items():
+                self._data[target].update(values, version)
+
+        # Hand the surface's commands to the Arduino-s only once the change is applied, so a rejected one is never sent
+        commanded = set()
+        if index == SURFACE:
+            for target, channel in self._channels.items():
+                number = channel.submit(data, received)
+                if number:
+                    channel.confirm(number, version)
+                    commanded.add(target)
+
+        # Wake up the Arduino-s waiting for new data
+        for target in changed.union(commanded):
+            self._notify(target)
+
+        # Record the change outside of the transaction
+        if self._recorder:
+            self._recorder.record(index, data, timestamp)
+
+        # Measure the time spent changing the data
+        self._set_time.record(perf_counter() - start)
+
+        return version
+
+    def use_recorder(self, directory):
+        """
+
+        Function used to start recording the changes into a directory, or stop recording.
+
+        :param directory: Directory to record into, or None to stop recording
+
+        """
+
+        from communication.recorder import Recorder
+
+        # Close the previous recording
+        if self._recorder:
+            self._recorder.close()
+
+        self._recorder = Recorder(directory) if directory else None
+
+    def _notify(self, index):
+        """
+
+        Function used to signal a change of the transmission data to the Arduino waiting for it.
+
+        :param index: Device index to notify
+
+        """
+
+        # Write a single byte to the pipe, ignore a full pipe since the waiting side will wake up anyway
+        try:
+            write(self._events[index][1], b"\x00")
+        except BlockingIOError:
+            pass
+
+    def last_command(self, index) -> tuple:
+        """
+
+        Function used to retrieve the latest command handed to an Arduino.
+
+        :param index: Device index of the Arduino
+        :return: Tuple of the number of the latest command (0 if there was none) and the monotonic time it was
+                 received at
+
+        """
+
+        if index not in self._channels:
+            return 0, 0.0
+
+        number, _, timestamp, _ = self._channels[index].read()
+
+        return number, timestamp
+
+    def transmission_keys(self, index) -> tuple:
+        """
+
+        Function used to retrieve the networking keys of a device in a fixed (alphabetical) order.
+
+        :param index: Device index to retrieve the keys of
+        :return: Sorted tuple of the keys
+
+        """
+
+        return tuple(sorted(self._transmission_keys[index]))
+
+    def key_types(self) -> dict:
+        """
+
+        Function used to retrieve the types of the keys known upfront.
+
+        :return: Dictionary mapping each typed key to the name of its NumPy type
+
+        """
+
+        return dict(self._schema.types)
+
+    def wait_descriptor(self, index) -> int:
+        """
+
+        Function used to retrieve the file descriptor which becomes readable once the transmission data of an Arduino
+        has changed, to wait for it within an event loop. Call 'wait' with no timeout to consume the notification.
+
+        :param index: Device index to wait for
+        :return: File descriptor
+
+        """
+
+        return self._events[index][0]
+
+    def wait(self, index, timeout=None) -> bool:
+        """
+
+        Function used to block until the transmission data of an Arduino has changed, or the timeout has passed.
+
+        Only a single process should wait for each index, since the notification is consumed by the waiting side.
+
+        :param index: Device index to wait for
+        :param timeout: Maximum time (seconds) to wait for, or None to wait indefinitely
+        :return: True if the data has changed, False if the timeout has passed
+
+        """
+
+        # Retrieve the reading end of the index's pipe
+        descriptor = self._events[index][0]
+
+        # Wait for the pipe to become readable
+        if not select((descriptor,), (), (), timeout)[0]:
+            return False
+
+        # Consume all pending notifications
+        try:
+            while read(descriptor, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        return True
+
+    def get(self, index: int, *args, transmit=False):
+        """
+
+        Function used to access the cache.
+
+        Returns full dictionary if no args passed, or partial data if either args are passed or transmit is set to True.
+
+        :param index: Device index to retrieve the data from
+        :param args: Keys to retrieve
+        :param transmit: Boolean to specify if the transmission-only data should be retrieved
+        :return: Data stored in the data manager
+
+        """
+
+        # Retrieve the data
+        data, _ = self.get_many(index, args or None, transmit=transmit)
+
+        # Make sure all explicitly requested keys were found
+        if args and not transmit:
+            for key in args:
+                if key not in data:
+                    raise KeyError(key)
+
+        return data
+
+    def set(self, index: int, **kwargs):
+        """
+
+        Function used to modify the cache.
+
+        :param index: Device index to retrieve the data from
+        :param kwargs: Key, value pairs of data to modify.
+
+        """
+
+        self.set_many(index, kwargs)
 
     def clear(self):
         """
@@ -193,11 +510,7 @@ class DataManager:
 
         """
 
-        self._surface.clear()
-        self._arduino_T.clear()
-        self._arduino_A.clear()
-        self._arduino_M.clear()
-        self._arduino_I.clear()
+        self._backend.clear()
 
 
 # Create a closure for the data manager
@@ -210,23 +523,69 @@ def _init_manager():
 
     """
 
-    # Create a free variable for the Data Manager
-    d = DataManager()
+    # Create a free variable for the Data Manager, created on first use
+    d = None
+
+    # Inner function to create the data manager if it doesn't exist yet
+    def create() -> DataManager:
+        nonlocal d
+        if d is None:
+            d = DataManager()
+        return d
 
     # Inner function to return the current state of the data
     def get_data(index: int, *args, transmit=False):
-        return d.get(index, *args, transmit=transmit)
+        return (d or create()).get(index, *args, transmit=transmit)
 
     # Inner function to alter the data
     def set_data(index: int, **kwargs):
-        return d.set(index, **kwargs)
+        return (d or create()).set(index, **kwargs)
+
+    # Inner function to return a consistent snapshot of the data and its version
+    def get_many(index: int, keys=None, *, transmit=False):
+        return (d or create()).get_many(index, keys, transmit=transmit)
+
+    # Inner function to alter the data within a single transaction
+    def set_many(index: int, data: dict):
+        return (d or create()).set_many(index, data)
+
+    # Inner function to wait for changes of an Arduino's transmission data
+    def wait_data(index, timeout=None):
+        return (d or create()).wait(index, timeout)
+
+    # Inner function to retrieve the number and time of the latest command handed to an Arduino
+    def last_command(index):
+        return (d or create()).last_command(index)
+
+    # Inner function to retrieve the ordered networking keys
+    def transmission_keys(index):
+        return (d or create()).transmission_keys(index)
+
+    # Inner function to retrieve the types of the keys known upfront
+    def key_types():
+        return (d or create()).key_types()
+
+    # Inner function to retrieve the descriptor which becomes readable on changes of an Arduino's transmission data
+    def wait_descriptor(index):
+        return (d or create()).wait_descriptor(index)
 
     # Inner function to clear the cache
     def clear():
-        d.clear()
+        (d or create()).clear()
+
+    # Inner function to replace the data manager with one using a different backend
+    def use_backend(backend: str):
+        nonlocal d
+        d = DataManager(backend)
+
+    # Inner function to record the changes of the data
+    def use_recorder(directory):
+        (d or create()).use_recorder(directory)
 
-    return get_data, set_data, clear
+    return get_data, set_data, get_many, set_many, wait_data, wait_descriptor, last_command, transmission_keys, \
+        key_types, clear, create, use_backend, use_recorder
 
 
 # Create globally accessible functions to manage the data
-get_data, set_data, clear = _init_manager()
+get_data, set_data, get_many, set_many, wait_data, wait_descriptor, last_command, transmission_keys, key_types, clear, \
+    create, use_backend, use_recorder = _init_manager()
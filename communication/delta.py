@@ -0,0 +1,124 @@
+"""
+
+Delta is used to send only the values which have changed since the last state acknowledged by the peer.
+
+** Functionality **
+
+By importing the module you gain access to the class 'DeltaEncoder'.
+
+You should create an instance of 'DeltaEncoder' for each peer and use the 'encode' function to reduce the dictionary
+(and its version) returned by the data manager to the values the peer doesn't have yet. Once the peer has received the
+data, call the 'acknowledge' function to remember the data sent as the peer's state. Every 'keyframe_interval' calls
+(and after each 'reset', for example on re-connection) the full dictionary is returned instead, to let the peer recover
+from any lost updates.
+
+Over reliable links (TCP) the data can be acknowledged as soon as it's sent, whereas over unreliable links (serial)
+it should only be acknowledged once a valid reply has been received - until then, the same changes are sent again.
+
+** Example **
+
+Let the data manager return {"Thr_FP": 1500, "Thr_FS": 1500} with version 7, and then {"Thr_FP": 1600, "Thr_FS": 1500}
+with version 8. To send the data, call:
+
+    encoder = DeltaEncoder()
+
+    data, keyframe = encoder.encode({"Thr_FP": 1500, "Thr_FS": 1500}, 7)
+    encoder.acknowledge()
+
+    data, keyframe = encoder.encode({"Thr_FP": 1600, "Thr_FS": 1500}, 8)
+
+The result of printing 'data' and 'keyframe' is as follows:
+
+    {'Thr_FP': 1600} False
+
+"""
+
+
+class DeltaEncoder:
+
+    def __init__(self, keyframe_interval=50):
+        """
+
+        Function used to initialise the encoder.
+
+        :param keyframe_interval: Number of encodings after which the full data is sent again
+
+        """
+
+        # Store the keyframe interval information
+        self._keyframe_interval = keyframe_interval
+
+        # Declare the state acknowledged by the peer, and its version (None until the first keyframe is acknowledged)
+        self._acknowledged = None
+        self._version = None
+
+        # Declare the data sent but not yet acknowledged
+        self._pending = None
+
+        # Initialise the number of encodings since the last keyframe
+        self._count = 0
+
+    def encode(self, data: dict, version: int) -> tuple:
+        """
+
+        Function used to select the data to send.
+
+        :param data: Full data to send
+        :param version: Version of the data
+        :return: Tuple of the data to send and a boolean specifying if it's a keyframe
+
+        """
+
+        # Send a keyframe if the peer's state is unknown or the interval has passed
+        self._count += 1
+        keyframe = self._acknowledged is None or self._count >= self._keyframe_interval
+
+        # Remember the data until it's acknowledged
+        self._pending = data, version, keyframe
+
+        # Send the full data on keyframes
+        if keyframe:
+            self._count = 0
+            return dict(data), True
+
+        # Send nothing if the data hasn't changed since the acknowledged version
+        if version == self._version:
+            return {}, False
+
+        # Otherwise send the changed values only
+        return {key: value for key, value in data.items()
+                if key not in self._acknowledged or self._acknowledged[key] != value}, False
+
+    def acknowledge(self):
+        """
+
+        Function used to mark the data last encoded as received by the peer.
+
+        """
+
+        # Ignore repeated acknowledgements
+        if self._pending is None:
+            return
+
+        data, version, keyframe = self._pending
+        self._pending = None
+
+        # Replace the peer's state on keyframes, otherwise apply the changes
+        if keyframe:
+            self._acknowledged = dict(data)
+        else:
+            self._acknowledged.update(data)
+
+        self._version = version
+
+    def reset(self):
+        """
+
+        Function used to forget the peer's state, forcing a keyframe to be sent next.
+
+        """
+
+        self._acknowledged = None
+        self._version = None
+        self._pending = None
+        self._count = 0
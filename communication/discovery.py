@@ -0,0 +1,367 @@
+"""
+
+Discovery is used to find the Arduino-s among the serial devices, and bind each of them to its identifier before any
+data is exchanged with it.
+
+** Functionality **
+
+By importing the module you gain access to the classes 'DeviceWatcher' and 'PortRegistry', and the 'candidates',
+'identify' and 'discover' functions.
+
+You should use the 'candidates' function to list the serial devices which might be Arduino-s - the devices matching the
+'DEVICE_PATTERNS' by default, or the existing devices out of the given ports.
+
+You should use the 'identify' function to open a serial device and ask it for its identifier. The handshake line (see
+the 'serial_protocol' module) is sent every '_RESEND_INTERVAL' seconds until the device replies or the timeout passes,
+since an Arduino resets when its port is opened and ignores the data sent while it boots. An Arduino should reply to
+the handshake with its 'deviceID' - if it doesn't, but it uses JSON, it's identified by its reply to an empty JSON line
+instead. The function returns the identifier together with the open serial connection, so the connection can be used
+straight away, without resetting the Arduino again.
+
+You should use the 'discover' function to identify all candidate devices at once - each device is identified in a
+separate thread, so discovering all Arduino-s takes as long as identifying the slowest one. The threads are finished
+by the time the function returns, so it's safe to start any processes afterwards.
+
+You should create an instance of 'DeviceWatcher' in the process waiting for the devices to be plugged in, and use the
+'wait' function to block until any candidate device is created (or its permissions change), or the timeout passes. The
+devices' directories are watched with inotify (through ctypes), and the timeout is simply waited for where inotify
+isn't available, so the devices should be looked for again after each wait either way.
+
+You should create an instance of 'PortRegistry' with the identifiers of the Arduino-s before starting any processes, to
+share which port is used by which Arduino. Use the 'claim' and 'release' functions to mark a port as used or free, the
+'claimed' function to retrieve the ports in use, and the 'reserve' function to claim a port only if it's free - reserve
+each device before identifying it (and release it if it isn't the Arduino), so the devices in use or being identified
+are never opened by another process, while the other processes keep identifying the other devices.
+
+** Constants and other values **
+
+You should modify the 'DEVICE_PATTERNS' tuple to change the paths of the serial devices which might be Arduino-s.
+
+You should modify the 'IDENTIFY_TIMEOUT' constant to change how long (seconds) to wait for a device to identify itself,
+long enough for an Arduino which has just been reset, and the '_RESEND_INTERVAL' constant to change how often (seconds)
+the handshake is sent while waiting.
+
+** Example **
+
+To find the Arduino-s connected, call:
+
+    connections = discover()
+
+The result maps each identifier to an open serial connection, for example:
+
+    {'Ard_T': Serial<id=0x..., open=True>(port='/dev/ttyACM1', ...), 'Ard_A': Serial<...>(port='/dev/ttyACM0', ...)}
+
+"""
+
+from communication.serial_protocol import HANDSHAKE, handshake_id
+from ctypes import CDLL
+from ctypes.util import find_library
+from fnmatch import fnmatch
+from glob import glob
+from mmap import mmap
+from multiprocessing import RLock
+from os import path, read
+from select import select
+from serial import Serial, SerialException
+from struct import Struct
+from threading import Thread
+from time import monotonic, sleep
+
+# Declare the paths of the serial devices which might be Arduino-s
+DEVICE_PATTERNS = ("/dev/ttyACM*", "/dev/ttyUSB*")
+
+# Declare how long (seconds) to wait for a device to identify itself, and how often to send the handshake meanwhile
+IDENTIFY_TIMEOUT = 2
+_RESEND_INTERVAL = 0.25
+
+# Declare the line sent to identify the Arduino-s which don't reply to the handshake with their identifier
+_PROBE = b"{}\n"
+
+# Declare the inotify flags (see 'man inotify') and the layout of each event's header
+_IN_ATTRIB = 0x4
+_IN_CREATE = 0x100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT = Struct("iIII")
+
+# Declare the maximum size of an encoded port path in the registry
+_PATH_SIZE = 128
+
+
+def candidates(ports=None) -> list:
+    """
+
+    Function used to list the serial devices which might be Arduino-s.
+
+    :param ports: An iterable of the ports to choose from, or None to look for the devices matching the
+                  'DEVICE_PATTERNS'
+    :return: Sorted list of the existing devices
+
+    """
+
+    if ports is not None:
+        return sorted(port for port in set(ports) if path.exists(port))
+
+    return sorted({port for pattern in DEVICE_PATTERNS for port in glob(pattern)})
+
+
+def identify(port: str, timeout=IDENTIFY_TIMEOUT) -> tuple:
+    """
+
+    Function used to open a serial device and ask it for its identifier.
+
+    :param port: Path of the device
+    :param timeout: Maximum time (seconds) to wait for the device to identify itself
+    :return: Tuple of the identifier and the open serial connection, or a tuple of None-s if the device wasn't
+             identified (its connection is closed then)
+
+    """
+
+    serial = Serial()
+    serial.port = port
+    serial.timeout = _RESEND_INTERVAL
+    serial.write_timeout = _RESEND_INTERVAL
+
+    try:
+        serial.open()
+    except SerialException:
+        return None, None
+
+    try:
+
+        # Keep sending the handshake until the device replies
+        reply = b""
+        deadline = monotonic() + timeout
+        while not reply and monotonic() < deadline:
+            serial.write(HANDSHAKE)
+            reply = serial.read_until().strip()
+
+        arduino_id = handshake_id(reply) if reply else None
+
+        # Ask the devices which don't reply with their identifier for any data instead, skip any other replies until
+        # the device goes quiet or the timeout passes (a device streaming data would never go quiet)
+        if reply and arduino_id is None:
+            serial.write(_PROBE)
+            while arduino_id is None and monotonic() < deadline:
+                line = serial.read_until().strip()
+                if not line:
+                    break
+                arduino_id = handshake_id(line)
+
+        # Drop any replies to the handshakes sent while the device was booting
+        if arduino_id is not None:
+            serial.reset_input_buffer()
+            return arduino_id, serial
+
+    except SerialException:
+        pass
+
+    serial.close()
+
+    return None, None
+
+
+def discover(ports=None, timeout=IDENTIFY_TIMEOUT) -> dict:
+    """
+
+    Function used to identify all candidate devices at once.
+
+    :param ports: An iterable of the ports to choose from, or None to look for the devices matching the
+                  'DEVICE_PATTERNS'
+    :param timeout: Maximum time (seconds) to wait for each device to identify itself
+    :return: Dictionary mapping the identifier of each Arduino found to its open serial connection
+
+    """
+
+    results = {}
+
+    # Inner function to identify a single device
+    def run(port: str):
+        results[port] = identify(port, timeout)
+
+    # Identify each device in a separate thread
+    threads = [Thread(target=run, args=(port,)) for port in candidates(ports)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Bind each identifier to the first device it was found on, close any duplicates
+    connections = {}
+    for port, (arduino_id, serial) in sorted(results.items()):
+        if arduino_id is None:
+            continue
+
+        if arduino_id in connections:
+            print("Found {} on both {} and {}, ignoring the latter".format(arduino_id, connections[arduino_id].port,
+                                                                           port))
+            serial.close()
+            continue
+
+        connections[arduino_id] = serial
+
+    return connections
+
+
+class DeviceWatcher:
+
+    def __init__(self, ports=None):
+        """
+
+        Function used to start watching the directories of the candidate devices.
+
+        :param ports: An iterable of the ports to watch for, or None to watch for the devices matching the
+                      'DEVICE_PATTERNS'
+
+        """
+
+        # Store the paths of the devices to watch for
+        self._patterns = tuple(ports) if ports is not None else DEVICE_PATTERNS
+
+        # Initialise inotify, or fall back to waiting for the timeout
+        self._descriptor = None
+        try:
+            libc = CDLL(find_library("c"), use_errno=True)
+            descriptor = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+
+        if descriptor < 0:
+            return
+
+        # Watch each directory for the devices created, or their permissions changed
+        for directory in {path.dirname(pattern) for pattern in self._patterns}:
+            libc.inotify_add_watch(descriptor, directory.encode(), _IN_CREATE | _IN_ATTRIB)
+
+        self._descriptor = descriptor
+
+    def fileno(self):
+        return self._descriptor
+
+    def wait(self, timeout: float) -> bool:
+        """
+
+        Function used to wait until any candidate device is created, or its permissions change.
+
+        :param timeout: Maximum time (seconds) to wait for
+        :return: True if any candidate device has changed, or if inotify isn't available
+
+        """
+
+        if self._descriptor is None:
+            sleep(timeout)
+            return True
+
+        if not select((self._descriptor,), (), (), timeout)[0]:
+            return False
+
+        return self.consume()
+
+    def consume(self) -> bool:
+        """
+
+        Function used to read the pending inotify events without blocking.
+
+        :return: True if any of the events concerned a candidate device
+
+        """
+
+        changed = False
+
+        while True:
+            try:
+                events = read(self._descriptor, 4096)
+            except BlockingIOError:
+                break
+
+            # Check the name of each event's device
+            offset = 0
+            while offset < len(events):
+                _, _, _, size = _EVENT.unpack_from(events, offset)
+                offset += _EVENT.size
+                name = events[offset:offset + size].rstrip(b"\x00").decode("utf-8", "replace")
+                offset += size
+
+                changed = changed or any(fnmatch(path.join(path.dirname(pattern), name), pattern)
+                                         for pattern in self._patterns)
+
+        return changed
+
+
+class PortRegistry:
+
+    def __init__(self, ids):
+        """
+
+        Function used to allocate the shared memory segment of the registry.
+
+        :param ids: Iterable of the identifiers of the Arduino-s
+
+        """
+
+        # Assign each identifier a slot
+        self._slots = {arduino_id: slot for slot, arduino_id in enumerate(ids)}
+
+        # Allocate the anonymous shared segment, no port is claimed yet
+        self._memory = mmap(-1, max(len(self._slots), 1) * _PATH_SIZE)
+
+        # Initialise the lock shared by all processes, re-entrant so the ports can be claimed while reserving
+        self._lock = RLock()
+
+    def claim(self, arduino_id, port: str):
+        """
+
+        Function used to mark the port as used by the Arduino.
+
+        :param arduino_id: Identifier of the Arduino
+        :param port: Path of the device
+
+        """
+
+        if arduino_id in self._slots:
+            offset = self._slots[arduino_id] * _PATH_SIZE
+            with self._lock:
+                self._memory[offset:offset + _PATH_SIZE] = port.encode("utf-8")[:_PATH_SIZE].ljust(_PATH_SIZE, b"\x00")
+
+    def reserve(self, arduino_id, port: str) -> bool:
+        """
+
+        Function used to mark the port as used by the Arduino, unless it's already used.
+
+        :param arduino_id: Identifier of the Arduino
+        :param port: Path of the device
+        :return: True if the port was free, and is now used by the Arduino
+
+        """
+
+        with self._lock:
+            if port in self.claimed():
+                return False
+
+            self.claim(arduino_id, port)
+            return True
+
+    def release(self, arduino_id):
+        """
+
+        Function used to mark the port of the Arduino as free.
+
+        :param arduino_id: Identifier of the Arduino
+
+        """
+
+        self.claim(arduino_id, "")
+
+    def claimed(self) -> set:
+        """
+
+        Function used to retrieve the ports in use.
+
+        :return: Set of the paths of the devices
+
+        """
+
+        with self._lock:
+            return {bytes(self._memory[offset:offset + _PATH_SIZE]).rstrip(b"\x00").decode("utf-8")
+                    for offset in range(0, len(self._slots) * _PATH_SIZE, _PATH_SIZE)} - {""}
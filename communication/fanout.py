@@ -0,0 +1,125 @@
+"""
+
+Fan-out is used to share the same messages between any number of clients, without letting a slow client stall others.
+
+** Functionality **
+
+By importing the module you gain access to the class 'Subscriber' and the 'DROP_POLICIES' tuple of the supported
+policies.
+
+You should create an instance of 'Subscriber' for each connected client. The messages are published to all subscribers
+with the 'put' function, which never blocks - each subscriber only keeps a reference to the message in its own bounded
+queue, so a message encoded once can be shared by all clients. The client's sender should use the 'get' function to take
+the next message to send. The constructor takes the following optional parameters:
+
+    - 'size' - maximum number of messages queued for the client
+    - 'drop' - policy applied when the queue is full, either "oldest" (default, the oldest queued message is dropped to
+      make space for the new one, so the client catches up with the newest messages) or "newest" (the new message is
+      dropped, so the client receives the queued messages without gaps in between)
+    - 'notify' - function called (without arguments) after each message is queued, for example to wake up an event loop
+
+The number of messages dropped for the client is available through the 'dropped' field.
+
+** Example **
+
+To share a message between two clients, call:
+
+    first, second = Subscriber(), Subscriber()
+
+    for subscriber in (first, second):
+        subscriber.put(message)
+
+To send the next message to the first client, call:
+
+    client_socket.sendall(first.get())
+
+"""
+
+from collections import deque
+from threading import Condition
+
+# Declare the supported drop policies
+DROP_POLICIES = ("oldest", "newest")
+
+
+class Subscriber:
+
+    def __init__(self, size=2, drop="oldest", notify=None):
+        """
+
+        Function used to initialise the queue of a client.
+
+        :param size: Maximum number of messages queued
+        :param drop: Policy applied when the queue is full
+        :param notify: Function called after each message is queued, or None
+
+        """
+
+        # Make sure the policy is supported
+        if drop not in DROP_POLICIES:
+            raise ValueError("Unsupported drop policy: {}".format(drop))
+
+        # Make sure at least one message can be queued
+        if size < 1:
+            raise ValueError("Subscriber must queue at least 1 message")
+
+        # Store the queue information
+        self._size = size
+        self._drop = drop
+        self._notify = notify
+
+        # Initialise the queue and the condition used to protect it and wait for new messages
+        self._queue = deque()
+        self._condition = Condition()
+
+        # Initialise the number of messages dropped
+        self._dropped = 0
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    def put(self, message):
+        """
+
+        Function used to queue a message, applying the drop policy if the queue is full.
+
+        :param message: Message to queue (only its reference is stored)
+
+        """
+
+        with self._condition:
+
+            # Drop a message if the queue is full
+            if len(self._queue) >= self._size:
+                self._dropped += 1
+
+                # Keep the queued messages if the new one should be dropped
+                if self._drop == "newest":
+                    return
+
+                self._queue.popleft()
+
+            self._queue.append(message)
+
+            # Wake up the sender
+            self._condition.notify()
+
+        if self._notify:
+            self._notify()
+
+    def get(self, timeout=None):
+        """
+
+        Function used to take the next message to send.
+
+        :param timeout: Maximum time (seconds) to wait for a message, or None to wait indefinitely
+        :return: Next message, or None if there was none within the timeout
+
+        """
+
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._queue, timeout):
+                return None
+
+            return self._queue.popleft()
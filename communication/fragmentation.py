@@ -0,0 +1,272 @@
+"""
+
+Fragmentation is used to split big messages (encoded frames) into datagrams and to reassemble them on the receiver.
+
+** Functionality **
+
+By importing the module you gain access to the classes 'Fragmenter' and 'Reassembler'.
+
+You should create an instance of 'Fragmenter' on the sender and use the 'fragment' function to split a message into
+datagrams, each small enough to fit into a single packet. Each datagram is returned as a list of bytes-like parts (the
+header and the message's slice, which isn't copied) to be sent with the socket's 'sendmsg' function. The constructor
+takes the following optional parameters:
+
+    - 'datagram_size' - maximum size (bytes) of each datagram, by default the biggest UDP payload fitting Ethernet's MTU
+    - 'fec' - number of fragments protected by a single parity datagram (the XOR of the fragments), which allows to
+      recover one lost fragment within each group, or 0 (default) to disable the forward error correction
+
+You should create an instance of 'Reassembler' on the receiver and pass each datagram received to the 'feed' function.
+It returns the message once all its fragments were received (or recovered), and None otherwise. Lost datagrams are never
+waited for - as soon as a newer message is completed, the older, incomplete messages are dropped. The number of messages
+dropped and recovered is available through the 'dropped' and 'recovered' fields.
+
+Each datagram consists of the header, holding the following big-endian fields, followed by the fragment's bytes:
+
+    1. Message id (4 bytes), increasing with each message.
+    2. Fragment index (2 bytes). Indices lower than the number of fragments mark the message's fragments, whereas the
+       higher ones mark the parity of each group of fragments (the index minus the number of fragments is the group).
+    3. Number of fragments (2 bytes), excluding the parity datagrams.
+    4. Number of fragments in each parity group (1 byte), 0 if there are no parity datagrams.
+    5. Size of each fragment (2 bytes), only the last fragment may be shorter.
+    6. Size of the message (4 bytes).
+
+** Constants and other values **
+
+You should modify the '_MAX_PENDING' constant to change the number of incomplete messages buffered by the receiver.
+
+You should modify the '_RESTART_WINDOW' constant to change how much older (in message ids) a datagram must be than the
+last message completed to be treated as coming from a restarted sender, rather than arriving late.
+
+** Example **
+
+To split a message and reassemble it, call:
+
+    fragmenter = Fragmenter(fec=4)
+    reassembler = Reassembler()
+
+    for datagram in fragmenter.fragment(message):
+        result = reassembler.feed(b"".join(datagram))
+
+After the last datagram, 'result' holds the message.
+
+"""
+
+from struct import Struct, error
+
+# Declare the layout of the header
+HEADER = Struct(">IHHBHI")
+
+# Declare the default datagram size (Ethernet MTU without the IPv4 and UDP headers)
+DATAGRAM_SIZE = 1500 - 20 - 8
+
+# Declare the maximum number of fragments of a single message
+_MAX_FRAGMENTS = 0xFFFF
+
+# Declare the number of incomplete messages buffered by the receiver
+_MAX_PENDING = 4
+
+# Declare the difference of message ids after which the sender is assumed to have restarted
+_RESTART_WINDOW = 64
+
+
+def _xor(fragments) -> bytes:
+    """
+
+    Function used to calculate the XOR of the fragments, padding the shorter ones with zeros.
+
+    :param fragments: Iterable of bytes-like fragments
+    :return: XOR of the fragments
+
+    """
+
+    # Calculate the XOR on integers, which is much faster than doing it for each byte
+    size, result = 0, 0
+    for fragment in fragments:
+        size = max(size, len(fragment))
+        result ^= int.from_bytes(fragment, "little")
+
+    return result.to_bytes(size, "little")
+
+
+class Fragmenter:
+
+    def __init__(self, datagram_size=DATAGRAM_SIZE, fec=0):
+        """
+
+        Function used to initialise the fragmenter.
+
+        :param datagram_size: Maximum size (bytes) of each datagram
+        :param fec: Number of fragments in each parity group, or 0 to disable the forward error correction
+
+        """
+
+        # Make sure the datagram can hold some data and its size fits in the header
+        if not HEADER.size < datagram_size <= HEADER.size + 0xFFFF:
+            raise ValueError("Datagram size must exceed the header size of {} bytes".format(HEADER.size))
+
+        # Make sure the parity group size fits in the header
+        if not 0 <= fec <= 0xFF:
+            raise ValueError("Parity group size must be between 0 and 255")
+
+        # Store the sizes information
+        self._payload_size = datagram_size - HEADER.size
+        self._fec = fec
+
+        # Initialise the id of the next message
+        self._id = 0
+
+    def fragment(self, message) -> list:
+        """
+
+        Function used to split a message into datagrams.
+
+        :param message: Bytes-like message
+        :return: List of datagrams, each a list of the header and the fragment
+
+        """
+
+        # Slice the message without copying it
+        message = memoryview(message).cast("B")
+        fragments = [message[i:i + self._payload_size] for i in range(0, len(message), self._payload_size)] or [b'']
+
+        if len(fragments) > _MAX_FRAGMENTS:
+            raise ValueError("Message exceeds the maximum of {} fragments".format(_MAX_FRAGMENTS))
+
+        # Assign the next id to the message
+        self._id = (self._id + 1) & 0xFFFFFFFF
+
+        # Create the data datagrams
+        count = len(fragments)
+        datagrams = [[HEADER.pack(self._id, index, count, self._fec, self._payload_size, len(message)), fragment]
+                     for index, fragment in enumerate(fragments)]
+
+        # Create the parity datagrams, one for each group of fragments
+        if self._fec:
+            for group, start in enumerate(range(0, count, self._fec)):
+                if count + group > _MAX_FRAGMENTS:
+                    break
+                header = HEADER.pack(self._id, count + group, count, self._fec, self._payload_size, len(message))
+                datagrams.append([header, _xor(fragments[start:start + self._fec])])
+
+        return datagrams
+
+
+class Reassembler:
+
+    def __init__(self):
+        """
+
+        Function used to initialise the reassembler.
+
+        """
+
+        # Initialise the incomplete messages (id mapped to the message's information and fragments)
+        self._pending = {}
+
+        # Initialise the id of the last message completed
+        self._last = 0
+
+        # Initialise the statistics
+        self._dropped = 0
+        self._recovered = 0
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    @property
+    def recovered(self) -> int:
+        return self._recovered
+
+    def feed(self, datagram):
+        """
+
+        Function used to process a received datagram.
+
+        :param datagram: Bytes of the datagram
+        :return: The message if it was completed by the datagram, None otherwise
+
+        """
+
+        # Ignore the datagrams which aren't valid
+        try:
+            message_id, index, count, fec, fragment_size, size = HEADER.unpack_from(datagram)
+        except error:
+            return None
+
+        # Ignore the datagrams of messages already completed or dropped, unless the sender has restarted
+        if message_id <= self._last:
+            if self._last - message_id < _RESTART_WINDOW:
+                return None
+
+            self._pending.clear()
+            self._last = 0
+
+        # Retrieve the message's fragments, drop the oldest incomplete messages if there are too many
+        if message_id not in self._pending:
+            while len(self._pending) >= _MAX_PENDING:
+                del self._pending[min(self._pending)]
+                self._dropped += 1
+
+            self._pending[message_id] = count, fec, fragment_size, size, {}, {}
+
+        count, fec, fragment_size, size, fragments, parities = self._pending[message_id]
+
+        # Store the fragment or the parity
+        if index < count:
+            fragments[index] = datagram[HEADER.size:]
+        else:
+            parities[index - count] = datagram[HEADER.size:]
+
+        # Attempt to recover a lost fragment
+        if fec and len(fragments) < count:
+            self._recover(count, fec, fragment_size, size, fragments, parities,
+                          index if index < count else (index - count) * fec)
+
+        # Wait for the remaining fragments
+        if len(fragments) < count:
+            return None
+
+        # Drop the older, incomplete messages - their fragments are lost or late
+        for older in [older for older in self._pending if older < message_id]:
+            del self._pending[older]
+            self._dropped += 1
+
+        # Mark the message as completed
+        del self._pending[message_id]
+        self._last = message_id
+
+        return b"".join(fragments[index] for index in range(count))
+
+    def _recover(self, count: int, fec: int, fragment_size: int, size: int, fragments: dict, parities: dict,
+                 index: int):
+        """
+
+        Function used to recover the single lost fragment of a parity group, if possible.
+
+        :param count: Number of fragments of the message
+        :param fec: Number of fragments in each parity group
+        :param fragment_size: Size of each fragment
+        :param size: Size of the message
+        :param fragments: Fragments received
+        :param parities: Parity of each group received
+        :param index: Index of any fragment within the group
+
+        """
+
+        # Find the group's fragments
+        group = index // fec
+        indices = range(group * fec, min(group * fec + fec, count))
+        missing = [index for index in indices if index not in fragments]
+
+        # Only a single fragment can be recovered, and only if the parity is known
+        if len(missing) != 1 or group not in parities:
+            return
+
+        # Recover the fragment and trim the padding (only the last fragment may be shorter)
+        index = missing[0]
+        fragment = _xor([parities[group]] + [fragments[other] for other in indices if other != index])
+        fragment_size = fragment_size if index < count - 1 else size - (count - 1) * fragment_size
+
+        fragments[index] = fragment[:fragment_size].ljust(fragment_size, b'\0')
+        self._recovered += 1
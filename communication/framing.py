@@ -0,0 +1,177 @@
+"""
+
+Framing is used to split a stream of bytes into separate messages.
+
+** Functionality **
+
+By importing the module you gain access to the class 'FrameParser' and the 'FramingError' exception.
+
+You should create an instance of 'FrameParser' for each connection, specifying the framing mode - either "length", where
+each message is preceded by its size as a 4-byte big-endian unsigned integer, or "newline", where each message is
+followed by a new line character (the messages can't contain new line characters themselves).
+
+You should use the 'feed' function to pass the bytes received. It returns a list of all messages completed by the given
+bytes (which may be empty), and buffers any remaining, partial message until more bytes are fed. You should use the
+'frame' function to convert a message into bytes to send. 'FramingError' is raised if a message exceeds the size limit.
+The limit can be raised for a single parser with the optional 'max_size' parameter (for example for raw video frames).
+
+To send a big message without joining it into a single bytes object first, use the 'prefix' function to create the
+length prefix only, and send it followed by the message's parts (length mode only).
+
+** Constants and other values **
+
+You should modify the 'MAX_SIZE' constant to change the default maximum size (bytes) of a single message.
+
+** Example **
+
+Let the bytes received be a full message followed by a partial one. To extract the messages, call:
+
+    parser = FrameParser("length")
+    messages = parser.feed(b'\\x00\\x00\\x00\\x02{}\\x00\\x00')
+
+The result of printing 'messages' is as follows:
+
+    [b'{}']
+
+"""
+
+from struct import Struct
+
+# Declare the maximum size of a single message
+MAX_SIZE = 1 << 20
+
+# Declare the layout of the length prefix
+_LENGTH = Struct(">I")
+
+# Declare the supported modes
+MODES = ("length", "newline")
+
+
+class FramingError(Exception):
+    pass
+
+
+class FrameParser:
+
+    def __init__(self, mode: str, max_size=MAX_SIZE):
+        """
+
+        Function used to initialise the parser.
+
+        :param mode: Framing mode, either "length" or "newline"
+        :param max_size: Maximum size (bytes) of a single message
+
+        """
+
+        # Make sure the mode is supported
+        if mode not in MODES:
+            raise ValueError("Unsupported framing mode: {}".format(mode))
+
+        # Store the mode information
+        self._mode = mode
+        self._max_size = max_size
+
+        # Initialise the buffer of partially received messages
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        """
+
+        Function used to extract all complete messages after receiving more bytes.
+
+        :param data: Bytes received
+        :return: List of complete messages
+
+        """
+
+        # Append the data to the buffered bytes
+        self._buffer += data
+
+        # Extract the messages according to the mode
+        messages = self._split_length() if self._mode == "length" else self._split_newline()
+
+        # Make sure the remaining, partial message doesn't grow indefinitely
+        if len(self._buffer) > self._max_size + _LENGTH.size:
+            self._buffer.clear()
+            raise FramingError("Message exceeds the maximum size of {} bytes".format(self._max_size))
+
+        return messages
+
+    def _split_length(self) -> list:
+
+        # Declare the list of messages and the position in the buffer
+        messages = []
+        position = 0
+
+        # Extract messages while their length and content are fully buffered
+        while len(self._buffer) - position >= _LENGTH.size:
+            size = _LENGTH.unpack_from(self._buffer, position)[0]
+
+            # Reject messages which are too big
+            if size > self._max_size:
+                self._buffer.clear()
+                raise FramingError("Message exceeds the maximum size of {} bytes".format(self._max_size))
+
+            # Stop if the message is partial
+            if len(self._buffer) - position - _LENGTH.size < size:
+                break
+
+            position += _LENGTH.size
+            messages.append(bytes(self._buffer[position:position + size]))
+            position += size
+
+        # Remove the extracted messages from the buffer
+        del self._buffer[:position]
+
+        return messages
+
+    def _split_newline(self) -> list:
+
+        # Find the end of the last complete message
+        end = self._buffer.rfind(b"\n")
+
+        # Stop if there are no complete messages
+        if end < 0:
+            return []
+
+        # Split the complete messages and remove them from the buffer, ignoring the empty ones
+        messages = [bytes(message) for message in self._buffer[:end].split(b"\n") if message.strip()]
+        del self._buffer[:end + 1]
+
+        return messages
+
+    def frame(self, message: bytes) -> bytes:
+        """
+
+        Function used to convert a message into bytes to send.
+
+        :param message: Message to send
+        :return: Framed message
+
+        """
+
+        # Reject messages which are too big
+        if len(message) > self._max_size:
+            raise FramingError("Message exceeds the maximum size of {} bytes".format(self._max_size))
+
+        return _LENGTH.pack(len(message)) + message if self._mode == "length" else message + b"\n"
+
+    def prefix(self, size: int) -> bytes:
+        """
+
+        Function used to create the length prefix of a message which is sent in parts.
+
+        :param size: Total size (bytes) of the message
+        :return: Length prefix
+
+        """
+
+        # Only the length mode knows the size of the message upfront
+        if self._mode != "length":
+            raise ValueError("Prefix is only supported in the length mode")
+
+        # Reject messages which are too big
+        if size > self._max_size:
+            raise FramingError("Message exceeds the maximum size of {} bytes".format(self._max_size))
+
+        return _LENGTH.pack(size)
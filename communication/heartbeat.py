@@ -0,0 +1,111 @@
+"""
+
+Heartbeat is used to detect the loss of the surface within tens of milliseconds, so the Arduino-s can be sent the
+default values long before the connection times out.
+
+** Functionality **
+
+By importing the module you gain access to the class 'Heartbeat'.
+
+You should create an instance of 'Heartbeat' with the loss threshold (seconds), before starting any processes. Use the
+'beat' function each time a message from the surface is applied, and the 'reset' function once the connection to the
+surface is closed. Any process can then check the 'expired' property - True if the surface wasn't heard from within the
+threshold (or wasn't heard from at all) - and the 'deadline' property - the monotonic time at which the heartbeat will
+expire, unless there's another beat.
+
+The time of the last beat is kept in an anonymous shared memory segment, created with the heartbeat and inherited by
+every process forked afterwards. Since it's a single aligned word written by a single process, it's read without any
+locks. The heartbeat is watched by the process of each Arduino, rather than the surface's process, so the defaults are
+also sent if the surface's process hangs (see the 'server' module).
+
+Pass None as the threshold to disable the heartbeat - it then never expires.
+
+** Constants and other values **
+
+The surface must send a message (an empty JSON object is enough) at least every 'SURFACE_INTERVAL' seconds, even if
+nothing has changed - the surface's control loop sends at 50 Hz, so every 20 ms. The default loss threshold
+'HEARTBEAT_TIMEOUT' is 'HEARTBEAT_MISSES' times that interval (60 ms), so one or two late or lost messages (for example
+on a congested tether) don't idle the thrusters, while the thrusters never run on stale commands for longer than a few
+control cycles.
+
+You should modify the 'SURFACE_INTERVAL' constant to change the interval agreed with the surface team, and the
+'HEARTBEAT_MISSES' constant to change the number of consecutive intervals without any message after which the surface
+is considered lost.
+
+** Example **
+
+To detect the surface not sending anything for 60 ms, call:
+
+    heartbeat = Heartbeat(0.06)
+
+Then, with each message applied, call:
+
+    heartbeat.beat()
+
+To check if the surface is lost, call:
+
+    if heartbeat.expired:
+        ...
+
+"""
+
+from math import inf
+from mmap import mmap
+from struct import Struct
+from time import monotonic
+
+# Declare the longest interval (seconds) between the surface's messages, and the default loss threshold (seconds)
+SURFACE_INTERVAL = 0.02
+HEARTBEAT_MISSES = 3
+HEARTBEAT_TIMEOUT = SURFACE_INTERVAL * HEARTBEAT_MISSES
+
+# Declare the layout of the time of the last beat
+_TIME = Struct("<d")
+
+
+class Heartbeat:
+
+    def __init__(self, timeout=HEARTBEAT_TIMEOUT):
+        """
+
+        Function used to allocate the shared memory segment of the heartbeat.
+
+        :param timeout: Time (seconds) without a beat after which the surface is considered lost, or None to disable
+
+        """
+
+        # Store the loss threshold
+        self._timeout = timeout
+
+        # Allocate the anonymous shared segment, the surface wasn't heard from yet
+        self._memory = mmap(-1, _TIME.size)
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @property
+    def deadline(self) -> float:
+        return _TIME.unpack_from(self._memory)[0] + self._timeout if self._timeout is not None else inf
+
+    @property
+    def expired(self) -> bool:
+        return monotonic() > self.deadline
+
+    def beat(self):
+        """
+
+        Function used to mark the surface as heard from.
+
+        """
+
+        _TIME.pack_into(self._memory, 0, monotonic())
+
+    def reset(self):
+        """
+
+        Function used to mark the surface as lost straight away.
+
+        """
+
+        _TIME.pack_into(self._memory, 0, 0.0)
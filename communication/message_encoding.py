@@ -0,0 +1,167 @@
+"""
+
+Message encoding is used to serialise the messages exchanged with the surface, either as JSON or as compact binary
+MessagePack.
+
+** Functionality **
+
+By importing the module you gain access to the classes 'JsonCodec' and 'MsgpackCodec', the 'CodecError' exception and
+the 'CODECS' dictionary mapping the name of each codec to its class.
+
+You should create an instance of the codec negotiated with the surface (see the 'server' module) for each connection,
+and use the 'encode' function to convert a dictionary of data into bytes to send, and the 'decode' function to convert a
+message received back into a dictionary. The 'decode' function returns None if the message holds no data (for example
+an empty line), and raises 'CodecError' if the message is corrupted or doesn't hold a dictionary with string keys. Each
+codec has the 'name' attribute (the name it's negotiated by) and the 'binary' attribute (True if the messages may hold
+any bytes, so they can't be separated by new line characters).
+
+Each connection starts with the 'DEFAULT_CODEC'. To switch to another codec, the surface sends a message holding the
+'CODEC_KEY' key with the name of the codec - the reply (still encoded with the current codec) holds the same key with
+the name of the codec used from then on, which is the current codec if the requested one was refused.
+
+The JSON codec produces the same text as before the codecs were introduced. The MessagePack codec requires the 'msgpack'
+package, which should be installed on the Pi ('pip install msgpack') - it's only imported once the codec is created,
+which raises 'CodecError' if the package is missing, so the server keeps using JSON without it. Any MessagePack
+implementation can be used by the surface.
+
+** Constants and other values **
+
+You should modify the 'DEFAULT_CODEC' constant to change the codec each connection starts with, and the 'CODEC_KEY'
+constant to change the key the codec is negotiated with.
+
+** Example **
+
+To encode the data as MessagePack, call:
+
+    codec = MsgpackCodec()
+    message = codec.encode({"Thr_FP": 1500, "Sen_IMU_X": 0.25})
+
+To decode the message back, call:
+
+    data = codec.decode(message)
+
+"""
+
+from json import dumps, loads, JSONDecodeError
+
+# Declare the codec used until another one is negotiated, and the key holding the name of the codec negotiated
+DEFAULT_CODEC = "json"
+CODEC_KEY = "codec"
+
+
+class CodecError(Exception):
+    pass
+
+
+def _check(data):
+    """
+
+    Function used to make sure the decoded message holds a dictionary with string keys.
+
+    :param data: Decoded message
+    :return: Decoded message
+
+    """
+
+    if not isinstance(data, dict) or not all(isinstance(key, str) for key in data):
+        raise CodecError("Message doesn't hold a dictionary with string keys: {}".format(data))
+
+    return data
+
+
+class JsonCodec:
+
+    # Declare the name of the codec, and whether its messages may hold any bytes
+    name = "json"
+    binary = False
+
+    def encode(self, data: dict) -> bytes:
+        return bytes(dumps(data), encoding="utf-8")
+
+    def decode(self, message: bytes):
+        """
+
+        Function used to decode a JSON message.
+
+        :param message: Message received
+        :return: Dictionary of the data, or None if the message holds no data (or isn't valid UTF-8)
+
+        """
+
+        # Convert bytes to string, remove the white spaces, ignore any invalid data
+        try:
+            message = message.decode("utf-8").strip()
+        except UnicodeDecodeError:
+            return None
+
+        if not message:
+            return None
+
+        try:
+            return _check(loads(message))
+        except JSONDecodeError:
+            raise CodecError(message)
+
+
+class MsgpackCodec:
+
+    # Declare the name of the codec, and whether its messages may hold any bytes
+    name = "msgpack"
+    binary = True
+
+    def __init__(self):
+        """
+
+        Function used to initialise the codec, importing the 'msgpack' package only once the codec is first used.
+
+        :raises CodecError: If the 'msgpack' package isn't installed
+
+        """
+
+        try:
+            from msgpack import Packer, unpackb
+        except ImportError:
+            raise CodecError("The 'msgpack' package isn't installed")
+
+        self._pack = Packer(use_bin_type=True).pack
+        self._unpack = lambda message: unpackb(message, raw=False)
+
+    def encode(self, data: dict) -> bytes:
+        """
+
+        Function used to encode the data as MessagePack.
+
+        :param data: Dictionary of the data
+        :return: Encoded message
+
+        """
+
+        try:
+            return self._pack(data)
+        except (TypeError, ValueError, OverflowError) as e:
+            raise CodecError(str(e))
+
+    def decode(self, message: bytes):
+        """
+
+        Function used to decode a MessagePack message.
+
+        :param message: Message received
+        :return: Dictionary of the data, or None if the message is empty
+
+        """
+
+        if not message:
+            return None
+
+        try:
+            return _check(self._unpack(message))
+        except (ValueError, TypeError, RecursionError) as e:
+            raise CodecError(str(e))
+
+
+# Create a dictionary mapping each codec's name to its class
+CODECS = {
+    "json": JsonCodec,
+    "msgpack": MsgpackCodec
+}
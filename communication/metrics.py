@@ -0,0 +1,627 @@
+"""
+
+Metrics are used to measure the communication while it runs, across all processes, with a negligible overhead.
+
+** Functionality **
+
+By importing the module you gain access to the classes 'Counter', 'Gauge', 'Histogram', 'Phases' and 'StatsService',
+and the 'snapshot' and 'summary' functions.
+
+You should create an instance of 'Counter' with a unique name to count events (for example the iterations of a loop),
+and use the 'add' function to increase it. You should create an instance of 'Histogram' with a unique name to measure
+times, and use the 'record' function (with the time in seconds) or the 'time' function (as a context manager, measuring
+the time spent within the context) to add a measurement. Creating a metric with a name which already exists returns the
+existing metric, in any process. You should create an instance of 'Gauge' with a unique name to report a current value
+(for example a rate), and use the 'set' function to replace it - each gauge should be set by a single process.
+
+All metrics are kept in an anonymous shared memory segment, created when the module is imported, and inherited by every
+process forked afterwards. Each process writes into its own shard of each metric, so the processes never lock each
+other when measuring, and the shards are summed when reading. The updates made at the same time by multiple threads of
+the same process may rarely be lost, which is accepted to keep the updates cheap.
+
+The histograms are HDR-style - each time is stored (in microseconds) in a bucket whose width is proportional to its
+value, so the percentiles are accurate to within ~3% for any value between a microsecond and several days, using a fixed
+amount of memory.
+
+You should use the 'snapshot' function to read the current value of each counter and gauge, and the statistics of each
+histogram (the number of measurements, mean, percentiles and maximum, in milliseconds), and the 'summary' function to
+format them in a single line, with the counters converted to rates since the previous snapshot.
+
+You should create an instance of 'Phases' with a name to measure the consecutive phases of a one-off procedure (for
+example the start-up), and use the 'mark' function with the name of each phase once it's done - each phase is measured
+from the end of the previous one. The time of each phase (milliseconds) is reported by the '<name>.<phase>' gauge, and
+the 'summary' function formats all phases and their total in a single line.
+
+You should create an instance of 'StatsService' and use the 'start' function to serve the snapshots through a local
+socket - each client connecting to the 'STATS_PATH' Unix socket receives the snapshot as a JSON line - and to print the
+summary line periodically, in a background thread.
+
+** Constants and other values **
+
+You should modify the '_SHARDS' constant to change the number of processes writing into their own shards (any processes
+above it share the last shards), the '_CAPACITY' constant to change the maximum number of metrics and the '_WORDS'
+constant to change the size of the segment (in 8-byte words, each histogram takes over 600 words per shard).
+
+You should modify the '_SUB_BITS' constant to change the precision of the histograms (each power of two is divided into
+2 ** (_SUB_BITS - 1) buckets).
+
+** Example **
+
+To measure the time of each exchange, and count the exchanges, call:
+
+    exchanges = Counter("exchanges")
+    round_trip = Histogram("round_trip")
+
+    with round_trip.time():
+        exchange()
+    exchanges.add()
+
+To print the statistics, call:
+
+    print(summary(snapshot()))
+
+"""
+
+from contextlib import contextmanager
+from json import dumps
+from mmap import mmap
+from multiprocessing import Lock
+from os import getpid, unlink
+from socket import socket, AF_UNIX, SOCK_STREAM
+from select import select
+from struct import Struct
+from threading import Thread
+from time import monotonic, perf_counter
+
+# Declare the path of the stats socket
+STATS_PATH = "/tmp/rov-stats.sock"
+
+# Declare the number of shards, the maximum number of metrics and the size of the segment
+_SHARDS = 8
+_CAPACITY = 256
+_WORDS = 1 << 18
+
+# Declare the precision of the histograms, and the maximum value (microseconds) stored
+_SUB_BITS = 5
+_SUB_COUNT = 1 << _SUB_BITS
+_HALF_COUNT = _SUB_COUNT >> 1
+_MAX_VALUE = (1 << 40) - 1
+_BUCKETS = _SUB_COUNT + (_MAX_VALUE.bit_length() - _SUB_BITS) * _HALF_COUNT
+
+# Declare the words of each histogram's shard - the number of measurements, their sum and maximum, and the buckets
+_COUNT, _SUM, _MAX, _FIRST_BUCKET = range(4)
+_HISTOGRAM_WORDS = _FIRST_BUCKET + _BUCKETS
+
+# Declare the layouts of the segment header (number of metrics, words used and shards claimed) and each metric's entry
+_HEADER = Struct("<QQQ")
+_ENTRY = Struct("<47scQ")
+_NAME_SIZE = 47
+
+# Declare the kinds of the metrics, and the number of words each of them takes
+_COUNTER = b"c"
+_GAUGE = b"g"
+_HISTOGRAM = b"h"
+_SIZES = {_COUNTER: _SHARDS, _GAUGE: 1, _HISTOGRAM: _SHARDS * _HISTOGRAM_WORDS}
+
+# Declare the percentiles reported
+PERCENTILES = (50, 90, 99)
+
+
+def _bucket(value: int) -> int:
+    """
+
+    Function used to find the bucket of a value.
+
+    :param value: Value (microseconds)
+    :return: Index of the bucket
+
+    """
+
+    # Small values have their own buckets
+    if value < _SUB_COUNT:
+        return value
+
+    # Otherwise keep the most significant bits of the value
+    shift = value.bit_length() - _SUB_BITS
+    return _SUB_COUNT + (shift - 1) * _HALF_COUNT + (value >> shift) - _HALF_COUNT
+
+
+def _bucket_value(bucket: int) -> int:
+    """
+
+    Function used to find the value represented by a bucket - the middle of the values stored in it.
+
+    :param bucket: Index of the bucket
+    :return: Value (microseconds)
+
+    """
+
+    if bucket < _SUB_COUNT:
+        return bucket
+
+    # Find the shift and the most significant bits of the values in the bucket
+    shift, top = divmod(bucket - _SUB_COUNT, _HALF_COUNT)
+    shift, top = shift + 1, top + _HALF_COUNT
+
+    return (top << shift) + (1 << (shift - 1))
+
+
+class _Registry:
+
+    def __init__(self):
+        """
+
+        Function used to allocate the shared segment holding all metrics.
+
+        """
+
+        # Allocate the anonymous shared segment, and view its data as 8-byte words (and as 8-byte floats for the gauges)
+        self._memory = mmap(-1, _HEADER.size + _CAPACITY * _ENTRY.size + _WORDS * 8)
+        self._words = memoryview(self._memory)[_HEADER.size + _CAPACITY * _ENTRY.size:].cast("Q")
+        self._floats = self._words.cast("B").cast("d")
+
+        # Initialise the lock used to register the metrics and claim the shards
+        self._lock = Lock()
+
+        # Initialise the process-local lookup of the metrics' kind and first word
+        self._metrics = {}
+
+        # Declare the process and its shard
+        self._pid = None
+        self._shard = 0
+
+    @property
+    def words(self) -> memoryview:
+        return self._words
+
+    @property
+    def floats(self) -> memoryview:
+        return self._floats
+
+    def shard(self) -> int:
+        """
+
+        Function used to find the shard of the current process, claimed on the first use in each process.
+
+        :return: Index of the shard
+
+        """
+
+        if self._pid != getpid():
+            with self._lock:
+                count, used, claimed = _HEADER.unpack_from(self._memory)
+                _HEADER.pack_into(self._memory, 0, count, used, claimed + 1)
+
+            self._pid = getpid()
+            self._shard = min(claimed, _SHARDS - 1)
+
+        return self._shard
+
+    def _entries(self):
+        """
+
+        Function used to read the entries of all metrics registered in any process.
+
+        :return: Generator of tuples of the name, the kind and the first word of each metric
+
+        """
+
+        for index in range(_HEADER.unpack_from(self._memory)[0]):
+            name, kind, offset = _ENTRY.unpack_from(self._memory, _HEADER.size + index * _ENTRY.size)
+            yield name.rstrip(b"\x00").decode("utf-8"), kind, offset
+
+    def register(self, name: str, kind: bytes) -> int:
+        """
+
+        Function used to find the first word of a metric, registering it if it doesn't exist yet.
+
+        :param name: Unique name of the metric
+        :param kind: Kind of the metric
+        :return: First word of the metric
+
+        """
+
+        # Make sure the name can be stored
+        if not name or len(name.encode("utf-8")) > _NAME_SIZE:
+            raise ValueError("Metric name {} must have between 1 and {} bytes".format(name, _NAME_SIZE))
+
+        with self._lock:
+
+            # Find the metric registered by any process
+            self._metrics.update((entry[0], entry[1:]) for entry in self._entries())
+
+            if name in self._metrics:
+                if self._metrics[name][0] != kind:
+                    raise ValueError("Metric {} already exists with a different kind".format(name))
+                return self._metrics[name][1]
+
+            # Make sure the metric fits in the segment
+            count, used, claimed = _HEADER.unpack_from(self._memory)
+            size = _SIZES[kind]
+
+            if count >= _CAPACITY or used + size > _WORDS:
+                raise ValueError("No space left for the metric {}".format(name))
+
+            # Register the metric
+            _ENTRY.pack_into(self._memory, _HEADER.size + count * _ENTRY.size, name.encode("utf-8"), kind, used)
+            _HEADER.pack_into(self._memory, 0, count + 1, used + size, claimed)
+            self._metrics[name] = kind, used
+
+            return used
+
+    def read(self) -> dict:
+        """
+
+        Function used to sum the shards of all metrics.
+
+        :return: Dictionary mapping the name of each metric to its kind and value - the value of a counter or a gauge,
+                 or the bucket counts, sum and maximum of a histogram
+
+        """
+
+        with self._lock:
+            entries = list(self._entries())
+
+        words, values = self._words, {}
+
+        for name, kind, offset in entries:
+
+            # Sum the counter's shards
+            if kind == _COUNTER:
+                values[name] = kind, sum(words[offset:offset + _SHARDS])
+                continue
+
+            # Read the gauge's single value
+            if kind == _GAUGE:
+                values[name] = kind, self._floats[offset]
+                continue
+
+            # Sum the histogram's shards
+            count, total, maximum, buckets = 0, 0, 0, [0] * _BUCKETS
+            for shard in range(_SHARDS):
+                start = offset + shard * _HISTOGRAM_WORDS
+                count += words[start + _COUNT]
+                total += words[start + _SUM]
+                maximum = max(maximum, words[start + _MAX])
+                if words[start + _COUNT]:
+                    buckets = [a + b for a, b in zip(buckets, words[start + _FIRST_BUCKET:start + _HISTOGRAM_WORDS])]
+
+            values[name] = kind, (count, total, maximum, buckets)
+
+        return values
+
+
+# Create the segment when the module is imported, so it's inherited by all processes
+_registry = _Registry()
+
+
+class Counter:
+
+    def __init__(self, name: str):
+        """
+
+        Function used to register the counter.
+
+        :param name: Unique name of the counter
+
+        """
+
+        self._offset = _registry.register(name, _COUNTER)
+
+    def add(self, value=1):
+        """
+
+        Function used to increase the counter.
+
+        :param value: Value to add
+
+        """
+
+        _registry.words[self._offset + _registry.shard()] += value
+
+
+class Gauge:
+
+    def __init__(self, name: str):
+        """
+
+        Function used to register the gauge.
+
+        :param name: Unique name of the gauge
+
+        """
+
+        self._offset = _registry.register(name, _GAUGE)
+
+    def set(self, value: float):
+        """
+
+        Function used to replace the value of the gauge.
+
+        :param value: New value
+
+        """
+
+        _registry.floats[self._offset] = value
+
+
+class Histogram:
+
+    def __init__(self, name: str):
+        """
+
+        Function used to register the histogram.
+
+        :param name: Unique name of the histogram
+
+        """
+
+        self._offset = _registry.register(name, _HISTOGRAM)
+
+    def record(self, seconds: float):
+        """
+
+        Function used to add a measurement.
+
+        :param seconds: Time measured (seconds)
+
+        """
+
+        # Convert the time to microseconds, within the supported range
+        value = min(max(int(seconds * 1000000), 0), _MAX_VALUE)
+
+        # Update the shard of the current process
+        words = _registry.words
+        start = self._offset + _registry.shard() * _HISTOGRAM_WORDS
+
+        words[start + _COUNT] += 1
+        words[start + _SUM] += value
+        if value > words[start + _MAX]:
+            words[start + _MAX] = value
+        words[start + _FIRST_BUCKET + _bucket(value)] += 1
+
+    @contextmanager
+    def time(self):
+        """
+
+        Function used to measure the time spent within the context.
+
+        """
+
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(perf_counter() - start)
+
+
+def _statistics(count: int, total: int, maximum: int, buckets: list) -> dict:
+    """
+
+    Function used to calculate the statistics of a histogram.
+
+    :param count: Number of measurements
+    :param total: Sum of the measurements (microseconds)
+    :param maximum: Maximum measurement (microseconds)
+    :param buckets: Number of measurements in each bucket
+    :return: Dictionary of the number of measurements, and the mean, percentiles and maximum (milliseconds)
+
+    """
+
+    statistics = {"count": count, "mean": total / count / 1000 if count else 0.0}
+
+    # Find the bucket holding each percentile
+    targets = [(p, count * p / 100) for p in PERCENTILES]
+    cumulative = 0
+    for bucket, bucket_count in enumerate(buckets):
+        if not bucket_count:
+            continue
+
+        cumulative += bucket_count
+        while targets and cumulative >= targets[0][1]:
+            statistics["p{}".format(targets.pop(0)[0])] = min(_bucket_value(bucket), maximum) / 1000
+
+    # Fill in the percentiles of empty histograms
+    for p, _ in targets:
+        statistics["p{}".format(p)] = 0.0
+
+    statistics["max"] = maximum / 1000
+
+    return statistics
+
+
+def snapshot() -> dict:
+    """
+
+    Function used to read all metrics.
+
+    :return: Dictionary of the monotonic time of reading, the value of each counter and gauge, and the statistics of
+             each histogram
+
+    """
+
+    counters, gauges, histograms = {}, {}, {}
+
+    for name, (kind, value) in _registry.read().items():
+        if kind == _COUNTER:
+            counters[name] = value
+        elif kind == _GAUGE:
+            gauges[name] = value
+        else:
+            histograms[name] = _statistics(*value)
+
+    return {"time": monotonic(), "counters": counters, "gauges": gauges, "histograms": histograms}
+
+
+def summary(current: dict, previous=None) -> str:
+    """
+
+    Function used to format the snapshot in a single line.
+
+    :param current: Snapshot to format
+    :param previous: Earlier snapshot to calculate the counters' rates from, or None to show the counters' values
+    :return: Summary line
+
+    """
+
+    parts = []
+
+    # Show the rates of the counters, or their values
+    for name, value in sorted(current["counters"].items()):
+        if previous is None:
+            parts.append("{} {}".format(name, value))
+        else:
+            elapsed = current["time"] - previous["time"]
+            rate = (value - previous["counters"].get(name, 0)) / elapsed if elapsed > 0 else 0.0
+            parts.append("{} {:.1f}/s".format(name, rate))
+
+    # Show the values of the gauges
+    for name, value in sorted(current["gauges"].items()):
+        parts.append("{} {:.1f}".format(name, value))
+
+    # Show the median, 99th percentile and maximum of the histograms with measurements
+    for name, statistics in sorted(current["histograms"].items()):
+        if statistics["count"]:
+            parts.append("{} p50 {:.2f} p99 {:.2f} max {:.2f} ms".format(
+                name, statistics["p50"], statistics["p99"], statistics["max"]))
+
+    return "Stats: " + ", ".join(parts)
+
+
+class Phases:
+
+    def __init__(self, name: str, start=None):
+        """
+
+        Function used to start measuring the phases.
+
+        :param name: Name of the procedure, used to name the gauges
+        :param start: Monotonic time the first phase started at, or None to start now
+
+        """
+
+        # Store the procedure's information
+        self._name = name
+        self._start = monotonic() if start is None else start
+
+        # Initialise the end of the last phase, and the name and time of each phase
+        self._last = self._start
+        self._phases = []
+
+    def mark(self, phase: str) -> float:
+        """
+
+        Function used to mark the end of a phase.
+
+        :param phase: Name of the phase
+        :return: Time (seconds) of the phase
+
+        """
+
+        end = monotonic()
+        duration = end - self._last
+        self._last = end
+
+        self._phases.append((phase, duration))
+        Gauge("{}.{}".format(self._name, phase)).set(duration * 1000)
+
+        return duration
+
+    def summary(self) -> str:
+        """
+
+        Function used to format the phases in a single line.
+
+        :return: Summary line
+
+        """
+
+        return "{}: {}, total {:.1f} ms".format(self._name.capitalize(), ", ".join(
+            "{} {:.1f} ms".format(phase, duration * 1000) for phase, duration in self._phases),
+            (self._last - self._start) * 1000)
+
+
+class StatsService:
+
+    def __init__(self, path=STATS_PATH, interval=10):
+        """
+
+        Function used to initialise the service.
+
+        :param path: Path of the Unix socket to serve the snapshots through, or None to not serve them
+        :param interval: Interval (seconds) between the summary lines, or None to not print them
+
+        """
+
+        # Store the service information
+        self._path = path
+        self._interval = interval
+
+        # Initialise the thread of the service
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def _listen(self):
+        """
+
+        Function used to create the socket serving the snapshots.
+
+        :return: Listening socket, or None if the snapshots aren't served
+
+        """
+
+        if not self._path:
+            return None
+
+        # Remove the socket left by a previous run
+        try:
+            unlink(self._path)
+        except FileNotFoundError:
+            pass
+
+        server = socket(AF_UNIX, SOCK_STREAM)
+        server.bind(self._path)
+        server.listen(4)
+
+        return server
+
+    def _run(self):
+        """
+
+        Function used to keep serving the snapshots and printing the summary lines.
+
+        """
+
+        server = self._listen()
+        previous = snapshot()
+        deadline = monotonic() + self._interval if self._interval else None
+
+        while True:
+
+            # Wait for a client until the next summary line is due
+            timeout = None if deadline is None else max(deadline - monotonic(), 0)
+            readable = select((server,), (), (), timeout)[0] if server else select((), (), (), timeout)[0]
+
+            # Send the snapshot to the client
+            if readable:
+                client, _ = server.accept()
+                try:
+                    client.sendall(bytes(dumps(snapshot()) + "\n", encoding="utf-8"))
+                except OSError:
+                    pass
+                client.close()
+
+            # Print the summary line
+            if deadline is not None and monotonic() >= deadline:
+                current = snapshot()
+                print(summary(current, previous))
+                previous = current
+                deadline += self._interval
+
+    def start(self):
+        """
+
+        Function used to start the service.
+
+        """
+
+        self._thread.start()
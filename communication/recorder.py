@@ -0,0 +1,348 @@
+"""
+
+Recorder is used to keep the history of all data changes, and to replay it afterwards.
+
+** Functionality **
+
+By importing the module you gain access to the class 'Recorder' and the 'read_recording' and 'replay' functions.
+
+You should create an instance of 'Recorder' with the directory to record into, and use the 'record' function to append
+the device index and the dictionary of data changed, together with the monotonic time of the change. Normally, you don't
+need to do it yourself - call the data manager's 'use_recorder' function instead, which records every change made with
+'set_data' and 'set_many'.
+
+The records are appended to segment files, which are mapped into the memory - recording a change only copies a few bytes
+into the memory, while the operating system writes the pages back to the disk in the background, so the control loops
+never wait for the SD card. Once a segment is full, a new one is created. Each process (the recorder is inherited by the
+processes started afterwards) writes its own segments, named 'telemetry-<process id>-<segment number>.bin', so there is
+no locking between the processes. The changes which can't be recorded (a key or value too long, or a change bigger
+than a segment) are dropped, and counted by the 'recorder.dropped' counter (see the 'metrics' module) - recording never
+fails a change which was already applied.
+
+Each segment starts with a header (magic 'TLM1', format version, record size and the wall-clock and monotonic times of
+the segment's creation) padded to the size of a record, followed by the fixed-size (64 bytes) little-endian records:
+
+    1. Monotonic time of the change (8-byte float).
+    2. Device byte, the position of the device in the 'DEVICES' tuple.
+    3. Type tag of the value, as in the 'storage' module ('+' marks a continuation record).
+    4. Size of the encoded value (2 bytes).
+    5. Key, padded with null bytes (32 bytes).
+    6. First bytes of the encoded value (20 bytes). Longer values continue in the following continuation records, each
+       holding the same time and device, followed by 52 more bytes of the value.
+
+You should use the 'read_recording' function to iterate over the changes recorded in the given directory, in the order
+of their time, and the 'replay' function to pass them to the data manager again - at the original pace, sped up by the
+given factor, or as fast as possible.
+
+Running the module replays the given recording into a new data manager, printing each change. Use the '--help' option
+to see the options.
+
+** Constants and other values **
+
+You should modify the 'DEVICES' tuple to change the device byte assigned to each device.
+
+** Example **
+
+To record all changes of the data into the 'recordings' directory, call:
+
+    dm.use_recorder("recordings")
+
+To replay the recording twice as fast, call:
+
+    replay("recordings", speed=2)
+
+"""
+
+import communication.data_manager as dm
+from communication.metrics import Counter
+from communication.storage import _encode, _decode
+from heapq import merge
+from mmap import mmap
+from os import getpid, listdir, makedirs, path
+from struct import Struct
+from threading import Lock
+from time import monotonic, sleep, time
+
+# Declare the device byte of each device
+DEVICES = (dm.SURFACE, dm.ARDUINO_T, dm.ARDUINO_A, dm.ARDUINO_M, dm.ARDUINO_I)
+
+# Declare the size of the key and of the value within the first record and within each continuation record
+_KEY_SIZE = 32
+_FIRST_CHUNK = 20
+_NEXT_CHUNK = 52
+
+# Declare the layouts of the records (the first one of each value, and the continuation records)
+_RECORD = Struct("<dBcH{}s{}s".format(_KEY_SIZE, _FIRST_CHUNK))
+_CONTINUATION = Struct("<dBc2x{}s".format(_NEXT_CHUNK))
+
+# Declare the layout of the segment header, and its format version
+_SEGMENT_HEADER = Struct("<4sHHdd")
+_MAGIC = b"TLM1"
+_VERSION = 1
+
+# Declare the tags of the unwritten and the continuation records
+_EMPTY = b"\x00"
+_CONTINUED = b"+"
+
+# Declare the maximum size of an encoded value
+_MAX_VALUE_SIZE = 0xFFFF
+
+
+def _encode_records(timestamp: float, device: int, data: dict) -> bytes:
+    """
+
+    Function used to encode the records of a single change.
+
+    :param timestamp: Monotonic time of the change
+    :param device: Device byte
+    :param data: Dictionary of key, value pairs changed
+    :return: Encoded records
+
+    """
+
+    records = []
+
+    for key, value in data.items():
+        tag, payload = _encode(value)
+        name = key.encode("utf-8")
+
+        # Make sure the record can be decoded again
+        if not name or len(name) > _KEY_SIZE or b"\x00" in name or len(payload) > _MAX_VALUE_SIZE:
+            raise ValueError("Key {} or its value is too long to be recorded".format(key))
+
+        # Append the first record and the continuation records holding the rest of the value
+        records.append(_RECORD.pack(timestamp, device, tag, len(payload), name, payload[:_FIRST_CHUNK]))
+        for start in range(_FIRST_CHUNK, len(payload), _NEXT_CHUNK):
+            records.append(_CONTINUATION.pack(timestamp, device, _CONTINUED, payload[start:start + _NEXT_CHUNK]))
+
+    return b"".join(records)
+
+
+class Recorder:
+
+    def __init__(self, directory="recordings", segment_size=1 << 24):
+        """
+
+        Function used to initialise the recorder. The segments are only created once the first change is recorded.
+
+        :param directory: Directory to create the segments in
+        :param segment_size: Size (bytes) of each segment
+
+        """
+
+        # Store the segments information (the size is rounded down to the whole records)
+        self._directory = directory
+        self._segment_size = max(segment_size // _RECORD.size, 2) * _RECORD.size
+
+        # Declare the current segment, its number and the position of the next record within it
+        self._memory = None
+        self._segment = 0
+        self._position = 0
+
+        # Declare the process the current segment belongs to
+        self._pid = None
+
+        # Initialise the lock protecting the segment from concurrent writes within a process
+        self._lock = Lock()
+
+        # Register the metric of the changes which couldn't be recorded
+        self._dropped = Counter("recorder.dropped")
+
+    def _rotate(self):
+        """
+
+        Function used to close the current segment and create the next one.
+
+        """
+
+        # Start numbering the segments again in a new process (the parent's segment must not be written to)
+        if self._pid != getpid():
+            self._pid = getpid()
+            self._segment = 0
+            makedirs(self._directory, exist_ok=True)
+
+        # Close the full segment, its pages are written back to the disk by the operating system
+        if self._memory is not None:
+            self._memory.close()
+
+        # Create the next segment file of the full size, without writing it
+        self._segment += 1
+        with open(path.join(self._directory, "telemetry-{}-{:04d}.bin".format(self._pid, self._segment)), "w+b") as f:
+            f.truncate(self._segment_size)
+            self._memory = mmap(f.fileno(), self._segment_size)
+
+        # Write the header, padded to the size of a record
+        _SEGMENT_HEADER.pack_into(self._memory, 0, _MAGIC, _VERSION, _RECORD.size, time(), monotonic())
+        self._position = _RECORD.size
+
+    def record(self, index, data: dict, timestamp=None):
+        """
+
+        Function used to append a change to the current segment. The change is dropped (and counted) if it can't be
+        recorded.
+
+        :param index: Device index the data was changed for
+        :param data: Dictionary of key, value pairs changed
+        :param timestamp: Monotonic time of the change, or None to use the current time
+
+        """
+
+        # Drop the change if any of its keys or values can't be recorded
+        try:
+            records = _encode_records(monotonic() if timestamp is None else timestamp, DEVICES.index(index), data)
+        except (TypeError, ValueError):
+            self._dropped.add()
+            return
+
+        # Make sure the change fits within a segment
+        if len(records) > self._segment_size - _RECORD.size:
+            self._dropped.add()
+            return
+
+        with self._lock:
+
+            # Create a new segment in a new process, or if the current one is full
+            if self._pid != getpid() or self._position + len(records) > self._segment_size:
+                self._rotate()
+
+            # Copy the records into the segment
+            self._memory[self._position:self._position + len(records)] = records
+            self._position += len(records)
+
+    def close(self):
+        """
+
+        Function used to close the current segment.
+
+        """
+
+        with self._lock:
+            if self._memory is not None and self._pid == getpid():
+                self._memory.close()
+                self._memory = None
+
+
+def _read_segment(file_path: str):
+    """
+
+    Function used to read the changes recorded in a single segment, in the order they were recorded.
+
+    :param file_path: Path to the segment
+    :return: Generator of tuples of the time, the device index and the dictionary of data changed
+
+    """
+
+    with open(file_path, "rb") as f:
+        data = f.read()
+
+    # Make sure the segment was written by the recorder
+    if len(data) < _RECORD.size or _SEGMENT_HEADER.unpack_from(data)[:3] != (_MAGIC, _VERSION, _RECORD.size):
+        raise ValueError("{} isn't a valid segment".format(file_path))
+
+    # Declare the change being read, and the position in the segment
+    change = None
+    position = _RECORD.size
+
+    while position + _RECORD.size <= len(data):
+        timestamp, device, tag, size, name, payload = _RECORD.unpack_from(data, position)
+        position += _RECORD.size
+
+        # Stop at the first unwritten record
+        if tag == _EMPTY:
+            break
+
+        # Read the rest of the value from the continuation records
+        payload = payload[:size]
+        while len(payload) < size:
+            payload += _CONTINUATION.unpack_from(data, position)[3][:size - len(payload)]
+            position += _RECORD.size
+
+        # Start a new change if the time or the device differ
+        if change is None or change[:2] != (timestamp, DEVICES[device]):
+            if change is not None:
+                yield change
+            change = timestamp, DEVICES[device], {}
+
+        change[2][name.rstrip(b"\x00").decode("utf-8")] = _decode(tag, payload)
+
+    if change is not None:
+        yield change
+
+
+def read_recording(directory: str):
+    """
+
+    Function used to read the changes recorded in all segments of a directory, in the order of their time.
+
+    :param directory: Directory the segments were created in
+    :return: Generator of tuples of the time, the device index and the dictionary of data changed
+
+    """
+
+    # Find the segments, in the order they were created in by each process
+    segments = {}
+    for name in sorted(listdir(directory)):
+        if name.startswith("telemetry-") and name.endswith(".bin"):
+            segments.setdefault(name.split("-")[1], []).append(path.join(directory, name))
+
+    # Chain the segments of each process, and merge the processes by the time of the changes
+    def read_process(paths):
+        for file_path in paths:
+            yield from _read_segment(file_path)
+
+    return merge(*(read_process(paths) for paths in segments.values()), key=lambda change: change[0])
+
+
+def replay(directory: str, speed=1.0, set_many=None, callback=None) -> int:
+    """
+
+    Function used to pass the recorded changes to the data manager again.
+
+    :param directory: Directory the segments were created in
+    :param speed: Factor to speed up the replay by, or 0 to replay as fast as possible
+    :param set_many: Function to pass each change to, or None to use the data manager's 'set_many'
+    :param callback: Function to call with the time, the device index and the data of each change replayed, or None
+    :return: Number of changes replayed
+
+    """
+
+    set_many = set_many or dm.set_many
+
+    # Declare the time of the first change, and the time the replay started at
+    first, start = None, monotonic()
+    count = 0
+
+    for timestamp, index, data in read_recording(directory):
+
+        # Keep the original intervals between the changes, divided by the speed
+        if first is None:
+            first = timestamp
+        elif speed:
+            delay = (timestamp - first) / speed - (monotonic() - start)
+            if delay > 0:
+                sleep(delay)
+
+        set_many(index, data)
+        count += 1
+
+        if callback:
+            callback(timestamp, index, data)
+
+    return count
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Replay the changes recorded by the data manager")
+    parser.add_argument("directory", help="Directory the segments were created in")
+    parser.add_argument("--speed", type=float, default=1, help="Factor to speed up the replay by, 0 for no delays")
+    parser.add_argument("--quiet", action="store_true", help="Don't print each change")
+
+    arguments = parser.parse_args()
+
+    def _print_change(timestamp, index, data):
+        if not arguments.quiet:
+            print("{:.6f} {!r} {}".format(timestamp, index, data))
+
+    print("Replayed {} changes".format(replay(arguments.directory, arguments.speed, callback=_print_change)))
@@ -0,0 +1,65 @@
+"""
+
+Runtime is used to run all communication within a single event loop, as an alternative to one process per link.
+
+** Functionality **
+
+By importing the module you gain access to the class 'AsyncRuntime'.
+
+You should create an instance of 'AsyncRuntime' with an instance of 'Server' and any number of 'VideoStream' instances,
+and use the 'run' function to start the communication. Instead of starting a process for the surface and each Arduino
+(and a thread for each video stream), the runtime drives the surface socket, every serial port (through its
+non-blocking file descriptor) and each video stream from a single asyncio event loop. The 'run' function blocks forever.
+
+Since all links run within a single process, the data should be kept in memory - call the data manager's 'use_backend'
+function with "memory" before creating the server. The frames of the video streams may still be set from other threads.
+
+** Example **
+
+To run the server and a video stream within the event loop, call:
+
+    dm.use_backend("memory")
+    runtime = AsyncRuntime(Server(), VideoStream())
+    runtime.run()
+
+"""
+
+import asyncio
+
+
+class AsyncRuntime:
+
+    def __init__(self, server, *streams):
+        """
+
+        Function used to initialise the runtime.
+
+        :param server: Instance of the 'Server' to run
+        :param streams: Instances of the 'VideoStream' to run
+
+        """
+
+        # Store the server and the streams information
+        self._server = server
+        self._streams = streams
+
+    async def _run_async(self):
+        """
+
+        Function used to run the server and each stream concurrently.
+
+        """
+
+        await asyncio.gather(self._server.run_async(), *(stream.run_async() for stream in self._streams))
+
+    def run(self):
+        """
+
+        Function used to run the event loop.
+
+        """
+
+        # Create a new event loop for the current thread and run the communication within it
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(self._run_async())
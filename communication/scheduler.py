@@ -0,0 +1,186 @@
+"""
+
+Scheduler is used to pace the exchanges with each Arduino according to what the Arduino drives.
+
+** Functionality **
+
+By importing the module you gain access to the class 'Scheduler'.
+
+You should create an instance of 'Scheduler' for each Arduino, with its target rate (exchanges per second), deadline
+(seconds) and keep-alive interval (seconds). Use the 'start' function right before each exchange, and the 'finish'
+function right after it, passing whether the Arduino replied. The scheduler then tells:
+
+    - 'earliest' - the monotonic time before which the next exchange shouldn't start, so the Arduino is never exchanged
+      with faster than its target rate, even if its data keeps changing.
+    - 'latest' - the monotonic time at which the next exchange should start even if the data hasn't changed, so the
+      Arduino keeps receiving the data (and is polled for its readings) at least once per keep-alive interval.
+    - 'timeout' - the time (seconds) to wait for the reply of the next exchange.
+
+Use the 'fit' function to lengthen the deadline to the time an exchange takes at the least - for example the time to
+transfer the largest frames at the baud rate of the connection - so a slow link isn't mistaken for a slow device.
+
+The scheduler adapts to the Arduino - each exchange which didn't complete within the deadline (or wasn't replied to)
+doubles the interval between the exchanges and the timeout, up to the maximum back-off, and each exchange completed in
+time tightens them again, towards the target.
+
+The achieved rate (smoothed over the recent exchanges), the target rate and the currently scheduled rate of each device
+are reported by the '<name>.rate', '<name>.target' and '<name>.scheduled' gauges, and the exchanges which missed their
+deadline are counted by the '<name>.missed' counter (see the 'metrics' module).
+
+** Constants and other values **
+
+You should modify the '_MAX_BACKOFF' constant to change the maximum factor the interval and the timeout are
+multiplied by, the '_MAX_TIMEOUT' constant to change the maximum timeout (seconds, unless the deadline itself is
+longer), and the '_TIGHTEN' constant to change the factor the back-off is reduced by with each exchange completed in
+time.
+
+You should modify the '_SMOOTHING' constant to change the weight of each new exchange in the achieved rate.
+
+** Example **
+
+To exchange the data with an Arduino at 100 Hz, within 50 ms, and at least every 20 ms, call:
+
+    scheduler = Scheduler("Ard_T", 100, 0.05, 0.02)
+
+    while True:
+        sleep(max(scheduler.earliest - monotonic(), 0))
+        dm.wait_data(dm.ARDUINO_T, max(scheduler.latest - monotonic(), 0))
+
+        scheduler.start()
+        replied = exchange(scheduler.timeout)
+        scheduler.finish(replied)
+
+"""
+
+from communication.metrics import Counter, Gauge
+from time import monotonic
+
+# Declare the maximum back-off factor and timeout, and the factor the back-off is reduced by
+_MAX_BACKOFF = 8
+_MAX_TIMEOUT = 1
+_TIGHTEN = 0.9
+
+# Declare the weight of each new exchange in the achieved rate
+_SMOOTHING = 0.1
+
+
+class Scheduler:
+
+    def __init__(self, name: str, rate: float, deadline: float, keep_alive: float):
+        """
+
+        Function used to initialise the schedule of a device.
+
+        :param name: Name of the device, used to name its metrics
+        :param rate: Target number of exchanges per second
+        :param deadline: Time (seconds) each exchange should complete within
+        :param keep_alive: Maximum time (seconds) between the exchanges if the data hasn't changed
+
+        """
+
+        # Store the schedule information, the deadline can't be shorter than the shortest possible exchange
+        self._target = rate
+        self._deadline = deadline
+        self._keep_alive = keep_alive
+        self._minimum = 0.0
+
+        # Initialise the back-off factor
+        self._backoff = 1.0
+
+        # Declare the start of the current and the previous exchange, and the smoothed time between the exchanges
+        self._started = None
+        self._previous = None
+        self._period = None
+
+        # Register the metrics of the schedule
+        self._rate = Gauge(name + ".rate")
+        self._scheduled = Gauge(name + ".scheduled")
+        self._missed = Counter(name + ".missed")
+        Gauge(name + ".target").set(rate)
+        self._scheduled.set(rate)
+
+    @property
+    def interval(self) -> float:
+        return self._backoff / self._target
+
+    @property
+    def deadline(self) -> float:
+        return max(self._deadline, self._minimum)
+
+    @property
+    def timeout(self) -> float:
+        return min(self.deadline * self._backoff, max(_MAX_TIMEOUT, self.deadline))
+
+    @property
+    def earliest(self) -> float:
+        return self._previous + self.interval if self._previous is not None else 0.0
+
+    @property
+    def latest(self) -> float:
+        return self._previous + max(self._keep_alive, self.interval) if self._previous is not None else 0.0
+
+    @property
+    def rate(self) -> float:
+        return 1 / self._period if self._period else 0.0
+
+    def start(self):
+        """
+
+        Function used to mark the start of an exchange.
+
+        """
+
+        self._started = monotonic()
+
+        # Smooth the time between the exchanges
+        if self._previous is not None:
+            period = self._started - self._previous
+            self._period = period if self._period is None else self._period + _SMOOTHING * (period - self._period)
+            self._rate.set(self.rate)
+
+        self._previous = self._started
+
+    def finish(self, replied: bool) -> float:
+        """
+
+        Function used to mark the end of an exchange, and adapt the schedule to it.
+
+        :param replied: Boolean to specify if the Arduino replied
+        :return: Duration (seconds) of the exchange
+
+        """
+
+        duration = monotonic() - self._started
+
+        # Back off if the Arduino is too slow, otherwise tighten the schedule towards the target
+        if not replied or duration > self.deadline:
+            self._missed.add()
+            self._backoff = min(self._backoff * 2, _MAX_BACKOFF)
+        else:
+            self._backoff = max(self._backoff * _TIGHTEN, 1.0)
+
+        self._scheduled.set(1 / self.interval)
+
+        return duration
+
+    def fit(self, duration: float):
+        """
+
+        Function used to make sure the deadline is long enough for an exchange lasting the given time.
+
+        :param duration: Shortest possible duration (seconds) of an exchange
+
+        """
+
+        self._minimum = duration
+
+    def reset(self):
+        """
+
+        Function used to forget the history of a lost connection, so the next exchange starts straight away.
+
+        """
+
+        self._previous = None
+        self._period = None
+        self._backoff = 1.0
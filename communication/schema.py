@@ -0,0 +1,173 @@
+"""
+
+Schema is used to compile the keys known upfront into a fixed layout - an integer identifier, a type and an owning
+device for each key - together with the tables routing the data between the surface and the Arduino-s.
+
+** Functionality **
+
+By importing the module you gain access to the class 'Schema'.
+
+You should create an instance of 'Schema' with the dictionary mapping each device index to its transmission keys, the
+index of the surface, the keys additionally held by the surface (for example the default values) and the dictionary
+mapping key prefixes to types. Normally, you don't need to do it yourself - the data manager compiles its schema when
+it's created (see the 'data_manager' module).
+
+Each key is assigned an integer identifier - its position in the 'keys' tuple, in which the keys are ordered by their
+owning device, then by their type and name, so the keys of a device sharing a type are numbered consecutively. The 'ids'
+dictionary maps each key to its identifier, the 'owners' dictionary maps each key to its owning device - the Arduino
+it's sent to, or the surface for the rest of the keys - and the 'types' dictionary maps each typed key to the name of
+its NumPy type. The 'stores' dictionary maps each device index to the keys known upfront by its store - the surface
+knows all keys, whereas each Arduino knows its transmission keys.
+
+The typed keys are kept in typed arrays rather than as separate values, an array of each type per store (see the
+'storage' module), so changing all thrusters at once is a single vectorised assignment. Their values must be numbers
+within the range of their type (and whole numbers for the integer types) - use the 'check' function to raise
+'ValueError' before storing any data which doesn't fit.
+
+The routing is precomputed as well. Use the 'split' function to divide the surface's data by the Arduino-s it's sent
+to, and the 'forward' function to select the data received from an Arduino which is passed on to the surface (the
+surface's transmission keys).
+
+** Example **
+
+Let the thrusters' Arduino be sent the "Thr_FP" and "Thr_FS" keys, and the surface be sent the "Sen_IMU_X" key. To
+compile the schema, with the thrusters' values kept as 16-bit integers, call:
+
+    schema = Schema({0: {"Sen_IMU_X"}, "Ard_T": {"Thr_FP", "Thr_FS"}}, 0, types={"Thr_": "int16"})
+
+To route the surface's data, call:
+
+    schema.check({"Thr_FP": 1700, "axis_x": 10})
+    updates = schema.split({"Thr_FP": 1700, "axis_x": 10})
+
+The result of printing 'updates' is as follows:
+
+    {'Ard_T': {'Thr_FP': 1700}}
+
+"""
+
+
+class Schema:
+
+    def __init__(self, transmission_keys: dict, surface, extra=(), types=None):
+        """
+
+        Function used to compile the keys known upfront and the routing tables.
+
+        :param transmission_keys: Dictionary mapping each device index to an iterable of its transmission keys
+        :param surface: Device index of the surface
+        :param extra: Iterable of the keys additionally held by the surface
+        :param types: Dictionary mapping key prefixes to the names of NumPy types, the other keys aren't typed
+
+        """
+
+        # Import NumPy only when the schema is compiled, to keep importing the data manager instant
+        from numpy import dtype, finfo, iinfo
+
+        # Create a key to Arduino lookup of the surface's data sent to each Arduino
+        self._routes = {key: index for index, keys in transmission_keys.items() if index != surface for key in keys}
+
+        # Create the set of the Arduino-s' data passed on to the surface
+        self._feedback = frozenset(transmission_keys[surface])
+
+        # Assign each key its owner, the keys which aren't sent to any Arduino are owned by the surface
+        self._owners = {key: surface for key in set(transmission_keys[surface]).union(extra)}
+        self._owners.update(self._routes)
+
+        # Assign each key its type, by the first prefix matching it
+        types = types or {}
+        self._types = {}
+        for key in self._owners:
+            for prefix, name in types.items():
+                if key.startswith(prefix):
+                    self._types[key] = name
+                    break
+
+        # Number the keys by their owner (in the order of the devices), then by their type and name
+        order = {index: position for position, index in enumerate(transmission_keys)}
+        self._keys = tuple(sorted(self._owners, key=lambda k: (order[self._owners[k]], self._types.get(k, ""), k)))
+        self._ids = {key: identifier for identifier, key in enumerate(self._keys)}
+
+        # Assign each device's store the keys known upfront
+        self._stores = {index: tuple(sorted(keys)) for index, keys in transmission_keys.items()}
+        self._stores[surface] = tuple(sorted(self._owners))
+
+        # Create a key to limits lookup of the typed keys (the lowest and highest value, and whether it must be whole)
+        self._limits = {}
+        for key, name in self._types.items():
+            if dtype(name).kind in "iu":
+                limits = iinfo(name)
+                self._limits[key] = int(limits.min), int(limits.max), True
+            else:
+                limits = finfo(name)
+                self._limits[key] = float(limits.min), float(limits.max), False
+
+    @property
+    def keys(self) -> tuple:
+        return self._keys
+
+    @property
+    def ids(self) -> dict:
+        return self._ids
+
+    @property
+    def owners(self) -> dict:
+        return self._owners
+
+    @property
+    def types(self) -> dict:
+        return self._types
+
+    @property
+    def stores(self) -> dict:
+        return self._stores
+
+    def check(self, data: dict):
+        """
+
+        Function used to make sure the values of the typed keys fit their types.
+
+        :param data: Dictionary of key, value pairs of data
+        :raises ValueError: If any value doesn't fit the type of its key
+
+        """
+
+        for key, value in data.items():
+            if key in self._limits:
+                low, high, whole = self._limits[key]
+
+                # Booleans must be excluded, since they are integers as well
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high or \
+                        whole and value % 1:
+                    raise ValueError("Value {} of the key {} doesn't fit its type {}".format(value, key,
+                                                                                          self._types[key]))
+
+    def split(self, data: dict) -> dict:
+        """
+
+        Function used to divide the surface's data by the Arduino-s it's sent to.
+
+        :param data: Dictionary of key, value pairs of the surface's data
+        :return: Dictionary mapping the index of each Arduino to the part of the data sent to it
+
+        """
+
+        updates = {}
+
+        for key, value in data.items():
+            if key in self._routes:
+                updates.setdefault(self._routes[key], {})[key] = value
+
+        return updates
+
+    def forward(self, data: dict) -> dict:
+        """
+
+        Function used to select the data received from an Arduino which is passed on to the surface.
+
+        :param data: Dictionary of key, value pairs of the Arduino's data
+        :return: Dictionary of the surface's transmission data
+
+        """
+
+        return {key: value for key, value in data.items() if key in self._feedback}
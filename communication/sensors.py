@@ -0,0 +1,266 @@
+"""
+
+Sensors are used to filter the readings received from the Arduino-s, and pass them on to the surface at a steady rate.
+
+** Functionality **
+
+By importing the module you gain access to the class 'SensorPipeline'.
+
+You should create an instance of 'SensorPipeline' for each Arduino with any channels in 'SENSORS' (for example the IMU's
+axes), and use the 'process' function with each data received from the Arduino, before it's handed to the data manager.
+Normally, you don't need to do it yourself - each Arduino with any sensor channels creates its pipeline (see the
+'server' module). The function takes the readings of the sensor channels out of the data, and returns the rest of the
+data as it was received (the readings which aren't finite numbers are dropped). At the publishing rate, the filtered
+readings are added back, together with the (monotonic) time of the latest reading under the Arduino's key in
+'TIMESTAMPS'. The readings therefore change at the publishing rate, regardless of how often the Arduino is exchanged
+with. Each publication is counted by the '<id>.published' counter. Use the 'reset' function to drop the readings once
+the Arduino is reconnected.
+
+The traffic to the surface only shrinks with the surface link's delta mode (the 'delta' parameter of the 'Server', see
+the 'delta' module), which leaves out the values which haven't changed since the last message. Without it, which is the
+default, each message to the surface holds all of the surface's transmission keys - the latest readings and the time
+under the 'TIMESTAMPS' key included. The times are only sent to the surface, never to the Arduino-s, and the binary
+frames received from the Arduino-s don't reserve them a bit (see the 'serial_protocol' module).
+
+The readings are kept in a ring buffer, preallocated with 'WINDOW' rows (a row per reading, a column per channel) - the
+channels missing from a reading keep their previous values (the channels never received aren't published), and the
+readings which aren't numbers are ignored. When published, the buffer (from the oldest reading to the latest) is passed
+through each of the 'FILTERS' in order, each filter processing all readings of all channels at once with NumPy, and the
+filtered latest reading is published. The available filters are:
+
+    1. "outliers" - replaces the readings further from the median of their channel than 'OUTLIER_THRESHOLD' times the
+       channel's (normally distributed) standard deviation, estimated from the median absolute deviation, with the
+       median.
+    2. "low_pass" - exponential smoothing (the low-pass half of a complementary filter), each reading weighted by
+       'LOW_PASS_FACTOR', and each previous output by the rest.
+    3. "average" - moving average of the last 'AVERAGE_WINDOW' readings.
+
+** Constants and other values **
+
+You should modify the 'SENSORS' dictionary to change the sensor channels of each Arduino, and the 'TIMESTAMPS'
+dictionary to change the key holding the time of each Arduino's latest reading. The keys must be among the surface's
+transmission keys to reach the surface (see the 'data_manager' module).
+
+You should modify the 'PUBLISH_RATE' constant to change how many times per second the filtered readings are published,
+and the 'WINDOW' constant to change the number of readings kept and filtered. Keep the window within a few hundred
+readings, since the low-pass filter weights the oldest reading by the smoothing factor's power of the window's length.
+
+You should modify the 'FILTERS' tuple to change which filters are applied, and in what order, and the
+'OUTLIER_THRESHOLD', 'LOW_PASS_FACTOR' (between 0 and 1, lower is smoother) and 'AVERAGE_WINDOW' constants to tune them.
+
+** Example **
+
+To filter the IMU's readings, call:
+
+    pipeline = SensorPipeline(dm.ARDUINO_I)
+    data = pipeline.process({"deviceID": "Ard_I", "Sen_IMU_X": 0.12, "status_I": 1}, monotonic())
+
+The result holds the 'deviceID' and 'status_I' keys, and once per publishing interval also the filtered 'Sen_IMU_X'
+reading and the 'time_I' key.
+
+"""
+
+import communication.data_manager as dm
+from communication.metrics import Counter
+from math import isfinite
+
+# Declare the sensor channels of each Arduino, and the key holding the time of its latest reading
+SENSORS = {
+    dm.ARDUINO_I: ("Sen_IMU_X", "Sen_IMU_Y", "Sen_IMU_Z", "Sen_IMU_Temp")
+}
+TIMESTAMPS = {
+    dm.ARDUINO_I: "time_I"
+}
+
+# Declare the publishing rate (publications per second) and the number of readings kept
+PUBLISH_RATE = 10
+WINDOW = 32
+
+# Declare the filters applied, in order, and their parameters
+FILTERS = ("outliers", "low_pass", "average")
+OUTLIER_THRESHOLD = 3.5
+LOW_PASS_FACTOR = 0.3
+AVERAGE_WINDOW = 4
+
+# Declare the ratio of the standard deviation to the median absolute deviation of normally distributed readings
+_DEVIATION_SCALE = 1.4826
+
+
+def _reject_outliers(readings):
+    """
+
+    Function used to replace the readings far from the median of their channel with the median.
+
+    :param readings: Array of the readings (a row per reading, a column per channel), from the oldest one
+    :return: Filtered array
+
+    """
+
+    from numpy import median, where
+
+    # Estimate each channel's standard deviation from its median absolute deviation, robust to the outliers themselves
+    medians = median(readings, axis=0)
+    deviations = abs(readings - medians)
+    limits = OUTLIER_THRESHOLD * _DEVIATION_SCALE * median(deviations, axis=0)
+
+    return where(deviations > limits, medians, readings)
+
+
+def _low_pass(readings):
+    """
+
+    Function used to smooth the readings exponentially.
+
+    :param readings: Array of the readings (a row per reading, a column per channel), from the oldest one
+    :return: Filtered array
+
+    """
+
+    from numpy import arange, cumsum
+
+    # Unroll the recursion y[i] = f * x[i] + (1 - f) * y[i - 1] (starting at y[0] = x[0]) into a cumulative sum
+    powers = ((1 - LOW_PASS_FACTOR) ** arange(len(readings)))[:, None]
+    scaled = readings / powers
+    scaled[0] /= LOW_PASS_FACTOR
+
+    return LOW_PASS_FACTOR * cumsum(scaled, axis=0) * powers
+
+
+def _moving_average(readings):
+    """
+
+    Function used to average each reading with the previous readings within the averaging window.
+
+    :param readings: Array of the readings (a row per reading, a column per channel), from the oldest one
+    :return: Filtered array
+
+    """
+
+    from numpy import arange, cumsum, minimum
+
+    # Subtract the sum up to the start of each window from the sum up to its end
+    sums = cumsum(readings, axis=0)
+    sums[AVERAGE_WINDOW:] = sums[AVERAGE_WINDOW:] - sums[:-AVERAGE_WINDOW]
+
+    return sums / minimum(arange(1, len(readings) + 1), AVERAGE_WINDOW)[:, None]
+
+
+# Create a dictionary mapping the name of each filter to its function
+_FUNCTIONS = {
+    "outliers": _reject_outliers,
+    "low_pass": _low_pass,
+    "average": _moving_average
+}
+
+
+class SensorPipeline:
+
+    def __init__(self, arduino_id, *, rate=PUBLISH_RATE, window=WINDOW, filters=FILTERS):
+        """
+
+        Function used to preallocate the ring buffer of the Arduino's readings.
+
+        :param arduino_id: Unique identifier of the Arduino, with its channels in 'SENSORS'
+        :param rate: Number of publications per second
+        :param window: Number of readings kept and filtered
+        :param filters: Iterable of the names of the filters applied, in order
+
+        """
+
+        # Import NumPy only when the pipeline is created
+        from numpy import zeros
+
+        # Store the channels and the key of the time, and create a channel to column lookup
+        self._channels = SENSORS[arduino_id]
+        self._timestamp = TIMESTAMPS[arduino_id]
+        self._columns = {key: column for column, key in enumerate(self._channels)}
+
+        # Store the filters and the publishing interval
+        self._filters = tuple(_FUNCTIONS[name] for name in filters)
+        self._interval = 1 / rate
+
+        # Allocate the ring buffer, and the latest reading of each channel
+        self._readings = zeros((window, len(self._channels)))
+        self._latest = zeros(len(self._channels))
+
+        # Declare the set of the channels received so far, only these are published
+        self._received = set()
+
+        # Initialise the position of the next reading, the number of readings kept and the time of the latest one
+        self._position = 0
+        self._count = 0
+        self._time = 0.0
+
+        # Initialise the time of the next publication
+        self._next = 0.0
+
+        # Register the metric of the publications, named after the id (see the 'metrics' module)
+        self._published = Counter("{}.published".format(arduino_id))
+
+    def reset(self):
+        """
+
+        Function used to drop the readings kept (including the latest reading of each channel), and publish the next
+        reading straight away.
+
+        """
+
+        self._latest.fill(0)
+        self._received.clear()
+        self._position = 0
+        self._count = 0
+        self._next = 0.0
+
+    def process(self, data: dict, timestamp: float) -> dict:
+        """
+
+        Function used to keep the readings received, and add the filtered readings at the publishing rate.
+
+        :param data: Dictionary of the data received from the Arduino
+        :param timestamp: Monotonic time at which the data was received
+        :return: Dictionary of the data without the readings, with the filtered readings and their time if published
+
+        """
+
+        # Take the finite numeric readings out of the data, dropping the invalid ones
+        readings = [(self._columns[key], value) for key, value in data.items() if key in self._columns and
+                    isinstance(value, (int, float)) and not isinstance(value, bool) and isfinite(value)]
+        data = {key: value for key, value in data.items() if key not in self._columns}
+
+        # Pass the rest of the data on if there are no readings
+        if not readings:
+            return data
+
+        # Store the reading, keeping the previous values of the channels missing from it
+        for column, value in readings:
+            self._latest[column] = value
+            self._received.add(column)
+
+        self._readings[self._position] = self._latest
+        self._position = (self._position + 1) % len(self._readings)
+        self._count = min(self._count + 1, len(self._readings))
+        self._time = timestamp
+
+        # Keep the readings until the next publication
+        if timestamp < self._next:
+            return data
+
+        # Schedule the next publication, skipping any missed ones
+        self._next = timestamp + self._interval - (timestamp - self._next) % self._interval
+
+        # Order the readings from the oldest one, and apply each filter to all of them at once
+        if self._count < len(self._readings):
+            filtered = self._readings[:self._count]
+        else:
+            filtered = self._readings.take(range(self._position, self._position + self._count), axis=0, mode="wrap")
+
+        for function in self._filters:
+            filtered = function(filtered)
+
+        # Publish the filtered latest reading of each channel received, and its time
+        latest = filtered[-1].tolist()
+        data.update((self._channels[column], latest[column]) for column in self._received)
+        data[self._timestamp] = self._time
+        self._published.add()
+
+        return data
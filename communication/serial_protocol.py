@@ -0,0 +1,333 @@
+"""
+
+Serial protocol is used to encode and decode the compact binary frames exchanged with the Arduino-s.
+
+** Functionality **
+
+By importing the module you gain access to the class 'BinaryProtocol', the 'ProtocolError' exception and the
+'handshake', 'handshake_line', 'handshake_id' and 'accepts_binary' functions.
+
+You should create an instance of 'BinaryProtocol' for each Arduino and use the 'encode' function to build a frame out of
+the dictionary returned by the data manager, and the 'read' function to read and decode a single frame from a serial
+connection. The 'read' function raises 'ProtocolError' if the frame received is corrupted, and the 'encode' function
+raises it if any value to send isn't a finite number (the numbers outside of the range of the unsigned 16-bit integers
+are clamped to it). To read the frames without blocking, read up to the 'SYNC' byte, then 'HEADER_SIZE' bytes of the
+header, then the number of bytes returned by the 'payload_size' function, and pass the header and the rest of the frame
+to the 'decode' function. The 'exchange_size' property tells the size (bytes) of the largest frames sent and received in
+a single exchange, to fit the timeouts to the baud rate.
+
+Each frame consists of the following fields (all multi-byte fields are little-endian):
+
+    1. Sync byte (0xA5), marking the start of a frame.
+    2. Device byte, the position of the Arduino in the 'DEVICES' tuple.
+    3. Key bitmap (4 bytes), where each set bit marks that the value of the corresponding key is present.
+    4. Values of the keys present, in the order of their bits. Frames sent to the Arduino-s hold unsigned 16-bit
+       integers, whereas frames received from the Arduino-s hold each value in the type of its key (see the data
+       manager's 'TYPES'), and the values of the untyped keys as 32-bit floats.
+    5. CRC-16-CCITT (2 bytes) of the device byte, the key bitmap and the values.
+
+The bit of each key is its position in the keys returned by the data manager's 'transmission_keys' function - the keys
+sent to an Arduino are looked up within its own transmission keys, whereas the keys received from an Arduino are looked
+up within the surface's transmission keys, without the keys generated by the Pi (the sensors' 'TIMESTAMPS', see the
+'sensors' module). The 'received_keys' property holds the keys received, in the order of their bits.
+
+The binary protocol is negotiated when connecting - the Pi sends the JSON-encoded 'HANDSHAKE' line, and switches to
+binary frames only if the Arduino replies with a JSON line holding the same 'protocol' value. Otherwise, JSON is used.
+The handshake line built by the 'handshake_line' function additionally holds the 'watchdog' value - the time
+(milliseconds) after which the Arduino should idle its outputs (as with the default values) if it receives no data, so
+a hung Pi can't leave the thrusters running. The Arduino should accept the watchdog regardless of the protocol.
+The Arduino should also hold its 'deviceID' in the reply, so it can be identified before any data is exchanged (see the
+'discovery' module).
+
+** Constants and other values **
+
+You should modify the 'DEVICES' tuple to change the device byte assigned to each Arduino, this must be agreed with the
+lower-level team beforehand.
+
+** Example **
+
+Let the Arduino be connected through the 'serial' connection. To send the thrusters' data to it and read its reply, call:
+
+    protocol = BinaryProtocol(dm.ARDUINO_T)
+    serial.write(protocol.encode(dm.get_data(dm.ARDUINO_T, transmit=True)))
+    data = protocol.read(serial)
+
+"""
+
+import communication.data_manager as dm
+from communication.sensors import TIMESTAMPS
+from binascii import crc_hqx
+from json import dumps, loads, JSONDecodeError
+from math import isfinite
+from struct import Struct
+
+# Declare the device byte of each Arduino
+DEVICES = (dm.ARDUINO_T, dm.ARDUINO_A, dm.ARDUINO_M, dm.ARDUINO_I)
+
+# Declare the handshake line sent when connecting
+HANDSHAKE = bytes(dumps({"protocol": "binary"}) + "\n", encoding="utf-8")
+
+# Declare the frame fields
+_SYNC = 0xA5
+_HEADER = Struct("<BI")
+_CRC = Struct("<H")
+_SENT_VALUE = "H"
+_SENT_RANGE = 0, 0xFFFF
+_SENT_SIZE = Struct("<" + _SENT_VALUE).size
+
+# Declare the layout of each type the received values may have, and the type of the untyped values
+_RECEIVED_VALUES = {"bool": "?", "int8": "b", "uint8": "B", "int16": "h", "uint16": "H", "int32": "i", "uint32": "I",
+                    "int64": "q", "uint64": "Q", "float16": "e", "float32": "f", "float64": "d"}
+_UNTYPED = "float32"
+
+# Declare the sync byte and the size of the header following it
+SYNC = bytes((_SYNC,))
+HEADER_SIZE = _HEADER.size
+
+# Declare the initial value of the checksum
+_CRC_START = 0xFFFF
+
+# Declare the maximum number of keys which fit in the bitmap
+_MAX_KEYS = 32
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def accepts_binary(reply: bytes) -> bool:
+    """
+
+    Function used to check if the reply to the handshake accepts the binary protocol.
+
+    :param reply: Line received after sending the handshake
+    :return: True if the binary protocol should be used
+
+    """
+
+    try:
+        return loads(reply.decode("utf-8")).get("protocol") == "binary"
+    except (UnicodeDecodeError, JSONDecodeError, AttributeError):
+        return False
+
+
+def handshake_id(reply: bytes):
+    """
+
+    Function used to retrieve the identifier held by a JSON line received from the Arduino (the reply to the handshake).
+
+    :param reply: Line received
+    :return: Identifier of the Arduino, or None if the reply doesn't hold it
+
+    """
+
+    try:
+        return loads(reply.decode("utf-8")).get("deviceID")
+    except (UnicodeDecodeError, JSONDecodeError, AttributeError):
+        return None
+
+
+def handshake_line(watchdog=None) -> bytes:
+    """
+
+    Function used to build the handshake line sent when connecting.
+
+    :param watchdog: Time (seconds) after which the Arduino should idle without any data, or None to not set it
+    :return: JSON-encoded line
+
+    """
+
+    if watchdog is None:
+        return HANDSHAKE
+
+    return bytes(dumps({"protocol": "binary", "watchdog": round(watchdog * 1000)}) + "\n", encoding="utf-8")
+
+
+def handshake(serial, watchdog=None) -> bool:
+    """
+
+    Function used to negotiate the protocol with an Arduino.
+
+    :param serial: Open serial connection
+    :param watchdog: Time (seconds) after which the Arduino should idle without any data, or None to not set it
+    :return: True if the binary protocol should be used, False if JSON should be used, None if there was no reply
+
+    """
+
+    # Offer the binary protocol (and set the watchdog) and wait for the reply
+    serial.write(handshake_line(watchdog))
+    reply = serial.read_until().strip()
+
+    return accepts_binary(reply) if reply else None
+
+
+class BinaryProtocol:
+
+    def __init__(self, arduino_id):
+        """
+
+        Function used to initialise the key tables of an Arduino.
+
+        :param arduino_id: Unique identifier of the Arduino
+
+        """
+
+        # Store the device byte
+        self._device = DEVICES.index(arduino_id)
+
+        # Retrieve the ordered keys sent to and received from the Arduino (the keys generated by the Pi aren't received)
+        self._sent_keys = dm.transmission_keys(arduino_id)
+        self._received_keys = tuple(key for key in dm.transmission_keys(dm.SURFACE) if key not in TIMESTAMPS.values())
+
+        # Make sure the keys fit in the bitmap
+        if len(self._sent_keys) > _MAX_KEYS or len(self._received_keys) > _MAX_KEYS:
+            raise ValueError("Binary protocol supports at most {} keys".format(_MAX_KEYS))
+
+        # Retrieve the layout of each received value by the type of its key, and declare the layouts of the values of
+        # each bitmap received, created on demand
+        types = dm.key_types()
+        try:
+            self._received_values = tuple(_RECEIVED_VALUES[types.get(key, _UNTYPED)] for key in self._received_keys)
+        except KeyError as e:
+            raise ValueError("Binary protocol doesn't support the type {}".format(e))
+        self._layouts = {}
+
+        # Create a key to bit lookup for performance reasons
+        self._bits = {key: bit for bit, key in enumerate(self._sent_keys)}
+
+    @property
+    def received_keys(self) -> tuple:
+        return self._received_keys
+
+    @property
+    def exchange_size(self) -> int:
+        frames = 2 * (len(SYNC) + HEADER_SIZE + _CRC.size)
+        return frames + len(self._sent_keys) * _SENT_SIZE + self._layout((1 << len(self._received_keys)) - 1).size
+
+    def _layout(self, bitmap: int) -> Struct:
+        """
+
+        Function used to retrieve the layout of the values of a received frame, created on demand.
+
+        :param bitmap: Key bitmap of the frame
+        :return: Layout of the values
+
+        """
+
+        if bitmap not in self._layouts:
+            self._layouts[bitmap] = Struct("<" + "".join(value for bit, value in enumerate(self._received_values)
+                                                         if bitmap >> bit & 1))
+
+        return self._layouts[bitmap]
+
+    def encode(self, data: dict) -> bytes:
+        """
+
+        Function used to build a frame to send to the Arduino.
+
+        :param data: Dictionary of key, value pairs to send (keys outside of the Arduino's transmission keys are ignored)
+        :return: Encoded frame
+        :raises ProtocolError: If any value sent isn't a finite number
+
+        """
+
+        # Select the known keys in the order of their bits
+        bits = sorted(self._bits[key] for key in data if key in self._bits)
+
+        # Build the bitmap and convert the values, clamping them to the range of the unsigned 16-bit integers
+        bitmap = 0
+        values = []
+        low, high = _SENT_RANGE
+        for bit in bits:
+            bitmap |= 1 << bit
+            value = data[self._sent_keys[bit]]
+
+            # Booleans are integers as well, so they're sent as 0 or 1
+            if not isinstance(value, (int, float)) or not isfinite(value):
+                raise ProtocolError("Value {} of the key {} can't be sent".format(value, self._sent_keys[bit]))
+
+            values.append(min(max(int(value), low), high))
+
+        body = _HEADER.pack(self._device, bitmap) + Struct("<" + _SENT_VALUE * len(bits)).pack(*values)
+
+        return SYNC + body + _CRC.pack(crc_hqx(body, _CRC_START))
+
+    def read(self, serial) -> dict:
+        """
+
+        Function used to read and decode a single frame received from the Arduino.
+
+        :param serial: Open serial connection
+        :return: Dictionary of the data received (including the 'deviceID'), or an empty dictionary on read timeout
+
+        """
+
+        # Skip any bytes until the start of a frame, give up on timeout
+        while True:
+            sync = serial.read(1)
+
+            if not sync:
+                return {}
+
+            if sync[0] == _SYNC:
+                break
+
+        # Read the header
+        header = serial.read(HEADER_SIZE)
+
+        if len(header) < HEADER_SIZE:
+            raise ProtocolError("Incomplete frame header")
+
+        # Read the values and the checksum
+        size = self.payload_size(header)
+        payload = serial.read(size)
+
+        if len(payload) < size:
+            raise ProtocolError("Incomplete frame payload")
+
+        return self.decode(header, payload)
+
+    def payload_size(self, header: bytes) -> int:
+        """
+
+        Function used to calculate the size of the values and the checksum following the header of a received frame.
+
+        :param header: Header of the frame (without the sync byte)
+        :return: Size of the rest of the frame
+
+        """
+
+        device, bitmap = _HEADER.unpack(header)
+
+        # Make sure the frame can be decoded
+        if device >= len(DEVICES) or bitmap >> len(self._received_keys):
+            raise ProtocolError("Invalid frame header")
+
+        return self._layout(bitmap).size + _CRC.size
+
+    def decode(self, header: bytes, payload: bytes) -> dict:
+        """
+
+        Function used to verify and decode a received frame.
+
+        :param header: Header of the frame (without the sync byte)
+        :param payload: Values and the checksum of the frame
+        :return: Dictionary of the data received (including the 'deviceID')
+
+        """
+
+        device, bitmap = _HEADER.unpack(header)
+
+        # Find the keys present, in the order of their bits
+        bits = [bit for bit in range(len(self._received_keys)) if bitmap >> bit & 1]
+
+        # Verify the checksum
+        values = self._layout(bitmap)
+        if _CRC.unpack_from(payload, values.size)[0] != crc_hqx(header + payload[:values.size], _CRC_START):
+            raise ProtocolError("Invalid frame checksum")
+
+        # Decode the data
+        data = {self._received_keys[bit]: value for bit, value in zip(bits, values.unpack_from(payload))}
+        data["deviceID"] = DEVICES[device]
+
+        return data
@@ -8,10 +8,59 @@ By importing the module you gain access to the classes 'Server' and 'Arduino'.
 
 You should create an instance of 'Server' and use the 'run' function to start the communication. The constructor of the
 'Server' class takes 2 optional parameters - 'ip' and 'port', which can be specified to identify address of the
-Raspberry Pi (host) to connect with the surface. Ip passed should be a string, whereas the port an integer.
+Raspberry Pi (host) to connect with the surface. Ip passed should be a string, whereas the port an integer. The
+additional, optional 'framing' parameter can be set to "length" or "newline" to frame the messages exchanged with the
+surface (as described in the 'framing' module), which allows the surface to send multiple messages without waiting for
+the replies. Each framed message is replied to with a framed message. By default, each receive is treated as a single
+message. The additional, optional 'delta' parameter can be set to True to send only the values which have changed since
+the last transmission to the surface and each Arduino (as described in the 'delta' module). The replies to the surface
+then additionally hold the '_version' key (the data manager's version of the data) and the '_keyframe' key (True if the
+reply holds the full data). The additional, optional 'ports' parameter can be set to an iterable of the serial ports the
+Arduino-s might be connected to, for example to connect to simulated Arduino-s (see the 'simulation' module) - by
+default, any device matching the 'DEVICE_PATTERNS' of the 'discovery' module is tried. The additional, optional 'budget'
+parameter can be set to the end-to-end latency budget (seconds) of the surface's commands (see below), by default the
+'CONTROL_BUDGET'. The additional, optional 'heartbeat' parameter can be set to the time (seconds) without any message
+after which the surface is considered lost (see below), by default the 'HEARTBEAT_TIMEOUT' from the 'heartbeat' module,
+or None to only handle the closed connections. With the heartbeat enabled, the surface must send a message at least
+every 'SURFACE_INTERVAL' seconds (see the 'heartbeat' module), even if none of its commands have changed.
+
+The messages exchanged with the surface are JSON by default. The surface can switch to the compact binary MessagePack
+(or any other codec of the 'message_encoding' module) by sending a message holding the 'CODEC_KEY' key with the codec's
+name - the reply holds the same key with the name of the codec used for the following messages, until the surface
+reconnects. The binary codecs are refused if the messages are framed by new line characters, and the codecs which can't
+be created (such as MessagePack without the 'msgpack' package) are refused as well.
 
 Once connected, the 'Server' class should handle everything, including formatting, encoding and re-connecting in case of
-data loss. Exchanging data with the surface and each Arduino is done in separate processes.
+data loss. Exchanging data with the surface and each Arduino is done in separate processes. Each Arduino is offered the
+compact binary frames described in the 'serial_protocol' module when connecting, and JSON is used if it doesn't accept.
+To keep the start-up fast, pathos is only imported once the first process is created, and asyncio only once the
+communication is run within the event loop.
+
+The Arduino-s are found when the server is created - all candidate serial devices are asked for their identifiers at
+once, and each Arduino in 'ARDUINO_IDS' is bound to the device which identified as it, before any data is exchanged (see
+the 'discovery' module). Once an Arduino's connection is lost, or if it wasn't found, it's looked for again among the
+devices not used by the other Arduino-s, starting with its last port. The devices which turned out not to be the Arduino
+are only asked again once any device is plugged in (or every '_RECONNECT_DELAY' seconds where the devices can't be
+watched), since opening a device resets it - the other devices are looked for every '_RECONNECT_DELAY' seconds. Each
+device is reserved while it's being identified, so the processes identify different devices at the same time. The data
+received from a different Arduino than the one the connection is bound to is ignored.
+
+The readings of the Arduino-s with any sensor channels (for example the IMU) are filtered before they're applied to the
+data manager, and only published at a steady rate (see the 'sensors' module), so the surface receives smoothed readings
+regardless of how often the Arduino is exchanged with.
+
+The surface's commands (for example the thrusters' values) are handed straight to the Arduino driving them (see the
+'data_manager' module), which exchanges them as soon as they arrive, without waiting for the scheduled rate. The time
+from receiving each command from the surface to the Arduino's reply to it is measured by the '<id>.command_latency'
+histogram, and the commands which took longer than the budget are counted by the '<id>.budget_violations' counter.
+
+Each message applied from the surface beats the surface's heartbeat (see the 'heartbeat' module), watched by the process
+of each Arduino. Once the surface wasn't heard from within the heartbeat's threshold (or its process hangs), each
+Arduino is sent the 'DEFAULT' values of the data manager instead of the surface's commands straight away, until the
+surface is heard from again - each time is counted by the '<id>.failsafe' counter. The first message after the
+heartbeat was lost is applied on top of the 'DEFAULT' values, so the commands it doesn't hold don't resume.
+Additionally, each Arduino is told to idle by itself if it receives no data for 'WATCHDOG_FACTOR' times its keep-alive
+interval (see the 'serial_protocol' module), so the outputs are idled even if the Pi hangs.
 
 You should modify the '_init_high_level' and '_init_low_level' functions to perform any additional initialisations of
 the respective layers.
@@ -22,11 +71,33 @@ information with the respective layers.
 You should modify any `_handle_data` functions to change how the data is processed.
 
 You should modify the '_on_surface_disconnected' function to modify behaviour when the connection between surface and
-the Pi is lost. Remember, this function should always set the communication data to default using the 'data_manager'.
+the Pi is lost. Remember, this function should always set the communication data to default using the 'data_manager'
+(and reset the heartbeat).
+
+You should use the 'stop' function to terminate the processes started by the 'run' function.
+
+The communication is measured with the metrics described in the 'metrics' module. The exchanges with the surface are
+counted by the 'server.<port>.messages' and 'server.<port>.connections' counters, and the time from receiving each
+message to sending its reply by the 'server.<port>.reply' histogram. The exchanges with each Arduino are counted by the
+'<id>.exchanges', '<id>.errors' and '<id>.connections' counters (named after the identifier), and the time from
+sending the data to receiving the reply by the '<id>.round_trip' histogram. The achieved, target and scheduled rates of
+each Arduino are reported by its scheduler.
 
 ** Constants and other values **
 
-All constants and other important values are mentioned and explained within the corresponding functions.
+You should modify the 'ARDUINO_IDS' tuple to change which Arduino-s are looked for.
+
+You should modify the 'SCHEDULES' dictionary to change how often the data is exchanged with each Arduino (as
+described in the 'scheduler' module) - the thrusters are exchanged with at the highest rate, the IMU (which isn't sent
+any data) is polled at a fixed rate, and the manipulator and the lights (which rarely change) are only kept alive
+occasionally. The Arduino-s without a schedule use the 'DEFAULT_SCHEDULE'. Once the protocol is negotiated, the
+deadlines are lengthened to the time the largest exchange takes at the baud rate of the connection (see the
+'_BYTE_BITS' and '_JSON_KEY_SIZE' constants) - at the default 9600 baud, roughly 1 ms per byte.
+
+You should modify the 'WATCHDOG_FACTOR' constant to change how many keep-alive intervals each Arduino waits for any
+data before idling by itself.
+
+All other constants and important values are mentioned and explained within the corresponding functions.
 
 ** Example **
 
@@ -46,13 +117,59 @@ Kacper Florianski
 
 import socket
 import communication.data_manager as dm
-from serial import Serial, SerialException
+from communication.discovery import DeviceWatcher, PortRegistry, candidates, discover, identify
+from communication.heartbeat import Heartbeat, HEARTBEAT_TIMEOUT
+from communication.metrics import Counter, Histogram
+from communication.scheduler import Scheduler
+from communication.sensors import SensorPipeline, SENSORS
+from communication.delta import DeltaEncoder
+from communication.framing import FrameParser, FramingError
+from communication.message_encoding import CodecError, CODECS, CODEC_KEY, DEFAULT_CODEC
+from communication.serial_protocol import BinaryProtocol, ProtocolError, HEADER_SIZE, SYNC, accepts_binary, handshake, \
+    handshake_line
+from serial import Serial, SerialException, SerialTimeoutException
 from json import dumps, loads, JSONDecodeError
-from time import sleep
-from pathos import helpers
+from os import read, write
+from time import monotonic, perf_counter
+
+# Declare the identifiers of the Arduino-s looked for
+ARDUINO_IDS = (dm.ARDUINO_T, dm.ARDUINO_A, dm.ARDUINO_M, dm.ARDUINO_I)
+
+# Declare the schedule of each Arduino - the target rate (exchanges per second), the deadline of each exchange (seconds)
+# and the keep-alive interval (seconds) - and the schedule of any other Arduino
+SCHEDULES = {
+    dm.ARDUINO_T: (200, 0.05, 0.02),
+    dm.ARDUINO_A: (20, 0.1, 0.2),
+    dm.ARDUINO_M: (50, 0.05, 0.1),
+    dm.ARDUINO_I: (50, 0.05, 0.02)
+}
+DEFAULT_SCHEDULE = (50, 0.05, 0.02)
+
+# Declare the number of bits each byte takes on the serial line (the start, data and stop bits), and the number of
+# characters each key takes in a JSON line besides its name (the quotes, the separators and the value)
+_BYTE_BITS = 10
+_JSON_KEY_SIZE = 16
+
+# Declare the number of keep-alive intervals each Arduino waits for any data before idling by itself
+WATCHDOG_FACTOR = 4
+
+# Declare the end-to-end latency budget (seconds) of the surface's commands
+CONTROL_BUDGET = 0.01
+
+
+def _process(target):
+    """
+
+    Function used to create a process, importing pathos (and dill) only once the first process is needed.
+
+    :param target: Function run by the process
+    :return: Process, not started yet
+
+    """
 
-# Fetch the Process class
-Process = helpers.mp.Process
+    from pathos import helpers
+
+    return helpers.mp.Process(target=target)
 
 
 class Server:
@@ -61,23 +178,41 @@ class Server:
     class DataError(Exception):
         pass
 
-    def __init__(self, *, ip='0.0.0.0', port=50000):
+    def __init__(self, *, ip='0.0.0.0', port=50000, framing=None, delta=False, ports=None, budget=CONTROL_BUDGET,
+                 heartbeat=HEARTBEAT_TIMEOUT):
         """
 
         Function used to initialise the server.
 
         :param ip: Raspberry Pi's IP address
         :param port: Raspberry Pi's port
+        :param framing: Framing mode of the surface messages ("length" or "newline"), or None to treat each receive as
+                        a single message
+        :param delta: Boolean to specify if only the changed values should be sent to the surface and Arduino-s
+        :param ports: An iterable of the serial ports the Arduino-s might be connected to, or None to try any device
+                      matching the 'DEVICE_PATTERNS'
+        :param budget: End-to-end latency budget (seconds) of the surface's commands
+        :param heartbeat: Time (seconds) without any message after which the surface is considered lost, or None
 
         """
 
+        # Make sure the data manager is created before any processes are started, so they all share it
+        dm.create()
+
+        # Initialise the surface's heartbeat, watched by each Arduino
+        self._heartbeat = Heartbeat(heartbeat)
+
         # Initialise communication with surface
-        self._init_high_level(ip=ip, port=port)
+        self._init_high_level(ip=ip, port=port, framing=framing, delta=delta)
 
         # Initialise communication with Arduino-s
-        self._init_low_level(ports=["/dev/ttyACM0", "/dev/ttyACM1", "/dev/ttyACM2", "/dev/ttyACM3"])
+        self._init_low_level(ports=ports, delta=delta, budget=budget)
+
+        # Register the metrics of the messages exchanged with the surface, and of the time taken to reply to them
+        self._messages = Counter(self._metrics_name + ".messages")
+        self._reply_time = Histogram(self._metrics_name + ".reply")
 
-    def _init_high_level(self, ip, port):
+    def _init_high_level(self, ip, port, framing=None, delta=False, worker=None):
         """
 
         Function used to initialise communication with the surface.
@@ -90,16 +225,38 @@ class Server:
 
         :param ip: Raspberry Pi's IP
         :param port: Raspberry Pi's port
+        :param framing: Framing mode of the messages, or None to treat each receive as a single message
+        :param delta: Boolean to specify if only the changed values should be sent
+        :param worker: Thread or process (not started yet) handling the communication, or None to create a process
+                       running the '_listen_high_level' function
 
         """
 
-        # Initialise the process to handle parallel communication
-        self._process = Process(target=self._listen_high_level)
+        # Initialise the process to handle parallel communication, unless a worker is given
+        self._process = worker or _process(self._listen_high_level)
 
         # Save the host and port information
         self._ip = ip
         self._port = port
 
+        # Save the framing information, the parser is created for each connection
+        self._framing = framing
+        self._parser = None
+
+        # Declare the codecs created so far, and use the default codec until another one is negotiated
+        self._codecs = {}
+        self._use_codec(DEFAULT_CODEC)
+
+        # Initialise the encoder of changed values, reset for each connection
+        self._delta = DeltaEncoder() if delta else None
+
+        # Declare the flag marking a connected client (used by the event loop)
+        self._connected = False
+
+        # Register the metric of the connections, named after the class and the port (see the 'metrics' module)
+        self._metrics_name = "{}.{}".format(type(self).__name__.lower(), port)
+        self._connections = Counter(self._metrics_name + ".connections")
+
         # Declare the constant for the communication timeout with the surface
         self._TIMEOUT = 3
 
@@ -115,29 +272,42 @@ class Server:
         # Tell the server to listen to only one connection
         self._socket.listen(1)
 
-    def _init_low_level(self, ports):
+    def _init_low_level(self, ports, delta=False, budget=CONTROL_BUDGET):
         """
 
-        Function used to initialise communication with the surface.
+        Function used to initialise communication with the Arduino-s.
 
-        :param ports: An iterable of Arduino ports
+        :param ports: An iterable of the serial ports the Arduino-s might be connected to, or None to try any device
+                      matching the 'DEVICE_PATTERNS'
+        :param delta: Boolean to specify if only the changed values should be sent to the Arduino-s
+        :param budget: End-to-end latency budget (seconds) of the surface's commands
 
         """
 
         # Declare a set of clients to remember
         self._clients = set()
 
-        # Declare a list of ports to remember, match this with ids below for the overall initialisation
-        self._ports = ports
+        # Declare a list of ports to remember (None to try any candidate device)
+        self._ports = None if ports is None else list(ports)
+
+        # Initialise the registry of the ports used by each Arduino, shared by their processes
+        self._registry = PortRegistry(ARDUINO_IDS)
 
-        # Initialise an id list to assign a corresponding arduino to each port and a helper iterator
-        arduino_ids = [dm.ARDUINO_T, dm.ARDUINO_A, dm.ARDUINO_M, dm.ARDUINO_I]
+        # Identify the devices connected, all at once
+        connections = discover(self._ports)
 
-        # Iterate over each port and create corresponding clients
-        for i in range(len(self._ports)):
+        # Inform about the Arduino-s found, close the connections to any unknown devices
+        for arduino_id, connection in sorted(connections.items()):
+            if arduino_id in ARDUINO_IDS:
+                print("Found {} on port {}".format(arduino_id, connection.port))
+            else:
+                print("Found an unknown device {} on port {}, ignoring it".format(arduino_id, connection.port))
+                connection.close()
 
-            # Create an instance of the Arduino and store it
-            self._clients.add(Arduino(self._ports[i], arduino_ids[i]))
+        # Create a client bound to each id, with its connection if it was found
+        for arduino_id in ARDUINO_IDS:
+            self._clients.add(Arduino(arduino_id, ports=self._ports, connection=connections.get(arduino_id),
+                                      registry=self._registry, delta=delta, budget=budget, heartbeat=self._heartbeat))
 
     def _listen_high_level(self):
         """
@@ -164,6 +334,9 @@ class Server:
             # Set the timeout
             self._client_socket.settimeout(self._TIMEOUT)
 
+            # Reset the state of the connection
+            self._on_surface_connected()
+
             # Inform that a client has successfully connected
             print("Client with address {} connected".format(self._client_address))
 
@@ -178,6 +351,82 @@ class Server:
             # Run clean up / connection lost info etc.
             self._on_surface_disconnected()
 
+    async def _listen_high_level_async(self):
+        """
+
+        Function used to serve the connections with the surface within the event loop.
+
+        Has the same functionality as the _listen_high_level function, but handles the connections within the running
+        event loop instead of blocking.
+
+        """
+
+        import asyncio
+
+        # Serve the connections on the already bound socket until the server is closed
+        server = await asyncio.start_server(self._on_connection_async, sock=self._socket)
+        await server.wait_closed()
+
+    async def _on_connection_async(self, reader, writer):
+        """
+
+        Function used to run a connection with the surface within the event loop.
+
+        :param reader: Stream to receive the data from
+        :param writer: Stream to send the data to
+
+        """
+
+        # Refuse any further connections while a client is connected, as with the blocking server
+        if self._connected:
+            writer.close()
+            return
+
+        self._connected = True
+
+        # Store the connection information (the writer closes the connection like a socket does)
+        self._client_socket = writer
+        self._client_address = writer.get_extra_info("peername")
+
+        # Reset the state of the connection
+        self._on_surface_connected()
+
+        # Inform that a client has successfully connected
+        print("Client with address {} connected".format(self._client_address))
+
+        while True:
+
+            # Attempt to handle the data, break in case of errors
+            try:
+                await self._handle_data_async(reader, writer)
+            except self.DataError:
+                break
+
+        # Run clean up / connection lost info etc.
+        self._on_surface_disconnected()
+
+        self._connected = False
+
+    def _on_surface_connected(self):
+        """
+
+        Function used to reset the state of the connection when a new client connects.
+
+        """
+
+        # Count the connection
+        self._connections.add()
+
+        # Create a fresh parser to buffer the partially received messages
+        self._parser = FrameParser(self._framing) if self._framing else None
+
+        # Start with the default codec, the new client negotiates any other codec again
+        self._use_codec(DEFAULT_CODEC)
+
+        # Send the full data first to the new client
+        if self._delta:
+            self._delta.reset()
+
     def _listen_low_level(self):
         """
 
@@ -205,6 +454,9 @@ class Server:
         # Inform that the connection has been closed
         print("Connection from {} address closed successfully".format(self._client_address))
 
+        # Send the default values to the Arduino-s straight away
+        self._heartbeat.reset()
+
         # Set the keys to their default values, BEWARE: might add keys that haven't yet been received from surface
         dm.set_data(dm.SURFACE, **dm.DEFAULT)
 
@@ -230,28 +482,177 @@ class Server:
         except (ConnectionResetError, ConnectionAbortedError, socket.timeout):
             raise self.DataError
 
-        # Convert bytes to string, remove the white spaces, ignore any invalid data
+        # Measure the time from receiving the data to sending the replies
+        received = perf_counter()
+
+        # Process the data
+        replies = self._reply(data)
+
+        # Send the replies at once, break in case of errors
         try:
-            data = data.decode("utf-8").strip()
-        except UnicodeDecodeError:
+            if replies:
+                self._client_socket.sendall(replies)
+
+        except (ConnectionResetError, ConnectionAbortedError, socket.timeout):
+            raise self.DataError
+
+        self._reply_time.record(perf_counter() - received)
+        self._messages.add()
+
+    async def _handle_data_async(self, reader, writer):
+        """
+
+        Function used to exchange and process the data within the event loop.
+
+        :param reader: Stream to receive the data from
+        :param writer: Stream to send the data to
+
+        """
+
+        import asyncio
+
+        # Once connected, keep receiving and sending the data, raise exception in case of errors
+        try:
+            data = await asyncio.wait_for(reader.read(4096), self._TIMEOUT)
+
+            # If 0-byte was received, close the connection
+            if not data:
+                raise self.DataError
+
+            # Measure the time from receiving the data to sending the replies
+            received = perf_counter()
+
+            # Process the data
+            replies = self._reply(data)
+
+            # Send the replies at once, copied since the transport may keep them once the codec reuses its buffer
+            if replies:
+                writer.write(bytes(replies))
+                await asyncio.wait_for(writer.drain(), self._TIMEOUT)
+
+        except (ConnectionResetError, ConnectionAbortedError, asyncio.TimeoutError):
+            raise self.DataError
+
+        self._reply_time.record(perf_counter() - received)
+        self._messages.add()
+
+    def _reply(self, data: bytes) -> bytes:
+        """
+
+        Function used to process the data received and build the replies.
+
+        :param data: Data received
+        :return: Replies to send (may be empty if no complete messages were received)
+
+        """
+
+        # Treat the data received as a single message if the messages aren't framed
+        if not self._parser:
+            return self._process_message(data)
+
+        # Otherwise extract all complete messages received so far, reply to each one of them (with a framed reply)
+        try:
+            return b"".join(self._parser.frame(self._process_message(message)) for message in self._parser.feed(data))
+        except FramingError as e:
+            print("Received invalid data: {}".format(e))
+            raise self.DataError
+
+    def _process_message(self, data: bytes) -> bytes:
+        """
+
+        Function used to process a single message received from the surface.
+
+        :param data: Message received
+        :return: Reply to send - the current state of the data manager, encoded with the codec the message was
+
+        """
+
+        # Keep the codec the message was received with, the reply is encoded with it even if another one is negotiated
+        codec = self._codec
+        requested = None
+
+        # Attempt to decode the message, inform about invalid data received
+        try:
+            data = codec.decode(data)
+        except CodecError as e:
+            print("Received invalid data: {}".format(e))
             data = None
 
         # Handle valid data
-        if data:
+        if data is not None:
 
-            # Attempt to decode from JSON, inform about invalid data received
+            # Take out the name of the codec requested, if any
+            requested = data.pop(CODEC_KEY, None)
+
+            # Apply all values at once
             try:
-                dm.set_data(dm.SURFACE, **loads(data))
-            except JSONDecodeError:
-                print("Received invalid data: {}".format(data))
 
-        # Send the current state of the data manager, break in case of errors
+                # Start from the default values if the surface was lost, so the commands not received don't resume
+                if self._heartbeat.expired:
+                    data = dict(dm.DEFAULT, **data)
+
+                dm.set_many(dm.SURFACE, data)
+                self._heartbeat.beat()
+
+            # Ignore the entire message if any value doesn't fit its key's type
+            except ValueError as e:
+                print("Received invalid data: {}".format(e))
+
+        # Retrieve the current state of the data manager
+        data, version = dm.get_many(dm.SURFACE, transmit=True)
+
+        # Reduce the data to the changed values, the data is acknowledged immediately since TCP delivers it reliably
+        if self._delta:
+            data, keyframe = self._delta.encode(data, version)
+            self._delta.acknowledge()
+            data["_version"] = version
+            data["_keyframe"] = keyframe
+
+        # Tell the surface which codec the following messages are encoded with
+        if requested is not None:
+            data[CODEC_KEY] = self._negotiate(requested)
+
+        # Reply with the data
+        return codec.encode(data)
+
+    def _use_codec(self, name: str):
+        """
+
+        Function used to switch the codec of the following messages, creating it when it's first used.
+
+        :param name: Name of the codec, one of the 'CODECS'
+        :raises CodecError: If the codec can't be created
+
+        """
+
+        if name not in self._codecs:
+            self._codecs[name] = CODECS[name]()
+
+        self._codec = self._codecs[name]
+
+    def _negotiate(self, name) -> str:
+        """
+
+        Function used to switch to the codec requested by the surface, if it's available.
+
+        The binary codecs are refused if the messages are separated by new line characters, since they may hold any
+        bytes. The codecs which can't be created (for example without the package implementing them) are refused too.
+
+        :param name: Name of the codec requested
+        :return: Name of the codec used for the following messages
+
+        """
+
+        if not isinstance(name, str) or name not in CODECS or CODECS[name].binary and self._framing == "newline":
+            print("Refused the codec {}, using {}".format(name, self._codec.name))
+            return self._codec.name
+
         try:
-            self._client_socket.sendall(bytes(dumps(
-                dm.get_data(dm.SURFACE, transmit=True)), encoding="utf-8"))
+            self._use_codec(name)
+        except CodecError as e:
+            print("Refused the codec {} ({}), using {}".format(name, e, self._codec.name))
 
-        except (ConnectionResetError, ConnectionAbortedError, socket.timeout):
-            raise self.DataError
+        return self._codec.name
 
     def run(self):
         """
@@ -266,6 +667,33 @@ class Server:
         # Open the communication with lower-levels with the server's process as the parent process
         self._listen_low_level()
 
+    def stop(self):
+        """
+
+        Function used to terminate the processes started by the 'run' function.
+
+        """
+
+        # Terminate the communication with surface's process
+        if self._process.is_alive():
+            self._process.terminate()
+
+        # Terminate the communication with each Arduino
+        for client in self._clients:
+            client.stop()
+
+    async def run_async(self):
+        """
+
+        Function used to run the server within the running event loop, instead of separate processes.
+
+        """
+
+        import asyncio
+
+        # Run the communication with surface and each Arduino concurrently
+        await asyncio.gather(self._listen_high_level_async(), *(client.connect_async() for client in self._clients))
+
 
 class Arduino:
 
@@ -273,51 +701,101 @@ class Arduino:
     class DataError(Exception):
         pass
 
-    def __init__(self, port, arduino_id):
+    def __init__(self, arduino_id, *, ports=None, connection=None, registry=None, protocol="binary", delta=False,
+                 schedule=None, budget=CONTROL_BUDGET, heartbeat=None):
         """
 
         Function used to initialise the state of each Arduino
 
         ** Modifications **
 
-            1. Modify the '_WRITE_TIMEOUT' constant to specify the timeout value (seconds) for sending to an Arduino.
+            1. Modify the '_HANDSHAKE_TIMEOUT' constant to specify the timeout value (seconds) for sending to and
+               receiving from an Arduino while negotiating the protocol. The timeouts of the exchanges are scheduled.
 
-            2. Modify the '_READ_TIMEOUT' constant to specify the timeout value (seconds) for receiving from an Arduino.
+            2. Modify the '_RECONNECT_DELAY' constant to specify the maximum delay value (seconds) between looking for
+               the Arduino, if no devices are plugged in meanwhile.
 
-            3. Modify the '_RECONNECT_DELAY' constant to specify the delay value (seconds) on connection loss.
-
-            4. Modify the '_COMMUNICATION_DELAY' constant to specify the delay value (seconds) on communication.
-
-        :param port: Raspberry Pi's port to which the Arduino is connected to
         :param arduino_id: Unique identifier of the Arduino
+        :param ports: An iterable of the serial ports to look for the Arduino on, or None to try any device matching the
+                      'DEVICE_PATTERNS'
+        :param connection: Open serial connection to the Arduino found by the discovery, or None to look for it
+        :param registry: Registry of the ports used by each Arduino, or None if no other Arduino-s are looked for
+        :param protocol: Preferred protocol - "binary" to offer the binary frames when connecting, "json" to only use JSON
+        :param delta: Boolean to specify if only the values which have changed should be sent
+        :param schedule: Tuple of the target rate, deadline and keep-alive interval of the exchanges, or None to use the
+                         schedule of the id from 'SCHEDULES'
+        :param budget: End-to-end latency budget (seconds) of the surface's commands
+        :param heartbeat: Surface's heartbeat, to send the default values once it's lost, or None to never send them
         """
 
-        # Store the port information
-        self._port = port
-
         # Store the id information
         self._id = arduino_id
 
-        # Initialise the serial information
-        self._serial = Serial()
-        self._serial.port = self._port
+        # Store the ports to look for the Arduino on, and declare the watcher of the devices (created by its process)
+        self._ports = ports
+        self._watcher = None
+
+        # Declare the ports which turned out not to be the Arduino, skipped until any device is plugged in
+        self._probed = set()
+
+        # Store the registry of the ports used, shared with the other Arduino-s
+        self._registry = registry or PortRegistry((arduino_id,))
+
+        # Initialise the serial information, with the connection found if any, and claim its port
+        self._serial = connection or Serial()
+        self._port = self._serial.port
+        if connection:
+            self._registry.claim(arduino_id, self._port)
 
-        # Initialise the timeout constants
-        self._WRITE_TIMEOUT = 1
-        self._READ_TIMEOUT = 1
+        # Initialise the timeout constant of the handshake, long enough for an Arduino which has just been reset
+        self._HANDSHAKE_TIMEOUT = 1
 
         # Set the read and write timeouts
-        self._serial.write_timeout = self._WRITE_TIMEOUT
-        self._serial.timeout = self._READ_TIMEOUT
+        self._timeout = None
+        self._set_timeout(self._HANDSHAKE_TIMEOUT)
 
         # Initialise the delay constant to offload some computing power
         self._RECONNECT_DELAY = 1
 
-        # Initialise data exchange delay
-        self._COMMUNICATION_DELAY = 0.02
+        # Initialise the scheduler of the exchanges, named after the id
+        schedule = schedule or SCHEDULES.get(arduino_id, DEFAULT_SCHEDULE)
+        self._scheduler = Scheduler(str(arduino_id), *schedule)
+
+        # Initialise the time (seconds) the Arduino should idle after without any data, based on the keep-alive interval
+        self._watchdog = schedule[2] * WATCHDOG_FACTOR
+
+        # Store the surface's heartbeat, and declare whether the default values are being sent instead of the commands
+        self._heartbeat = heartbeat or Heartbeat(None)
+        self._failsafe = False
+
+        # Store the preferred protocol and declare the negotiated one (None until negotiated)
+        self._offer_binary = protocol == "binary"
+        self._binary = None
+
+        # Declare a dictionary of binary protocols for each id, created on demand
+        self._protocols = {}
+
+        # Initialise the encoder of changed values
+        self._delta = DeltaEncoder() if delta else None
+
+        # Initialise the filters of the sensors' readings, if the Arduino has any sensors
+        self._sensors = SensorPipeline(arduino_id) if arduino_id in SENSORS else None
+
+        # Store the latency budget of the commands, and declare the number of the last command delivered
+        self._budget = budget
+        self._delivered = 0
+
+        # Register the metrics of the exchanges, named after the id (see the 'metrics' module)
+        self._exchanges = Counter("{}.exchanges".format(arduino_id))
+        self._errors = Counter("{}.errors".format(arduino_id))
+        self._connections = Counter("{}.connections".format(arduino_id))
+        self._round_trip = Histogram("{}.round_trip".format(arduino_id))
+        self._command_latency = Histogram("{}.command_latency".format(arduino_id))
+        self._violations = Counter("{}.budget_violations".format(arduino_id))
+        self._failsafes = Counter("{}.failsafe".format(arduino_id))
 
         # Initialise the process information
-        self._process = Process(target=self._run)
+        self._process = _process(self._run)
 
     def _handle_data(self):
         """
@@ -330,40 +808,306 @@ class Arduino:
 
         """
 
-        # Send current state of the data
-        self._serial.write(bytes(dumps(dm.get_data(self._id, transmit=True)) + "\n", encoding='utf-8'))
+        # Negotiate the protocol on a fresh connection, retry if the Arduino didn't reply
+        if self._binary is None:
+            self._set_timeout(self._HANDSHAKE_TIMEOUT)
+            self._binary = handshake(self._serial, self._watchdog) if self._offer_binary else False
 
-        # Read until the specified character is found ("\n" by default)
-        data = self._serial.read_until()
+            if self._binary is None:
+                raise self.DataError
+
+            self._fit_schedule()
+
+        # Never exchange the data faster than scheduled, unless a new command is waiting
+        changed = False
+        while not self._command_waiting() and monotonic() < self._scheduler.earliest:
+            changed = dm.wait_data(self._id, self._scheduler.earliest - monotonic()) or changed
+
+        # Wait for new data from the surface, or exchange the data anyway once the keep-alive interval has passed, while
+        # watching the surface's heartbeat
+        while not changed and not self._command_waiting() and monotonic() < self._scheduler.latest:
+            changed = dm.wait_data(self._id, max(self._wake_time() - monotonic(), 0))
+
+        # Consume any notification left, since the latest data is exchanged anyway
+        dm.wait_data(self._id, 0)
+
+        # Exchange the data using the negotiated protocol, within the scheduled timeout
+        self._set_timeout(self._scheduler.timeout)
+        self._scheduler.start()
+        command = dm.last_command(self._id)
+        self._update_failsafe()
 
-        # Convert bytes to string, remove white spaces, ignore invalid data
         try:
-            data = data.decode("utf-8").strip()
-        except UnicodeDecodeError:
-            data = None
+            data = self._exchange_binary() if self._binary else self._exchange_json()
+        except self.DataError:
+            self._scheduler.finish(False)
+            raise
+
+        self._count_exchange(data, command)
+
+        # Handle the data received
+        self._process_reply(data)
+
+    def _set_timeout(self, timeout: float):
+        """
+
+        Function used to change the read and write timeouts of the serial connection, if they're different.
+
+        :param timeout: Timeout (seconds)
+
+        """
+
+        if timeout != self._timeout:
+            self._serial.timeout = timeout
+            self._serial.write_timeout = timeout
+            self._timeout = timeout
+
+    def _fit_schedule(self):
+        """
+
+        Function used to lengthen the deadline of the exchanges to the time the largest exchange of the negotiated
+        protocol takes at the baud rate of the connection, so the replies are never cut short by the timeout.
+
+        """
+
+        if self._binary:
+            size = self._protocol().exchange_size
+        else:
+            keys = dm.transmission_keys(self._id) + dm.transmission_keys(dm.SURFACE)
+            size = sum(len(key) + _JSON_KEY_SIZE for key in keys) + 2 * len("{}\n")
+
+        self._scheduler.fit(size * _BYTE_BITS / self._serial.baudrate)
+
+    def _command_waiting(self) -> bool:
+        """
+
+        Function used to check if a new command is waiting to be delivered to the Arduino.
+
+        :return: True if the latest command wasn't delivered yet, or the surface's heartbeat was lost or regained
+
+        """
+
+        return self._heartbeat.expired != self._failsafe or dm.last_command(self._id)[0] > self._delivered
+
+    def _wake_time(self) -> float:
+        """
+
+        Function used to calculate the time to stop waiting for new data at, unless it arrives earlier.
+
+        :return: Monotonic time of the end of the keep-alive interval, or of the surface's heartbeat if it's earlier
+
+        """
+
+        if self._failsafe:
+            return self._scheduler.latest
+
+        return min(self._scheduler.latest, self._heartbeat.deadline)
+
+    def _update_failsafe(self):
+        """
+
+        Function used to decide whether the default values should be sent instead of the surface's commands.
+
+        """
+
+        expired = self._heartbeat.expired
+
+        # Count each time the surface is lost
+        if expired and not self._failsafe:
+            self._failsafes.add()
+
+        self._failsafe = expired
+
+    def _count_exchange(self, data: dict, command: tuple):
+        """
+
+        Function used to complete the schedule and update the metrics of a single exchange.
+
+        :param data: Dictionary of the data received, empty if the Arduino didn't reply
+        :param command: Tuple of the number and the time of the latest command when the exchange started
+
+        """
+
+        duration = self._scheduler.finish(bool(data))
+        self._exchanges.add()
+
+        # Only measure the exchanges the Arduino replied to, the others took as long as the timeout
+        if not data:
+            self._errors.add()
+            return
+
+        self._round_trip.record(duration)
+
+        # Measure the latency of the new command delivered, and check it against the budget
+        number, timestamp = command
+        if number > self._delivered:
+            self._delivered = number
+            latency = monotonic() - timestamp
+            self._command_latency.record(latency)
+            if latency > self._budget:
+                self._violations.add()
+
+    def _process_reply(self, data: dict):
+        """
+
+        Function used to process the data received from the Arduino.
+
+        :param data: Dictionary of the data received
+
+        """
 
         # Handle valid data
         if data:
 
+            # Make sure the data comes from the Arduino the connection is bound to
             try:
-                # Attempt to decode the JSON data
-                data = loads(data)
-
-                # Override the ID
-                self._id = data["deviceID"]
-
-                # Update the Arduino data (and the surface data)
-                dm.set_data(self._id, **data)
+                if data["deviceID"] != self._id:
+                    print("Received data from {} on the connection of {}".format(data["deviceID"], self._id))
+                    raise self.DataError
 
-            except JSONDecodeError:
-                print("Received invalid data: {}".format(data))
-                raise self.DataError
             except KeyError:
                 print("Received valid data with invalid ID: {}".format(data))
                 raise self.DataError
 
-        # Delay the communication to allow the Arduino to catch up
-        sleep(self._COMMUNICATION_DELAY)
+            # Mark the data sent as received by the Arduino
+            if self._delta:
+                self._delta.acknowledge()
+
+            # Filter the sensors' readings, which are only passed on at the publishing rate
+            if self._sensors:
+                data = self._sensors.process(data, monotonic())
+
+            # Update the Arduino data (and the surface data) at once, inform about values which don't fit their types
+            try:
+                dm.set_many(self._id, data)
+            except ValueError as e:
+                print("Received invalid data: {}".format(e))
+                raise self.DataError
+
+    def _protocol(self) -> BinaryProtocol:
+        """
+
+        Function used to retrieve the binary protocol of the current id, created on demand.
+
+        :return: Binary protocol
+
+        """
+
+        # Create the binary protocol for the current id if it doesn't exist yet
+        if self._id not in self._protocols:
+            self._protocols[self._id] = BinaryProtocol(self._id)
+
+        return self._protocols[self._id]
+
+    def _data_to_send(self) -> dict:
+        """
+
+        Function used to retrieve the data to send to the Arduino.
+
+        :return: Current state of the data, reduced to the values changed since the last reply if delta is enabled
+
+        """
+
+        # Retrieve the current state of the data
+        data, version = dm.get_many(self._id, transmit=True)
+
+        # Replace the surface's commands with the default values while the surface is lost
+        if self._failsafe:
+            data.update((key, dm.DEFAULT[key]) for key in dm.transmission_keys(self._id) if key in dm.DEFAULT)
+
+        # Reduce the data to the changed values
+        if self._delta:
+            data, _ = self._delta.encode(data, version)
+
+        return data
+
+    def _encode_frame(self, protocol) -> bytes:
+        """
+
+        Function used to build the binary frame holding the data to send to the Arduino.
+
+        :param protocol: Binary protocol of the Arduino
+        :return: Encoded frame
+
+        """
+
+        # Refuse the data which can't be sent, rather than crash the connection
+        try:
+            return protocol.encode(self._data_to_send())
+        except ProtocolError as e:
+            print("Can't send invalid data: {}".format(e))
+            raise self.DataError
+
+    def _exchange_binary(self) -> dict:
+        """
+
+        Function used to send and receive the data as binary frames.
+
+        :return: Dictionary of the data received
+
+        """
+
+        # Retrieve the binary protocol of the current id
+        protocol = self._protocol()
+
+        # Send current state of the data (taken from a single snapshot)
+        self._serial.write(self._encode_frame(protocol))
+
+        # Read a single frame, ignore invalid data
+        try:
+            return protocol.read(self._serial)
+        except ProtocolError as e:
+            print("Received invalid data: {}".format(e))
+            raise self.DataError
+
+    def _exchange_json(self) -> dict:
+        """
+
+        Function used to send and receive the data as JSON lines.
+
+        :return: Dictionary of the data received
+
+        """
+
+        # Send current state of the data (taken from a single snapshot)
+        self._serial.write(bytes(dumps(self._data_to_send()) + "\n", encoding='utf-8'))
+
+        # Read until the specified character is found ("\n" by default)
+        line = self._serial.read_until()
+
+        # Drop a line cut short by the timeout together with the rest of it, so the next reply is read from its start
+        if not line.endswith(b"\n"):
+            self._serial.reset_input_buffer()
+            return {}
+
+        return self._decode_json(line)
+
+    def _decode_json(self, data: bytes) -> dict:
+        """
+
+        Function used to decode a JSON line received from the Arduino.
+
+        :param data: Line received
+        :return: Dictionary of the data received
+
+        """
+
+        # Convert bytes to string, remove white spaces, ignore invalid data
+        try:
+            data = data.decode("utf-8").strip()
+        except UnicodeDecodeError:
+            data = None
+
+        # Ignore empty data
+        if not data:
+            return {}
+
+        # Attempt to decode the JSON data
+        try:
+            return loads(data)
+        except JSONDecodeError:
+            print("Received invalid data: {}".format(data))
+            raise self.DataError
 
     def _run(self):
         """
@@ -371,7 +1115,7 @@ class Arduino:
         Function used to run a continuous connection with an Arduino.
 
         Runs an infinite loop that performs re-connection to the connected client as well as exchanges data with it, via
-        non-blocking write and read_until functions. The data exchanged is JSON-encoded.
+        non-blocking write and read functions. The data exchanged is either binary or JSON-encoded, as negotiated.
 
         """
 
@@ -379,34 +1123,397 @@ class Arduino:
         while True:
 
             # Inform about a connection attempt
-            print("Connecting to port {}...".format(self._port))
+            print("Looking for {}...".format(self._id))
 
-            # Keep exchanging the data or re-connecting
-            while True:
+            # Attempt to find the Arduino (unless it was found already), wait for any devices to be plugged in otherwise
+            while not self._serial.is_open and not self._find():
+                self._wait_devices()
 
-                # If the connection is closed
-                if not self._serial.is_open:
+            # Reset the state of the connection
+            self._on_connected()
 
+            # Inform about a successfully established connection
+            print("Successfully connected to {} on port {}".format(self._id, self._port))
+
+            # Keep exchanging the data, re-connect in case of errors
+            try:
+                while True:
                     try:
-                        # Attempt to open a serial connection
-                        self._serial.open()
+                        self._handle_data()
+                    except self.DataError:
+                        self._errors.add()
+
+            except SerialException:
+                print("Connection to port {} lost".format(self._port))
+                self._disconnect()
 
-                        # Inform about a successfully established connection
-                        print("Successfully connected to port {}".format(self._port))
+    def _find(self) -> bool:
+        """
 
-                    except SerialException:
-                        sleep(self._RECONNECT_DELAY)
-                        continue
+        Function used to look for the Arduino among the devices which aren't used by the other Arduino-s.
 
-                # Attempt to handle the data, break in case of errors
+        :return: True if the Arduino was found, and its connection opened
+
+        """
+
+        # Try the last port first, since a device plugged back in is usually given the same one
+        ports = candidates(self._ports)
+        ports.sort(key=lambda port: port != self._port)
+
+        for port in ports:
+
+            # Skip the devices already asked, and reserve the device so no other process opens it in the meantime
+            if port in self._probed or not self._registry.reserve(self._id, port):
+                continue
+
+            # Keep the connection if the device is the Arduino, close it and free the device otherwise
+            arduino_id, connection = identify(port)
+
+            if arduino_id == self._id:
+                self._serial = connection
+                self._port = port
+
+                # Apply the timeouts to the new connection
+                self._timeout = None
+                self._set_timeout(self._HANDSHAKE_TIMEOUT)
+
+                return True
+
+            if connection:
+                connection.close()
+
+            self._registry.release(self._id)
+            self._probed.add(port)
+
+        return False
+
+    def _devices(self) -> DeviceWatcher:
+        """
+
+        Function used to retrieve the watcher of the devices plugged in, created within the Arduino's process.
+
+        :return: Device watcher
+
+        """
+
+        if self._watcher is None:
+            self._watcher = DeviceWatcher(self._ports)
+
+        return self._watcher
+
+    def _wait_devices(self):
+        """
+
+        Function used to wait until any device is plugged in, or the reconnect delay passes.
+
+        """
+
+        # Ask the devices already asked again only once any device is plugged in (always, if it can't be watched)
+        if self._devices().wait(self._RECONNECT_DELAY):
+            self._probed.clear()
+
+    def _disconnect(self):
+        """
+
+        Function used to close the connection, and free its port for the other Arduino-s.
+
+        """
+
+        self._serial.close()
+        self._registry.release(self._id)
+
+    def _on_connected(self):
+        """
+
+        Function used to reset the state of the connection when the serial connection is opened.
+
+        """
+
+        # Count the connection, and start the schedule again
+        self._connections.add()
+        self._scheduler.reset()
+
+        # Only measure the latency of the commands received from now on
+        self._delivered = dm.last_command(self._id)[0]
+
+        # Negotiate the protocol again with the (possibly different) Arduino
+        self._binary = None
+
+        # Drop the readings of the previous connection
+        if self._sensors:
+            self._sensors.reset()
+
+        # Send the full data first to the Arduino
+        if self._delta:
+            self._delta.reset()
+
+    async def _handle_data_async(self, reader):
+        """
+
+        Function used to exchange and process the data within the event loop.
+
+        Has the same functionality as the _handle_data function, but sends and waits for the data without blocking.
+
+        :param reader: Stream of the bytes received from the serial connection
+
+        """
+
+        # Negotiate the protocol on a fresh connection, retry if the Arduino didn't reply
+        if self._binary is None:
+            self._set_timeout(self._HANDSHAKE_TIMEOUT)
+
+            if self._offer_binary:
+                await self._write_async(handshake_line(self._watchdog))
+                reply = (await self._read_async(reader.readline())).strip()
+                self._binary = accepts_binary(reply) if reply else None
+            else:
+                self._binary = False
+
+            if self._binary is None:
+                raise self.DataError
+
+            self._fit_schedule()
+
+        # Never exchange the data faster than scheduled, unless a new command is waiting
+        changed = False
+        while not self._command_waiting() and monotonic() < self._scheduler.earliest:
+            changed = await self._wait_async(self._scheduler.earliest - monotonic()) or changed
+
+        # Wait for new data from the surface, or exchange the data anyway once the keep-alive interval has passed, while
+        # watching the surface's heartbeat
+        while not changed and not self._command_waiting() and monotonic() < self._scheduler.latest:
+            changed = await self._wait_async(max(self._wake_time() - monotonic(), 0))
+
+        # Consume any notification left, since the latest data is exchanged anyway
+        dm.wait_data(self._id, 0)
+
+        # Exchange the data within the scheduled timeout
+        self._set_timeout(self._scheduler.timeout)
+        self._scheduler.start()
+        command = dm.last_command(self._id)
+        self._update_failsafe()
+
+        try:
+
+            # Exchange the data using the binary protocol
+            if self._binary:
+                protocol = self._protocol()
+                await self._write_async(self._encode_frame(protocol))
+
+                # Read a single frame, ignore invalid data
                 try:
-                    self._handle_data()
-                except self.DataError:
-                    pass
-                except SerialException:
-                    print("Connection to port {} lost".format(self._port))
-                    self._serial.close()
-                    break
+                    data = {}
+                    if await self._read_async(reader.readuntil(SYNC)):
+                        header = await self._read_async(reader.readexactly(HEADER_SIZE))
+                        data = protocol.decode(header, await self._read_async(
+                            reader.readexactly(protocol.payload_size(header))))
+
+                except ProtocolError as e:
+                    print("Received invalid data: {}".format(e))
+                    raise self.DataError
+
+            # Exchange the data using JSON
+            else:
+                await self._write_async(bytes(dumps(self._data_to_send()) + "\n", encoding='utf-8'))
+                data = self._decode_json(await self._read_async(reader.readline()))
+
+        except self.DataError:
+            self._scheduler.finish(False)
+            raise
+
+        self._count_exchange(data, command)
+
+        # Handle the data received
+        self._process_reply(data)
+
+    async def _read_async(self, coroutine) -> bytes:
+        """
+
+        Function used to await a read from the serial connection, with the current timeout.
+
+        :param coroutine: Read to await
+        :return: Bytes read, or empty bytes on timeout
+
+        """
+
+        import asyncio
+
+        try:
+            return await asyncio.wait_for(coroutine, self._timeout)
+        except asyncio.TimeoutError:
+            return b""
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+
+    async def _write_async(self, data: bytes):
+        """
+
+        Function used to write to the serial connection through its non-blocking file descriptor, waiting for it to
+        become writable within the event loop instead of blocking.
+
+        :param data: Bytes to write
+        :raises SerialException: If the device is gone, or the write doesn't finish within the current timeout
+
+        """
+
+        import asyncio
+
+        loop = asyncio.get_event_loop()
+        descriptor = self._serial.fileno()
+        data = memoryview(data)
+
+        while data:
+
+            # Write as many bytes as the device accepts straight away
+            try:
+                data = data[write(descriptor, data):]
+                continue
+            except BlockingIOError:
+                pass
+            except OSError as e:
+                raise SerialException(e)
+
+            # Wait until the device accepts more bytes, giving up as a blocking write would
+            writable = loop.create_future()
+            loop.add_writer(descriptor, lambda: writable.done() or writable.set_result(None))
+
+            try:
+                await asyncio.wait_for(writable, self._timeout)
+            except asyncio.TimeoutError:
+                raise SerialTimeoutException("Write timeout")
+            finally:
+                loop.remove_writer(descriptor)
+
+    async def _wait_async(self, timeout) -> bool:
+        """
+
+        Function used to wait for new data from the surface within the event loop.
+
+        :param timeout: Maximum time (seconds) to wait for
+        :return: True if the data has changed
+
+        """
+
+        import asyncio
+
+        # Watch the data manager's notifications
+        loop = asyncio.get_event_loop()
+        event = asyncio.Event()
+        descriptor = dm.wait_descriptor(self._id)
+        loop.add_reader(descriptor, event.set)
+
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(descriptor)
+
+        # Consume the notification
+        return dm.wait_data(self._id, 0)
+
+    def _feed_async(self, reader):
+        """
+
+        Function used to pass the bytes received from the non-blocking serial connection to the reader.
+
+        :param reader: Stream of the bytes received
+
+        """
+
+        try:
+            data = read(self._serial.fileno(), 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            data = None
+            reader.set_exception(SerialException(e))
+
+        # Mark the end of the stream once the device is gone
+        if data:
+            reader.feed_data(data)
+        elif data is not None:
+            reader.set_exception(SerialException("Device disconnected"))
+
+    async def _run_async(self):
+        """
+
+        Function used to run a continuous connection with an Arduino within the event loop.
+
+        Has the same functionality as the _run function, but reads and writes the serial connection through its
+        non-blocking file descriptor instead of blocking.
+
+        """
+
+        import asyncio
+
+        loop = asyncio.get_event_loop()
+
+        # Run an infinite loop to never close the connection
+        while True:
+
+            # Inform about a connection attempt
+            print("Looking for {}...".format(self._id))
+
+            # Attempt to find the Arduino (unless it was found already) without blocking the event loop, wait for any
+            # devices to be plugged in otherwise
+            while not self._serial.is_open and not await loop.run_in_executor(None, self._find):
+                await self._wait_devices_async()
+
+            # Reset the state of the connection
+            self._on_connected()
+
+            # Inform about a successfully established connection
+            print("Successfully connected to {} on port {}".format(self._id, self._port))
+
+            # Pass the bytes received to a stream as soon as they arrive
+            reader = asyncio.StreamReader()
+            loop.add_reader(self._serial.fileno(), self._feed_async, reader)
+
+            # Keep exchanging the data, re-connect in case of errors
+            try:
+                while True:
+                    try:
+                        await self._handle_data_async(reader)
+                    except self.DataError:
+                        self._errors.add()
+
+            except SerialException:
+                print("Connection to port {} lost".format(self._port))
+                loop.remove_reader(self._serial.fileno())
+                self._disconnect()
+
+    async def _wait_devices_async(self):
+        """
+
+        Function used to wait until any device is plugged in, or the reconnect delay passes, within the event loop.
+
+        """
+
+        import asyncio
+
+        # Simply wait for the delay if the devices can't be watched, and ask all devices again
+        watcher = self._devices()
+        if watcher.fileno() is None:
+            await asyncio.sleep(self._RECONNECT_DELAY)
+            self._probed.clear()
+            return
+
+        # Watch the devices' events
+        loop = asyncio.get_event_loop()
+        event = asyncio.Event()
+        loop.add_reader(watcher.fileno(), event.set)
+
+        try:
+            await asyncio.wait_for(event.wait(), self._RECONNECT_DELAY)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(watcher.fileno())
+
+        # Consume the events, and ask the devices already asked again once any device is plugged in
+        if watcher.consume():
+            self._probed.clear()
 
     def connect(self):
         """
@@ -417,3 +1524,25 @@ class Arduino:
 
         # Start the connection
         self._process.start()
+
+        # Leave the connection found by the discovery to the Arduino's process
+        self._serial.close()
+
+    def stop(self):
+        """
+
+        Function used to terminate the process started by the 'connect' function.
+
+        """
+
+        if self._process.is_alive():
+            self._process.terminate()
+
+    async def connect_async(self):
+        """
+
+        Function used to run the communication with an Arduino within the running event loop.
+
+        """
+
+        await self._run_async()
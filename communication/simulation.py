@@ -0,0 +1,373 @@
+"""
+
+Simulation is used to stand in for the hardware, so the communication can be run and measured without the ROV.
+
+** Functionality **
+
+By importing the module you gain access to the classes 'SimulatedArduino', 'SurfaceClient' and 'SyntheticCapture'.
+
+You should create an instance of 'SimulatedArduino' for each Arduino to simulate, and pass its 'port' (the path to a
+pseudo-terminal) to the server's 'ports' parameter. Use the 'start' function to start replying to the server in a
+background thread. The simulated Arduino declines the binary protocol (replying to the handshake with its 'deviceID'),
+and replies to each JSON line received with a JSON line holding its 'deviceID' and the values returned by the optional
+'sensors' function. The optional 'callback' function is called with the monotonic time of receiving and the data of each
+line, and the number of lines received is available through the 'exchanges' field. As the Arduino-s do, it goes idle
+once it receives no data for the 'watchdog' time of the handshake, and the number of times it went idle is available
+through the 'idles' field.
+
+You should create an instance of 'SurfaceClient' to drive the server's TCP port as the surface does, and use the 'run'
+function to send the data returned by the 'script' function (called with the number of each message) at the given rate,
+for the given duration. The monotonic time and the data of each message sent are available through the 'sent' list, and
+the time between sending each message and receiving its reply through the 'round_trips' list. By default, each message
+holds a different value of the 'THRUSTER', so the time it took for a value to reach the Arduino can be measured. The
+additional, optional 'codec' parameter can be set to the name of any codec in the 'message_encoding' module's 'CODECS'
+to negotiate it with the server once connected, and encode the messages with it.
+
+You should create an instance of 'SyntheticCapture' to stand in for the 'CaptureService' (see the 'capture' module)
+without any cameras. Use the 'start' function to generate the frames (a moving gradient) at the given rate, and the
+'ring' function to pass the frames to a 'VideoStream'.
+
+** Example **
+
+To run the server with a simulated Arduino, and send the data to it at 100 messages per second for 5 seconds, call:
+
+    arduino = SimulatedArduino(dm.ARDUINO_T)
+    arduino.start()
+
+    server = Server(ports=(arduino.port,))
+    server.run()
+
+    SurfaceClient(rate=100).run(5)
+
+"""
+
+from communication.capture import FrameRing
+from communication.message_encoding import CODECS, CODEC_KEY, DEFAULT_CODEC
+from json import dumps, loads, JSONDecodeError
+from os import openpty, read, ttyname, write
+from select import select
+from socket import create_connection
+from threading import Thread
+from time import monotonic, sleep
+from tty import setraw
+
+# Declare the thruster driven by the default surface script, and the range of its values
+THRUSTER = "Thr_FP"
+_THRUSTER_MIN = 1100
+_THRUSTER_RANGE = 800
+
+
+def _sweep(number: int) -> dict:
+    """
+
+    Function used to generate the default surface data - a different thruster value with each message.
+
+    :param number: Number of the message
+    :return: Data to send
+
+    """
+
+    return {THRUSTER: _THRUSTER_MIN + number % _THRUSTER_RANGE}
+
+
+class SimulatedArduino:
+
+    def __init__(self, arduino_id, *, sensors=None, callback=None, reply_delay=0):
+        """
+
+        Function used to initialise the pseudo-terminal of the Arduino.
+
+        :param arduino_id: Identifier of the Arduino sent in each reply
+        :param sensors: Function returning a dictionary of additional values to reply with, or None
+        :param callback: Function called with the time of receiving and the data of each line, or None
+        :param reply_delay: Time (seconds) to wait for before each reply, to simulate the Arduino's processing
+
+        """
+
+        # Store the Arduino's information
+        self._id = arduino_id
+        self._sensors = sensors
+        self._callback = callback
+        self._reply_delay = reply_delay
+
+        # Create the pseudo-terminal, without echoing or translating the bytes
+        self._master, self._slave = openpty()
+        setraw(self._slave)
+
+        # Initialise the number of lines received
+        self._exchanges = 0
+
+        # Declare the watchdog's time (seconds) received in the handshake, and the number of times the Arduino idled
+        self._watchdog = None
+        self._idle = False
+        self._idles = 0
+
+        # Initialise the thread replying to the server
+        self._thread = Thread(target=self._run, daemon=True)
+
+    @property
+    def port(self) -> str:
+        return ttyname(self._slave)
+
+    @property
+    def exchanges(self) -> int:
+        return self._exchanges
+
+    @property
+    def idles(self) -> int:
+        return self._idles
+
+    def _reply(self, line: bytes):
+        """
+
+        Function used to handle a single line received from the server.
+
+        :param line: Line received
+
+        """
+
+        # Ignore invalid data
+        try:
+            data = loads(line.decode("utf-8"))
+        except (UnicodeDecodeError, JSONDecodeError):
+            return
+
+        # Decline the binary protocol, set the watchdog
+        if "protocol" in data:
+            if "watchdog" in data:
+                self._watchdog = data["watchdog"] / 1000
+            write(self._master, bytes(dumps({"protocol": "json", "deviceID": self._id}) + "\n", encoding="utf-8"))
+            return
+
+        # Inform about the data received
+        self._exchanges += 1
+        self._idle = False
+        if self._callback:
+            self._callback(monotonic(), data)
+
+        # Build the reply
+        reply = {"deviceID": self._id}
+        if self._sensors:
+            reply.update(self._sensors())
+
+        if self._reply_delay:
+            sleep(self._reply_delay)
+
+        write(self._master, bytes(dumps(reply) + "\n", encoding="utf-8"))
+
+    def _run(self):
+        """
+
+        Function used to keep replying to the lines received from the server.
+
+        """
+
+        # Declare the bytes of the partially received line
+        buffer = b""
+
+        while True:
+
+            # Go idle if no data was received within the watchdog's time
+            if self._watchdog and not select((self._master,), (), (), self._watchdog)[0]:
+                self._idles += not self._idle
+                self._idle = True
+                continue
+
+            buffer += read(self._master, 4096)
+
+            # Reply to each complete line
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                self._reply(line)
+
+    def start(self):
+        """
+
+        Function used to start replying to the server.
+
+        """
+
+        self._thread.start()
+
+
+class SurfaceClient:
+
+    def __init__(self, ip="localhost", port=50000, *, rate=50, script=None, codec=DEFAULT_CODEC):
+        """
+
+        Function used to initialise the client.
+
+        :param ip: Raspberry Pi's IP address
+        :param port: Raspberry Pi's port
+        :param rate: Number of messages to send per second
+        :param script: Function returning the data to send, called with the number of each message, or None to sweep
+                       the thruster's values
+        :param codec: Name of the codec negotiated with the server
+
+        """
+
+        # Store the server's address
+        self._address = ip, port
+
+        # Create the codec of the messages
+        self._codec = CODECS[codec]()
+
+        # Store the script information
+        self._interval = 1 / rate
+        self._script = script or _sweep
+
+        # Initialise the measurements
+        self.sent = []
+        self.round_trips = []
+
+    def _connect(self, timeout: float):
+        """
+
+        Function used to connect to the server, retrying until it's started.
+
+        :param timeout: Maximum time (seconds) to retry for
+        :return: Connected socket
+
+        """
+
+        deadline = monotonic() + timeout
+
+        while True:
+            try:
+                return create_connection(self._address, timeout)
+            except ConnectionRefusedError:
+                if monotonic() > deadline:
+                    raise
+                sleep(0.1)
+
+    def _negotiate(self, client):
+        """
+
+        Function used to switch the server to the client's codec.
+
+        :param client: Connected socket
+        :raises ConnectionError: If the server refused the codec
+
+        """
+
+        if self._codec.name == DEFAULT_CODEC:
+            return
+
+        # Request the codec with a message encoded with the default codec, and check the codec in the reply
+        default = CODECS[DEFAULT_CODEC]()
+        client.sendall(default.encode({CODEC_KEY: self._codec.name}))
+        accepted = (default.decode(client.recv(4096)) or {}).get(CODEC_KEY)
+
+        if accepted != self._codec.name:
+            raise ConnectionError("The server refused the codec {}, using {}".format(self._codec.name, accepted))
+
+    def run(self, duration: float) -> int:
+        """
+
+        Function used to exchange the data with the server at the given rate.
+
+        :param duration: Time (seconds) to exchange the data for
+        :return: Number of messages sent
+
+        """
+
+        client = self._connect(duration)
+        self._negotiate(client)
+
+        # Send the messages at fixed times, without accumulating the delays
+        start = monotonic()
+        number = 0
+
+        while monotonic() - start < duration:
+            data = self._script(number)
+
+            # Send the message and wait for the reply
+            sent = monotonic()
+            client.sendall(self._codec.encode(data))
+            client.recv(4096)
+            self.round_trips.append(monotonic() - sent)
+            self.sent.append((sent, data))
+
+            # Wait until the next message is due
+            number += 1
+            delay = start + number * self._interval - monotonic()
+            if delay > 0:
+                sleep(delay)
+
+        client.close()
+
+        return number
+
+
+class SyntheticCapture:
+
+    def __init__(self, count=1, *, fps=30, resolution=(640, 480), ring_size=4):
+        """
+
+        Function used to initialise the synthetic cameras.
+
+        :param count: Number of cameras
+        :param fps: Number of frames generated per second
+        :param resolution: Tuple of width and height of the frames
+        :param ring_size: Number of frames in the ring of each camera
+
+        """
+
+        # Store the frames information
+        self._interval = 1 / fps
+        self._resolution = resolution
+
+        # Create a ring for each camera
+        self._rings = tuple(FrameRing(ring_size) for _ in range(count))
+
+        # Initialise the thread generating the frames
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def ring(self, index: int) -> FrameRing:
+        return self._rings[index]
+
+    def _run(self):
+        """
+
+        Function used to keep generating the frames of all cameras.
+
+        """
+
+        from numpy import arange, uint8
+
+        width, height = self._resolution
+
+        # Create the gradient, moved with each frame
+        gradient = (arange(width)[None, :, None] + arange(height)[:, None, None] + arange(3)).astype(uint8)
+
+        for ring in self._rings:
+            ring.allocate(gradient.shape, gradient.dtype)
+
+        start = monotonic()
+        sequence = 0
+
+        while True:
+            sequence += 1
+            timestamp = monotonic()
+
+            # Write the frame directly into each ring, skip the cameras whose frames are all being read
+            for ring in self._rings:
+                acquired = ring.acquire()
+                if acquired is not None:
+                    index, buffer = acquired
+                    buffer[:] = gradient + uint8(sequence & 0xFF)
+                    ring.commit(index, sequence, timestamp)
+
+            # Wait until the next frame is due
+            delay = start + sequence * self._interval - monotonic()
+            if delay > 0:
+                sleep(delay)
+
+    def start(self):
+        """
+
+        Function used to start generating the frames.
+
+        """
+
+        self._thread.start()
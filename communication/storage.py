@@ -0,0 +1,769 @@
+"""
+
+Storage is used to provide the data manager with interchangeable backends to keep the data in.
+
+** Functionality **
+
+By importing the module you gain access to the classes 'SharedMemoryBackend', 'MemoryBackend' and 'DiskBackend', as well
+as the 'BACKENDS' dictionary mapping the name of each backend to its class.
+
+Each backend is created with a schema - a dictionary mapping every device index to a tuple of the store's name, an
+iterable of the keys known upfront and a dictionary mapping the typed keys to the names of their NumPy types (see the
+'schema' module). You should use the 'store' function to retrieve the store of the given index, which
+supports reading the values, membership tests and iteration over the stored keys. You should use the 'clear' function
+to remove all the data from each store.
+
+Use the 'snapshot' function of a store to read multiple keys at once - the values returned are guaranteed to come from
+the same state of the store, together with the version of the last write. To write, open the backend's 'transaction'
+(which yields the new, globally unique version number) and call the 'update' function of each store to modify within it.
+Each update is applied atomically - readers never see a partially applied update.
+
+The shared memory backend keeps each store in an anonymous shared memory segment, which is inherited by every process
+forked after the backend was created. Each segment is divided into fixed-size slots - the known keys are assigned their
+slots upfront, whereas the spare slots are assigned to any other keys on their first write. The values stored must be
+either None, booleans, numbers, strings or JSON-serialisable objects, and their encoded size must fit within a slot.
+The keys which can't be stored (too long, or with no spare slot left) and the values which don't fit raise 'ValueError'
+before anything is written.
+The typed keys known upfront aren't kept in the slots - instead, the keys of each type are kept in a typed vector (a
+NumPy array viewing the segment, placed after the slots), so an update of all keys of a vector is a single slice
+assignment, and a read copies each vector at once. Their values must fit their types (for example, whole numbers within
+the range of 16-bit integers for the "int16" type), and they're read back as the type's values.
+
+Writers are serialised with a lock shared across the processes, whereas readers never lock. Instead, each segment holds
+a sequence counter, which is odd while a write is in progress, and the readers retry whenever the counter was odd or
+changed during the read (seqlock).
+
+The memory backend keeps the data in plain dictionaries, which are only visible within a single process. It should be
+used when all communication runs in a single thread (for example within an event loop), since it doesn't lock.
+
+The disk backend keeps the data in 'Cache' instances under the 'cache' directory, and uses their transactions.
+
+** Constants and other values **
+
+You should modify the '_NAME_SIZE' and '_PAYLOAD_SIZE' constants to change the maximum size (bytes) of the encoded key
+names and values in the shared memory slots.
+
+You should modify the '_SPARE_SLOTS' constant to change how many keys outside of the schema each segment can hold.
+
+** Example **
+
+To create a shared memory backend with a single store for the surface, keeping 'axis_x' and 'axis_y' as 16-bit integers,
+and set their values in it, call:
+
+    backend = SharedMemoryBackend({0: ("surface", {"axis_x", "axis_y"}, {"axis_x": "int16", "axis_y": "int16"})})
+
+    with backend.transaction() as version:
+        backend.store(0).update({"axis_x": 10, "axis_y": 20}, version)
+
+To retrieve both values (and the version they were written with), call:
+
+    data, version = backend.store(0).snapshot(["axis_x", "axis_y"])
+
+"""
+
+from contextlib import contextmanager
+from json import dumps, loads
+from mmap import mmap
+from multiprocessing import Lock
+from os import path
+from struct import Struct
+
+# Declare the maximum size of the key names and the values in the shared memory slots
+_NAME_SIZE = 32
+_PAYLOAD_SIZE = 93
+
+# Declare the number of slots available for keys outside of the schema
+_SPARE_SLOTS = 64
+
+# Declare the alignment (bytes) of the typed vectors
+_ALIGNMENT = 8
+
+# Declare the layouts of the segment header (sequence counter, number of assigned slots and version of the last write),
+# each slot's header (name, tag and payload length) and the global version counter
+_HEADER = Struct("<IIQ")
+_SLOT_HEADER = Struct("<{}scH".format(_NAME_SIZE))
+_SLOT_SIZE = _SLOT_HEADER.size + _PAYLOAD_SIZE
+_VERSION = Struct("<Q")
+
+# Declare the layouts of the fixed-size values
+_BOOL = Struct("<?")
+_INT = Struct("<q")
+_FLOAT = Struct("<d")
+
+# Declare the key used to store the version in the on-disk caches (can't collide with string keys)
+_VERSION_KEY = ("version",)
+
+# Declare the tags used to mark the type of each value
+_EMPTY = b"\x00"
+_NONE = b"n"
+_BOOLEAN = b"?"
+_INTEGER = b"i"
+_DOUBLE = b"d"
+_STRING = b"s"
+_JSON = b"j"
+
+
+def _encode(value) -> tuple:
+    """
+
+    Function used to encode a value into a tag and a payload.
+
+    :param value: Value to encode
+    :return: Tuple of the tag and the payload bytes
+
+    """
+
+    # Booleans must be checked before integers, since they are integers as well
+    if value is None:
+        return _NONE, b""
+    elif isinstance(value, bool):
+        return _BOOLEAN, _BOOL.pack(value)
+    elif isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+        return _INTEGER, _INT.pack(value)
+    elif isinstance(value, float):
+        return _DOUBLE, _FLOAT.pack(value)
+    elif isinstance(value, str):
+        return _STRING, value.encode("utf-8")
+
+    return _JSON, dumps(value).encode("utf-8")
+
+
+def _decode(tag: bytes, payload: bytes):
+    """
+
+    Function used to decode a value from a tag and a payload.
+
+    :param tag: Type of the value
+    :param payload: Encoded value
+    :return: Decoded value
+
+    """
+
+    if tag == _INTEGER:
+        return _INT.unpack(payload)[0]
+    elif tag == _DOUBLE:
+        return _FLOAT.unpack(payload)[0]
+    elif tag == _BOOLEAN:
+        return _BOOL.unpack(payload)[0]
+    elif tag == _STRING:
+        return payload.decode("utf-8")
+    elif tag == _NONE:
+        return None
+
+    return loads(payload.decode("utf-8"))
+
+
+class SharedMemoryStore:
+
+    def __init__(self, keys, lock, types=None):
+        """
+
+        Function used to initialise a store kept in a shared memory segment.
+
+        :param keys: Iterable of keys to assign the slots to upfront
+        :param lock: Lock shared by all writers
+        :param types: Dictionary mapping the typed keys to the names of their NumPy types
+
+        """
+
+        # Sort the keys to keep the layout deterministic, separate the typed keys
+        types = types or {}
+        typed = sorted(key for key in keys if key in types)
+        keys = sorted(key for key in keys if key not in types)
+
+        # Store the lock information
+        self._lock = lock
+
+        # Declare the number of slots in the segment
+        self._capacity = len(keys) + _SPARE_SLOTS
+
+        # Place the flags marking which typed keys were set after the slots
+        self._typed_keys = tuple(typed)
+        self._flags_offset = _HEADER.size + self._capacity * _SLOT_SIZE
+        size = self._flags_offset + len(typed)
+
+        # Group the typed keys into a vector of each type, placing each vector at an aligned offset
+        layout = []
+        if typed:
+            from numpy import dtype
+
+            for name in sorted({types[key] for key in typed}):
+                vector = tuple(key for key in typed if types[key] == name)
+                size += -size % _ALIGNMENT
+                layout.append((name, vector, size))
+                size += len(vector) * dtype(name).itemsize
+
+        # Allocate the anonymous shared segment (shared with the processes forked afterwards)
+        self._memory = mmap(-1, size)
+
+        # Create a typed view of each vector within the segment, and a key to vector, position and flag lookup
+        self._vectors = []
+        self._typed = {}
+        if typed:
+            from numpy import frombuffer
+
+            for number, (name, vector, offset) in enumerate(layout):
+                self._vectors.append((vector, frombuffer(self._memory, name, len(vector), offset)))
+                for position, key in enumerate(vector):
+                    self._typed[key] = number, position, self._typed_keys.index(key)
+
+        # Create a key to slot lookup, which is filled in further on each miss
+        self._slots = {}
+
+        # Assign the known keys to the first slots
+        for slot, key in enumerate(keys):
+            _SLOT_HEADER.pack_into(self._memory, self._offset(slot), self._encode_name(key), _EMPTY, 0)
+            self._slots[key] = slot
+
+        # Store the number of assigned slots
+        _HEADER.pack_into(self._memory, 0, 0, len(keys), 0)
+
+    @staticmethod
+    def _offset(slot: int) -> int:
+        return _HEADER.size + slot * _SLOT_SIZE
+
+    @staticmethod
+    def _encode_name(key: str) -> bytes:
+        """
+
+        Function used to encode a key name and check if it fits within the slot.
+
+        :param key: Key to encode
+        :return: Encoded key
+        :raises ValueError: If the key isn't a string, or its encoded name doesn't fit within the slot
+
+        """
+
+        # Make sure the key is a string
+        if not isinstance(key, str):
+            raise ValueError("Key {} can't be stored in the shared memory".format(key))
+
+        # Encode the key
+        name = key.encode("utf-8")
+
+        # Make sure the key can be stored and found again
+        if not name or len(name) > _NAME_SIZE or b"\x00" in name:
+            raise ValueError("Key {} can't be stored in the shared memory".format(key))
+
+        return name
+
+    def _sequence(self) -> int:
+        return _HEADER.unpack_from(self._memory, 0)[0]
+
+    def _refresh_slots(self):
+        """
+
+        Function used to update the key to slot lookup with keys assigned to the spare slots by any process.
+
+        """
+
+        # Retry until the names were read without a concurrent write
+        while True:
+
+            # Read the segment header before the read
+            sequence, assigned, _ = _HEADER.unpack_from(self._memory, 0)
+
+            # Skip the refresh if no slots were assigned since the last one
+            if assigned == len(self._slots):
+                return
+
+            # Retry if a write is in progress
+            if sequence & 1:
+                continue
+
+            # Read the name of each assigned slot
+            names = [_SLOT_HEADER.unpack_from(self._memory, self._offset(slot))[0] for slot in range(assigned)]
+
+            # Finish if nothing was written in the meantime
+            if sequence == self._sequence():
+                break
+
+        # Update the lookup with all assigned slots
+        self._slots.update({name.rstrip(b"\x00").decode("utf-8"): slot for slot, name in enumerate(names)})
+
+    def _find(self, key: str):
+        """
+
+        Function used to find the slot of a key.
+
+        :param key: Key to find
+        :return: Slot index or None if the key was never stored
+
+        """
+
+        # Look up the key in the local cache first, refresh the cache on miss
+        if key not in self._slots:
+            self._refresh_slots()
+
+        return self._slots.get(key)
+
+    def _read(self, slots, typed=False) -> tuple:
+        """
+
+        Function used to consistently read the content of multiple slots, and the typed vectors.
+
+        :param slots: Iterable of key, slot index pairs
+        :param typed: Boolean to specify if the typed vectors should be read
+        :return: Tuple of a list of key, tag, payload triplets, a list of each vector's values, the flags of the typed
+                 keys and the version of the last write
+
+        """
+
+        # Retry until the slots were read without a concurrent write
+        while True:
+
+            # Read the segment header before the read
+            sequence, _, version = _HEADER.unpack_from(self._memory, 0)
+
+            # Retry if a write is in progress
+            if sequence & 1:
+                continue
+
+            # Declare the list of the slots' content
+            content = []
+
+            # Read each slot
+            for key, slot in slots:
+                offset = self._offset(slot)
+                _, tag, length = _SLOT_HEADER.unpack_from(self._memory, offset)
+                offset += _SLOT_HEADER.size
+                content.append((key, tag, self._memory[offset:offset + length]))
+
+            # Copy each vector at once, together with the flags
+            values, flags = [], b""
+            if typed:
+                values = [vector.tolist() for _, vector in self._vectors]
+                flags = self._memory[self._flags_offset:self._flags_offset + len(self._typed_keys)]
+
+            # Finish if nothing was written in the meantime
+            if sequence == self._sequence():
+                return content, values, flags, version
+
+    def snapshot(self, keys=None) -> tuple:
+        """
+
+        Function used to consistently read multiple values from the store.
+
+        Keys that were never set are omitted from the result.
+
+        :param keys: Iterable of keys to read, or None to read all keys
+        :return: Tuple of a dictionary of the data and the version of the last write
+
+        """
+
+        # Refresh the lookup to include keys stored by other processes if all keys should be read
+        if keys is None:
+            self._refresh_slots()
+            slots = list(self._slots.items())
+            typed = self._typed_keys
+
+        # Otherwise separate the typed keys, and find the slot of each other key
+        else:
+            slots, typed = [], []
+            for key in keys:
+                if key in self._typed:
+                    typed.append(key)
+                else:
+                    slot = self._find(key)
+                    if slot is not None:
+                        slots.append((key, slot))
+
+        # Read all slots and vectors at once
+        content, values, flags, version = self._read(slots, bool(typed))
+
+        # Decode the slots' values, and add the typed values which were set
+        data = {key: _decode(tag, payload) for key, tag, payload in content if tag != _EMPTY}
+        for key in typed:
+            vector, position, flag = self._typed[key]
+            if flags[flag]:
+                data[key] = values[vector][position]
+
+        return data, version
+
+    def update(self, data: dict, version: int):
+        """
+
+        Function used to atomically write multiple values into the store.
+
+        Must be called within the backend's transaction.
+
+        :param data: Dictionary of key, value pairs to write
+        :param version: Version of the transaction
+        :raises ValueError: If any key or value can't be stored, in which case nothing is written
+
+        """
+
+        # Encode all names and values first, group the typed values by their vector
+        encoded = []
+        typed = {}
+        for key, value in data.items():
+            if key in self._typed:
+                vector, position, _ = self._typed[key]
+                typed.setdefault(vector, {})[position] = value
+                continue
+
+            tag, payload = _encode(value)
+
+            # Make sure the value fits in the slot
+            if len(payload) > _PAYLOAD_SIZE:
+                raise ValueError("Value of the key {} is too big to be stored in the shared memory".format(key))
+
+            encoded.append((key, self._encode_name(key), tag, payload))
+
+        # Find the slot of each key, assigning the spare slots to the keys never stored before
+        slots = []
+        spare = {}
+        for key, _, _, _ in encoded:
+            slot = self._find(key)
+
+            if slot is None:
+                slot = spare.get(key)
+
+            if slot is None:
+
+                # Make sure there are spare slots left
+                if len(self._slots) + len(spare) >= self._capacity:
+                    raise ValueError("No spare slots left to store the key {}".format(key))
+
+                # Take the first spare slot
+                slot = len(self._slots) + len(spare)
+                spare[key] = slot
+
+            slots.append(slot)
+
+        # Convert the typed values of each vector, to assign a full vector with a single slice
+        assignments = []
+        if typed:
+            from numpy import array
+
+            for vector, values in typed.items():
+                keys, view = self._vectors[vector]
+                positions = sorted(values)
+                try:
+                    converted = array([values[position] for position in positions], view.dtype)
+                except (OverflowError, TypeError) as e:
+                    raise ValueError("Values of the keys {} don't fit their type: {}".format(
+                        [keys[position] for position in positions], e))
+                flags = [self._flags_offset + self._typed[keys[position]][2] for position in positions]
+                assignments.append((view, slice(None) if len(positions) == len(keys) else positions, converted, flags))
+
+        # Assign the spare slots only once all keys and values fit
+        self._slots.update(spare)
+
+        # Mark the start of the write
+        sequence = self._sequence()
+        _HEADER.pack_into(self._memory, 0, (sequence + 1) & 0xFFFFFFFF, len(self._slots), version)
+
+        # Write each slot
+        for slot, (_, name, tag, payload) in zip(slots, encoded):
+            offset = self._offset(slot)
+            _SLOT_HEADER.pack_into(self._memory, offset, name, tag, len(payload))
+            offset += _SLOT_HEADER.size
+            self._memory[offset:offset + len(payload)] = payload
+
+        # Write each vector, and mark its keys as set
+        for view, positions, converted, flags in assignments:
+            view[positions] = converted
+            for flag in flags:
+                self._memory[flag] = 1
+
+        # Mark the end of the write
+        _HEADER.pack_into(self._memory, 0, (sequence + 2) & 0xFFFFFFFF, len(self._slots), version)
+
+    def __getitem__(self, key: str):
+
+        # Read the single key
+        data, _ = self.snapshot((key,))
+
+        return data[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.snapshot((key,))[0]
+
+    def __iter__(self):
+        return iter(self.snapshot()[0])
+
+    @property
+    def version(self) -> int:
+        return _HEADER.unpack_from(self._memory, 0)[2]
+
+    def clear(self):
+        """
+
+        Function used to remove all values from the store (the slot assignments are kept).
+
+        """
+
+        with self._lock:
+
+            # Mark the start of the write
+            sequence, assigned, version = _HEADER.unpack_from(self._memory, 0)
+            _HEADER.pack_into(self._memory, 0, (sequence + 1) & 0xFFFFFFFF, assigned, version)
+
+            # Mark each slot as empty
+            for slot in range(self._capacity):
+                offset = self._offset(slot) + _NAME_SIZE
+                self._memory[offset:offset + 1] = _EMPTY
+
+            # Mark each typed key as unset
+            self._memory[self._flags_offset:self._flags_offset + len(self._typed_keys)] = bytes(len(self._typed_keys))
+
+            # Mark the end of the write
+            _HEADER.pack_into(self._memory, 0, (sequence + 2) & 0xFFFFFFFF, assigned, version)
+
+
+class SharedMemoryBackend:
+
+    def __init__(self, schema: dict):
+        """
+
+        Function used to initialise the shared memory segments of each store.
+
+        :param schema: Dictionary mapping each index to a tuple of the store's name, the known keys and their types
+
+        """
+
+        # Create a lock shared by all writers
+        self._lock = Lock()
+
+        # Allocate the global version counter
+        self._version = mmap(-1, _VERSION.size)
+
+        # Create each store
+        self._stores = {index: SharedMemoryStore(keys, self._lock, types) for index, (_, keys, types) in schema.items()}
+
+    def store(self, index):
+        return self._stores[index]
+
+    @contextmanager
+    def transaction(self):
+        """
+
+        Function used to serialise the writers and generate the version of each write.
+
+        :return: Version of the transaction
+
+        """
+
+        with self._lock:
+
+            # Increment the version
+            version = _VERSION.unpack_from(self._version, 0)[0] + 1
+            _VERSION.pack_into(self._version, 0, version)
+
+            yield version
+
+    def clear(self):
+        for store in self._stores.values():
+            store.clear()
+
+
+class MemoryStore:
+
+    def __init__(self):
+        """
+
+        Function used to initialise a store kept in the process's memory.
+
+        """
+
+        # Initialise the data and its version
+        self._data = {}
+        self._version = 0
+
+    def snapshot(self, keys=None) -> tuple:
+        """
+
+        Function used to read multiple values from the store.
+
+        :param keys: Iterable of keys to read, or None to read all keys
+        :return: Tuple of a dictionary of the data and the version of the last write
+
+        """
+
+        # Copy all data if no keys were specified
+        if keys is None:
+            return dict(self._data), self._version
+
+        return {key: self._data[key] for key in keys if key in self._data}, self._version
+
+    def update(self, data: dict, version: int):
+        self._data.update(data)
+        self._version = version
+
+    def __getitem__(self, key: str):
+        return self._data[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def clear(self):
+        self._data.clear()
+
+
+class MemoryBackend:
+
+    def __init__(self, schema: dict):
+        """
+
+        Function used to initialise the in-memory stores.
+
+        :param schema: Dictionary mapping each index to a tuple of the store's name, the known keys and their types
+
+        """
+
+        # Initialise the version counter
+        self._version = 0
+
+        # Create each store
+        self._stores = {index: MemoryStore() for index in schema}
+
+    def store(self, index):
+        return self._stores[index]
+
+    @contextmanager
+    def transaction(self):
+        """
+
+        Function used to generate the version of each write.
+
+        :return: Version of the transaction
+
+        """
+
+        self._version += 1
+        yield self._version
+
+    def clear(self):
+        for store in self._stores.values():
+            store.clear()
+
+
+class DiskStore:
+
+    def __init__(self, directory: str):
+        """
+
+        Function used to initialise a store kept in an on-disk cache.
+
+        :param directory: Directory of the cache
+
+        """
+
+        # Import the cache only when the backend is used
+        from diskcache import Cache
+
+        # Initialise the cache
+        self._cache = Cache(directory)
+
+    def snapshot(self, keys=None) -> tuple:
+        """
+
+        Function used to consistently read multiple values from the store.
+
+        :param keys: Iterable of keys to read, or None to read all keys
+        :return: Tuple of a dictionary of the data and the version of the last write
+
+        """
+
+        with self._cache.transact():
+
+            # Read all string keys if none were specified
+            if keys is None:
+                keys = [key for key in self._cache if isinstance(key, str)]
+
+            # Read the data, omitting the keys that were never set
+            data = {key: self._cache[key] for key in keys if key in self._cache}
+
+            return data, self._cache.get(_VERSION_KEY, 0)
+
+    def update(self, data: dict, version: int):
+        """
+
+        Function used to atomically write multiple values into the store.
+
+        :param data: Dictionary of key, value pairs to write
+        :param version: Version of the transaction
+
+        """
+
+        with self._cache.transact():
+
+            # Write each value
+            for key, value in data.items():
+                self._cache[key] = value
+
+            # Store the version
+            self._cache[_VERSION_KEY] = version
+
+    def __getitem__(self, key: str):
+        return self._cache[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._cache
+
+    def __iter__(self):
+        return iter(self.snapshot()[0])
+
+    @property
+    def version(self) -> int:
+        return self._cache.get(_VERSION_KEY, 0)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class DiskBackend:
+
+    def __init__(self, schema: dict):
+        """
+
+        Function used to initialise the on-disk caches of each store.
+
+        :param schema: Dictionary mapping each index to a tuple of the store's name, the known keys and their types
+
+        """
+
+        # Import the cache only when the backend is used
+        from diskcache import Cache
+
+        # Initialise the cache holding the global version counter
+        self._version = Cache(path.join("cache", "version"))
+
+        # Create each store
+        self._stores = {index: DiskStore(path.join("cache", name)) for index, (name, _, _) in schema.items()}
+
+    def store(self, index):
+        return self._stores[index]
+
+    @contextmanager
+    def transaction(self):
+        """
+
+        Function used to serialise the writers and generate the version of each write.
+
+        :return: Version of the transaction
+
+        """
+
+        with self._version.transact():
+            yield self._version.incr(_VERSION_KEY)
+
+    def clear(self):
+        for store in self._stores.values():
+            store.clear()
+
+
+# Create a dictionary mapping each backend's name to its class
+BACKENDS = {
+    "shared_memory": SharedMemoryBackend,
+    "memory": MemoryBackend,
+    "disk": DiskBackend
+}
@@ -0,0 +1,213 @@
+"""
+
+Video encoding is used to compress the frames before sending them over the network.
+
+** Functionality **
+
+By importing the module you gain access to the class 'FrameEncoder', the 'decode_raw' function and the 'CODECS' tuple
+of the supported codecs.
+
+You should create an instance of 'FrameEncoder' for each stream and use the 'encode' function to convert a cv2 frame
+(numpy array) into bytes. The constructor takes the following optional parameters:
+
+    - 'codec' - either "jpeg" (default), "png", "raw" (the frame's bytes preceded by the raw header) or "pickle" (the
+      frame pickled with 'dill', as sent by the previous versions of the stream)
+    - 'quality' - JPEG quality (0 - 100) or PNG compression level (0 - 9)
+    - 'resolution' - tuple of width and height to resize each frame to, or None to keep the original resolution
+    - 'scale' - factor to downscale each frame by (applied only if the resolution isn't specified)
+
+OpenCV is only imported when the first frame is encoded, to keep the start-up fast.
+
+The raw header has a fixed size ('RAW_HEADER.size' bytes) and consists of the following big-endian fields:
+
+    1. Type of the frame's values (4 bytes), the numpy type string (for example '|u1') padded with null bytes.
+    2. Number of the frame's dimensions (1 byte), either 2 or 3.
+    3. Size of each dimension (3 times 4 bytes), the unused dimension is 0.
+    4. Sequence number of the frame (8 bytes).
+    5. Monotonic time at which the frame was captured (8-byte float).
+
+To send a raw frame without copying it, use the 'encode_parts' function instead - it returns the header and a
+'memoryview' of the frame's own memory, which can be passed directly to the socket's 'sendmsg' function. The frame must
+not be modified until it's sent. On the surface, use the 'decode_raw' function to get the frame (a numpy array using the
+received bytes, without copying them), its sequence number and timestamp.
+
+** Example **
+
+Let frame be a 640x480 cv2 frame. To encode it as a JPEG image with half of the resolution, call:
+
+    encoder = FrameEncoder(codec="jpeg", quality=70, scale=0.5)
+    data = encoder.encode(frame)
+
+"""
+
+from struct import Struct
+
+# Declare the supported codecs
+CODECS = ("jpeg", "png", "raw", "pickle")
+
+# Declare the layout of the raw header
+RAW_HEADER = Struct(">4sB3IQd")
+
+# Declare the maximum number of the frame's dimensions described by the raw header
+_MAX_DIMENSIONS = 3
+
+# Declare the default quality of each codec (JPEG quality, PNG compression level)
+_DEFAULT_QUALITY = {
+    "jpeg": 80,
+    "png": 3
+}
+
+
+class FrameEncoder:
+
+    def __init__(self, codec="jpeg", quality=None, resolution=None, scale=1):
+        """
+
+        Function used to initialise the encoder.
+
+        :param codec: Name of the codec to use
+        :param quality: Quality or compression level of the codec, or None to use the default one
+        :param resolution: Tuple of width and height to resize the frames to
+        :param scale: Factor to resize the frames by
+
+        """
+
+        # Make sure the codec is supported
+        if codec not in CODECS:
+            raise ValueError("Unsupported codec: {}".format(codec))
+
+        # Store the codec information
+        self._codec = codec
+        self._quality = _DEFAULT_QUALITY.get(codec) if quality is None else quality
+
+        # Store the resizing information
+        self._resolution = resolution
+        self._scale = scale
+
+        # Declare the encoding parameters, set on the first encoding
+        self._parameters = None
+
+    @property
+    def codec(self) -> str:
+        return self._codec
+
+    def _resize(self, frame):
+        """
+
+        Function used to change the resolution of a frame, if requested.
+
+        :param frame: cv2 frame
+        :return: Resized frame
+
+        """
+
+        from cv2 import resize, INTER_AREA
+
+        # Resize to the exact resolution if specified
+        if self._resolution:
+            if (frame.shape[1], frame.shape[0]) != tuple(self._resolution):
+                return resize(frame, tuple(self._resolution), interpolation=INTER_AREA)
+
+        # Otherwise resize by the factor
+        elif self._scale != 1:
+            return resize(frame, None, fx=self._scale, fy=self._scale, interpolation=INTER_AREA)
+
+        return frame
+
+    def encode_parts(self, frame, sequence=0, timestamp=0.0) -> list:
+        """
+
+        Function used to encode a frame into parts which can be sent one after another.
+
+        For the raw codec, the parts are the header and the frame's own memory (unless the frame must be resized or isn't
+        contiguous), so no copy of the frame is made. For the other codecs, the only part is the encoded frame.
+
+        :param frame: cv2 frame
+        :param sequence: Sequence number of the frame (raw codec only)
+        :param timestamp: Monotonic time at which the frame was captured (raw codec only)
+        :return: List of the encoded frame's parts
+
+        """
+
+        if self._codec != "raw":
+            return [self.encode(frame)]
+
+        from numpy import ascontiguousarray
+
+        # Resize the frame and make sure its memory is a single block
+        frame = ascontiguousarray(self._resize(frame))
+
+        # Make sure the frame's shape can be described
+        if not 2 <= frame.ndim <= _MAX_DIMENSIONS:
+            raise ValueError("Raw codec supports frames with 2 or 3 dimensions only")
+
+        # Describe the frame in the header
+        shape = frame.shape + (0,) * (_MAX_DIMENSIONS - frame.ndim)
+        header = RAW_HEADER.pack(frame.dtype.str.encode("ascii"), frame.ndim, *shape, sequence, timestamp)
+
+        # Expose the frame's memory as bytes
+        return [header, memoryview(frame).cast("B")]
+
+    def encode(self, frame, sequence=0, timestamp=0.0) -> bytes:
+        """
+
+        Function used to encode a frame.
+
+        :param frame: cv2 frame
+        :param sequence: Sequence number of the frame (raw codec only)
+        :param timestamp: Monotonic time at which the frame was captured (raw codec only)
+        :return: Encoded frame
+
+        """
+
+        # Pickle the frame as is for the legacy codec
+        if self._codec == "pickle":
+            from dill import dumps
+            return dumps(frame)
+
+        # Join the header and the frame's bytes for the raw codec
+        if self._codec == "raw":
+            return b"".join(self.encode_parts(frame, sequence, timestamp))
+
+        # Resize the frame
+        frame = self._resize(frame)
+
+        from cv2 import imencode, IMWRITE_JPEG_QUALITY, IMWRITE_PNG_COMPRESSION
+
+        # Create the encoding parameters
+        if self._parameters is None:
+            self._parameters = [IMWRITE_JPEG_QUALITY if self._codec == "jpeg" else IMWRITE_PNG_COMPRESSION,
+                                int(self._quality)]
+
+        # Compress the frame
+        success, data = imencode(".jpg" if self._codec == "jpeg" else ".png", frame, self._parameters)
+
+        if not success:
+            raise ValueError("Failed to encode the frame")
+
+        return data.tobytes()
+
+
+def decode_raw(message):
+    """
+
+    Function used to decode a frame encoded with the raw codec, without copying its bytes.
+
+    :param message: Bytes of the header followed by the frame's bytes
+    :return: Tuple of the frame (numpy array), its sequence number and timestamp
+
+    """
+
+    from numpy import frombuffer
+
+    # Read the header
+    dtype, dimensions, *shape, sequence, timestamp = RAW_HEADER.unpack_from(message)
+
+    # Make sure the header is valid
+    if not 2 <= dimensions <= _MAX_DIMENSIONS:
+        raise ValueError("Invalid raw header")
+
+    # Use the received bytes as the frame's memory
+    frame = frombuffer(message, dtype=dtype.rstrip(b"\0").decode("ascii"), offset=RAW_HEADER.size)
+
+    return frame.reshape(shape[:dimensions]), sequence, timestamp
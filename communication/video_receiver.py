@@ -0,0 +1,267 @@
+"""
+
+Video receiver is the reference implementation of the surface side of the video stream's UDP transport.
+
+** Functionality **
+
+By importing the module you gain access to the class 'VideoReceiver'.
+
+You should create an instance of 'VideoReceiver' with the address of the Raspberry Pi's video stream (created with the
+"udp" transport) and use the 'receive' function to wait for the next complete frame. While receiving, the receiver keeps
+its subscription alive by regularly sending an empty datagram to the stream. The frames are returned encoded, exactly as
+encoded by the stream's codec - for example, decode them with 'cv2.imdecode' for the JPEG codec, or with the 'decode_raw'
+function of the 'video_encoding' module for the raw codec. The frames which weren't received in full are skipped, the
+number of such frames and the number of frames recovered with the parity datagrams are available through the 'dropped'
+and 'recovered' fields.
+
+Running the module starts a local loopback test - a stream and a receiver are created on the local machine, synthetic
+frames are sent between them and a share of the datagrams is dropped on purpose. The received frames per second, the
+dropped and recovered frames and the frames' latency are printed at the end. Use the '--help' option to see the options.
+
+** Constants and other values **
+
+You should modify the '_KEEP_ALIVE_INTERVAL' constant to change the interval (seconds) of the subscription datagrams, it
+must be shorter than the stream's timeout.
+
+You should modify the '_RECEIVE_BUFFER_SIZE' constant to change the size (bytes) of the socket's receive buffer, which
+should hold at least a few frames.
+
+** Example **
+
+Let the stream run on 169.254.147.140 and port 50001. To receive and decode the frames, call:
+
+    receiver = VideoReceiver("169.254.147.140", 50001)
+
+    while True:
+        data = receiver.receive()
+        frame = cv2.imdecode(numpy.frombuffer(data, dtype=numpy.uint8), cv2.IMREAD_COLOR)
+
+To run the loopback test with 5% of the datagrams lost and a parity datagram for every 4 datagrams, call:
+
+    python -m communication.video_receiver --loss 0.05 --fec 4
+
+"""
+
+import socket
+from communication.fragmentation import Reassembler
+from time import monotonic
+
+# Declare the interval of the subscription datagrams
+_KEEP_ALIVE_INTERVAL = 1
+
+# Declare the size of the socket's receive buffer
+_RECEIVE_BUFFER_SIZE = 1 << 22
+
+# Declare the maximum size of a single datagram
+_MAX_DATAGRAM_SIZE = 0xFFFF
+
+
+class VideoReceiver:
+
+    def __init__(self, ip="localhost", port=50001):
+        """
+
+        Function used to initialise the receiver.
+
+        :param ip: Raspberry Pi's IP address
+        :param port: Raspberry Pi's port
+
+        """
+
+        # Save the stream's address
+        self._address = ip, port
+
+        # Initialise the socket for IPv4 addresses (hence AF_INET) and UDP (hence SOCK_DGRAM)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, _RECEIVE_BUFFER_SIZE)
+
+        # Initialise the reassembler of the frames
+        self._reassembler = Reassembler()
+
+        # Initialise the time of the last subscription datagram, so it's sent straight away
+        self._subscribed = None
+
+    @property
+    def dropped(self) -> int:
+        return self._reassembler.dropped
+
+    @property
+    def recovered(self) -> int:
+        return self._reassembler.recovered
+
+    def _subscribe(self):
+        """
+
+        Function used to send the subscription datagram, if it's due.
+
+        """
+
+        if self._subscribed is None or monotonic() - self._subscribed >= _KEEP_ALIVE_INTERVAL:
+            self._socket.sendto(b'', self._address)
+            self._subscribed = monotonic()
+
+    def _receive_datagram(self) -> bytes:
+        """
+
+        Function used to receive a single datagram.
+
+        :return: Bytes of the datagram
+
+        """
+
+        return self._socket.recv(_MAX_DATAGRAM_SIZE)
+
+    def receive(self, timeout=None):
+        """
+
+        Function used to wait for the next complete frame.
+
+        :param timeout: Maximum time (seconds) to wait for, or None to wait indefinitely
+        :return: Encoded frame, or None if there was none within the timeout
+
+        """
+
+        deadline = None if timeout is None else monotonic() + timeout
+
+        while True:
+
+            # Keep the subscription alive
+            self._subscribe()
+
+            # Wait for a datagram no longer than until the next subscription or the deadline
+            wait = self._subscribed + _KEEP_ALIVE_INTERVAL - monotonic()
+            if deadline is not None:
+                wait = min(wait, deadline - monotonic())
+
+            if wait <= 0:
+                if deadline is not None and monotonic() >= deadline:
+                    return None
+                continue
+
+            self._socket.settimeout(wait)
+
+            # Receive the datagram, ignore the errors caused by the stream not running yet
+            try:
+                datagram = self._receive_datagram()
+            except (socket.timeout, ConnectionRefusedError, ConnectionResetError):
+                continue
+
+            # Return the frame once it's complete
+            frame = self._reassembler.feed(datagram)
+
+            if frame is not None:
+                return frame
+
+    def close(self):
+        """
+
+        Function used to close the receiver's socket.
+
+        """
+
+        self._socket.close()
+
+
+class _LossyReceiver(VideoReceiver):
+
+    def __init__(self, ip, port, loss: float):
+        """
+
+        Function used to initialise a receiver dropping a share of the datagrams on purpose.
+
+        :param ip: Raspberry Pi's IP address
+        :param port: Raspberry Pi's port
+        :param loss: Probability of dropping each datagram
+
+        """
+
+        from random import Random
+
+        super().__init__(ip, port)
+
+        # Store the loss information, seed the generator to make the test repeatable
+        self._loss = loss
+        self._random = Random(0)
+
+    def _receive_datagram(self) -> bytes:
+
+        # Keep receiving until a datagram isn't dropped
+        while True:
+            datagram = super()._receive_datagram()
+
+            if self._random.random() >= self._loss:
+                return datagram
+
+
+def _loopback_test(arguments):
+    """
+
+    Function used to send synthetic frames between a stream and a receiver on the local machine.
+
+    :param arguments: Parsed command line arguments
+
+    """
+
+    from communication.video_encoding import decode_raw
+    from communication.video_stream import VideoStream
+    from numpy import arange, uint8
+    from statistics import mean, median
+    from threading import Thread
+    from time import sleep
+
+    # Create the stream, sending the frames from a background thread
+    stream = VideoStream("localhost", arguments.port, codec="raw", transport="udp", fec=arguments.fec)
+    stream._process.daemon = True
+    stream.run()
+
+    # Create a gradient frame, moved on with each new frame
+    frame = (arange(arguments.height * arguments.width * 3) % 256).astype(uint8).reshape(
+        (arguments.height, arguments.width, 3))
+
+    def produce():
+        for number in range(arguments.frames):
+            stream.frame = (frame + number).astype(uint8)
+            sleep(1 / arguments.fps)
+
+    # Create the receiver and wait for the stream to start
+    receiver = _LossyReceiver("localhost", arguments.port, arguments.loss)
+    receiver.receive(1)
+
+    # Send the frames and measure the time from setting each frame to receiving it
+    Thread(target=produce, daemon=True).start()
+    start, latencies, numbers = monotonic(), [], set()
+
+    while True:
+        data = receiver.receive(1)
+
+        if data is None:
+            break
+
+        received, number, timestamp = decode_raw(data)
+        latencies.append((monotonic() - timestamp) * 1000)
+        numbers.add(number)
+
+    # Inform about the results
+    duration = monotonic() - start - 1
+    print("Frames: {} set, {} received ({:.1f} per second), {} dropped, {} recovered".format(
+        arguments.frames, len(numbers), len(numbers) / duration, receiver.dropped, receiver.recovered))
+    if latencies:
+        print("Latency: {:.2f} ms median, {:.2f} ms mean, {:.2f} ms max".format(
+            median(latencies), mean(latencies), max(latencies)))
+
+    receiver.close()
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Loopback test of the video stream's UDP transport")
+    parser.add_argument("--port", type=int, default=50101, help="Local port of the stream")
+    parser.add_argument("--frames", type=int, default=300, help="Number of frames to send")
+    parser.add_argument("--fps", type=float, default=30, help="Frames set per second")
+    parser.add_argument("--width", type=int, default=320, help="Width of the frames")
+    parser.add_argument("--height", type=int, default=240, help="Height of the frames")
+    parser.add_argument("--loss", type=float, default=0.01, help="Probability of dropping each datagram")
+    parser.add_argument("--fec", type=int, default=0, help="Number of datagrams protected by each parity datagram")
+
+    _loopback_test(parser.parse_args())
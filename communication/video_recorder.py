@@ -0,0 +1,831 @@
+"""
+
+Video recorder is used to record the frames of a camera on board, alongside the live stream, so the footage isn't lost
+if the tether's link drops.
+
+** Functionality **
+
+By importing the module you gain access to the class 'VideoRecorder', and the 'list_segments', 'read_index',
+'read_frames', 'serve' and 'fetch' functions.
+
+You should create an instance of 'VideoRecorder' with a 'FrameRing' (see the 'capture' module) and the directory to
+record into, and use the 'start' function to start recording. The frames are taken from the ring and encoded by the
+'FrameEncoder' (see the 'video_encoding' module) exactly as the 'VideoStream' does, so the constructor takes the same
+optional 'codec', 'quality', 'resolution' and 'scale' parameters. Use the 'stop' function to write the frames queued
+and close the recording.
+
+The recorder encodes the frames itself, rather than reusing the frames encoded by the 'VideoStream' - the stream only
+encodes the frames while the surface is watching (and at the surface's pace), whereas the recording must go on when the
+tether's link drops. A camera which is both streamed and recorded is therefore compressed twice. To keep the second
+encoding cheap, only up to the 'rate' frames per second are recorded ('RECORD_RATE' by default, or every frame if it's
+None), a fraction of the capture's rate.
+
+Recording never blocks the capture nor the control processes. The newest frame is encoded by the recorder's thread (the
+frames replaced before being encoded, or before the next frame is due, are skipped), and queued without blocking - if
+the disk can't keep up, the oldest frames of the queue of the 'queue_size' length are dropped. A separate writer thread
+collects the frames and writes them in batches, once every 'BATCH_INTERVAL' seconds or once 'BATCH_SIZE' bytes are
+queued, with a single system call per file, and then flushes them to the disk, so a power cut loses at most a single
+batch. The frames are counted by the 'videorecorder.<name>.recorded', 'videorecorder.<name>.skipped' and
+'videorecorder.<name>.dropped' counters, the segments deleted to keep within the quota (or above the free space floor)
+by the 'videorecorder.<name>.deleted' counter, and the time of writing each batch by the 'videorecorder.<name>.write'
+histogram (see the 'metrics' module).
+
+The frames are recorded into segments spanning 'segment_duration' seconds each (or a quarter of the quota, whichever
+is reached first), named '<name>-<segment number>.vid', numbered on from the segments already in the directory. Each
+segment starts with a header (magic 'VID1', format version, name of the codec and the wall-clock and monotonic times
+of the segment's creation), followed by the frames, each preceded by its length (as described in the 'framing'
+module), so a segment can be parsed with the 'FrameParser' even without its index. Each segment's index,
+'<name>-<segment number>.idx', starts with the same header (magic 'VIX1'), followed by the fixed-size little-endian
+entries of the frames:
+
+    1. Offset of the encoded frame within the segment (8 bytes).
+    2. Size of the encoded frame (4 bytes).
+    3. Sequence number of the frame, as grabbed by the capture (8 bytes).
+    4. Monotonic time at which the frame was grabbed (8-byte float), comparable with the times of the data changes
+       recorded by the 'recorder' module.
+
+Each frame is written before its entry, so every entry refers to a frame fully written. Once the segments (and their
+indices) take up more than the 'quota' (bytes), the oldest segments are deleted, never the one being written. The quota
+only accounts for the recorder's own segments - the recorders sharing a directory should be given a share of the space
+each (for example 'DISK_QUOTA' divided by their number). Regardless of the quota, the oldest segments are also deleted
+while the disk's free space is below the 'min_free' floor (bytes), and once there are none left to delete, the frames
+are dropped instead of being written, so the recording never fills up the disk the rest of the system runs from.
+
+You should use the 'list_segments' function to list the segments of a directory, the 'read_index' function to read the
+entries of a segment's index, and the 'read_frames' function to read the frames of a segment - seeking straight to the
+first frame grabbed at or after the given time, found within the index.
+
+You should use the 'serve' function to serve the segments of a directory over TCP (blocking, for example from a daemon
+thread), and the 'fetch' function to download the segments served into a local directory after the dive. The files
+already downloaded are skipped, and the files downloaded partially (for example the segment being written at the time)
+are resumed. The requests and the replies are length-prefixed messages - each request is a JSON object with the
+"command" key, either "list" (replied with the "files" object mapping the name of each segment and index to its size)
+or "get" with the "file" and "offset" keys (replied with the JSON object holding the "size" key, followed by the file's
+bytes from the offset, sent in messages of up to '_CHUNK_SIZE' bytes straight from the file).
+
+The segments are served without any authentication nor encryption - anyone who can reach the address served on can
+list and download all of the recordings. The 'serve' function therefore binds to "localhost" by default, and should
+only ever be bound to the Raspberry Pi's address on the tether, never to all interfaces ("0.0.0.0").
+
+Running the module serves or fetches the segments. Use the '--help' option to see the options.
+
+** Constants and other values **
+
+You should modify the 'SEGMENT_DURATION' constant to change the time (seconds) spanned by each segment, the 'DISK_QUOTA'
+constant to change the maximum size (bytes) of the segments kept within a directory (by a recorder by default), and the
+'MIN_FREE_SPACE' constant to change the free space (bytes) kept on the disk by default.
+
+You should modify the 'RECORD_RATE' constant to change the maximum number of frames recorded per second by default.
+
+You should modify the 'BATCH_INTERVAL' constant to change how often (seconds) the frames are written, the 'BATCH_SIZE'
+constant to change how many bytes queued are written straight away, and the 'QUEUE_SIZE' constant to change how many
+frames can be queued before dropping them.
+
+You should modify the 'SERVE_PORT' constant to change the port the segments are served on.
+
+** Example **
+
+To record the first camera into the 'recordings' directory, call:
+
+    recorder = VideoRecorder(capture.ring(0), "recordings", name="camera0")
+    recorder.start()
+
+To serve the recordings, and fetch them after the dive, call:
+
+    Thread(target=serve, args=("recordings", "169.254.147.140"), daemon=True).start()
+
+    fetch("169.254.147.140", directory="downloads")
+
+To read the frames of the first segment from its 30th second, call:
+
+    segment = list_segments("downloads", "camera0")[0]
+    frames = read_frames(segment, start=read_index(segment)[0][3] + 30)
+
+"""
+
+from communication.framing import FrameParser
+from communication.fanout import Subscriber
+from communication.metrics import Counter, Histogram
+from communication.video_encoding import FrameEncoder
+from bisect import bisect_left
+from collections import deque
+from json import dumps, loads
+from os import O_CREAT, O_EXCL, O_WRONLY, close, fdatasync, listdir, makedirs, open as open_file, path, remove, \
+    statvfs, writev
+from socket import socket, create_connection, error
+from struct import Struct
+from threading import Event, Thread
+from time import monotonic, perf_counter, time
+
+# Declare the time (seconds) spanned by each segment, the maximum size (bytes) of the segments kept, and the free space
+# (bytes) kept on the disk
+SEGMENT_DURATION = 60
+DISK_QUOTA = 4 << 30
+MIN_FREE_SPACE = 512 << 20
+
+# Declare the maximum number of frames recorded per second
+RECORD_RATE = 10
+
+# Declare how often (seconds) the frames are written, how many bytes are written straight away and the queue's length
+BATCH_INTERVAL = 1
+BATCH_SIZE = 8 << 20
+QUEUE_SIZE = 64
+
+# Declare the port the segments are served on
+SERVE_PORT = 50003
+
+# Declare the layouts of the headers of the segments and the indices, and of each index entry
+_HEADER = Struct("<4sH8sdd")
+_ENTRY = Struct("<QIQd")
+
+# Declare the magic of the segments and the indices, and the format version
+_SEGMENT_MAGIC = b"VID1"
+_INDEX_MAGIC = b"VIX1"
+_VERSION = 1
+
+# Declare the extensions of the segments and the indices
+_SEGMENT_EXTENSION = ".vid"
+_INDEX_EXTENSION = ".idx"
+
+# Declare the minimum number of segments within the quota, which bounds the size of each segment
+_MIN_SEGMENTS = 4
+
+# Declare the maximum number of buffers written with a single system call
+_MAX_BUFFERS = 1024
+
+# Declare the maximum size (bytes) of an encoded frame, and of each message of a file served
+_MAX_FRAME_SIZE = 1 << 26
+_CHUNK_SIZE = 1 << 20
+
+# Declare how long (seconds) the threads wait for the frames before checking whether to stop
+_WAIT_TIMEOUT = 0.5
+
+
+def _write_all(descriptor: int, buffers: list):
+    """
+
+    Function used to write the buffers one after another, with as few system calls as possible.
+
+    :param descriptor: File descriptor to write to
+    :param buffers: List of the bytes-like buffers
+
+    """
+
+    buffers = [memoryview(buffer).cast("B") for buffer in buffers]
+    position = 0
+
+    while position < len(buffers):
+        written = writev(descriptor, buffers[position:position + _MAX_BUFFERS])
+
+        # Skip the buffers written fully, and the written bytes of the buffer written partially
+        while position < len(buffers) and written >= len(buffers[position]):
+            written -= len(buffers[position])
+            position += 1
+
+        if written:
+            buffers[position] = buffers[position][written:]
+
+
+def _segment_path(directory: str, name: str, number: int, extension: str) -> str:
+    return path.join(directory, "{}-{:06d}{}".format(name, number, extension))
+
+
+def _segment_numbers(directory: str, name: str) -> list:
+    """
+
+    Function used to find the numbers of the segments of the recorder's name.
+
+    :param directory: Directory the segments were created in
+    :param name: Name of the recorder
+    :return: Sorted list of the numbers of the segments
+
+    """
+
+    if not path.isdir(directory):
+        return []
+
+    numbers = set()
+    for file_name in listdir(directory):
+        stem, extension = path.splitext(file_name)
+        prefix, _, number = stem.rpartition("-")
+
+        if prefix == name and number.isdigit() and extension in (_SEGMENT_EXTENSION, _INDEX_EXTENSION):
+            numbers.add(int(number))
+
+    return sorted(numbers)
+
+
+class VideoRecorder:
+
+    def __init__(self, source, directory="recordings", *, name="video", codec="jpeg", quality=None, resolution=None,
+                 scale=1, rate=RECORD_RATE, segment_duration=SEGMENT_DURATION, quota=DISK_QUOTA,
+                 min_free=MIN_FREE_SPACE, queue_size=QUEUE_SIZE):
+        """
+
+        Function used to initialise the recorder. The first segment is only created once the first frame is written.
+
+        :param source: Frame ring to take the newest frames from (see the 'capture' module)
+        :param directory: Directory to create the segments in
+        :param name: Name of the recorder, the segments are named after it
+        :param codec: Name of the codec to encode the frames with
+        :param quality: Quality or compression level of the codec, or None to use the default one
+        :param resolution: Tuple of width and height to resize the frames to
+        :param scale: Factor to resize the frames by
+        :param rate: Maximum number of frames recorded per second, or None to record every frame
+        :param segment_duration: Time (seconds) spanned by each segment
+        :param quota: Maximum size (bytes) of the segments kept
+        :param min_free: Free space (bytes) kept on the disk, the frames are dropped once it can't be kept
+        :param queue_size: Maximum number of frames queued for writing
+
+        """
+
+        # Store the source, the interval (seconds) between the frames recorded and initialise the encoder of the frames
+        self._source = source
+        self._interval = 1 / rate if rate else 0.0
+        self._encoder = FrameEncoder(codec=codec, quality=quality, resolution=resolution, scale=scale)
+
+        # Store the segments information
+        self._directory = directory
+        self._name = name
+        self._duration = segment_duration
+        self._quota = quota
+        self._max_size = quota // _MIN_SEGMENTS
+        self._min_free = min_free
+
+        # Declare whether the frames are being dropped since the disk's free space is below the floor
+        self._full = False
+
+        # Create the queue of the encoded frames, dropping the oldest ones if the disk can't keep up
+        self._queue = Subscriber(queue_size, "oldest")
+
+        # Create the prefixes of the frames
+        self._framer = FrameParser("length", max_size=_MAX_FRAME_SIZE)
+
+        # Declare the descriptors of the current segment and its index, its number and the time it ends at
+        self._segment = None
+        self._index = None
+        self._number = 0
+        self._end = 0.0
+
+        # Declare the size of the current segment, and the size of the segment together with its index
+        self._offset = 0
+        self._size = 0
+
+        # Declare the numbers and the sizes (with the indices) of the finished segments, from the oldest one
+        self._segments = deque()
+
+        # Create the threads encoding and writing the frames, and the event telling them to stop
+        self._threads = (Thread(target=self._record, daemon=True), Thread(target=self._write, daemon=True))
+        self._stopping = Event()
+
+        # Register the metrics of the recording, named after the recorder (see the 'metrics' module)
+        self._metrics_name = "{}.{}".format(type(self).__name__.lower(), name)
+        self._recorded = Counter(self._metrics_name + ".recorded")
+        self._skipped = Counter(self._metrics_name + ".skipped")
+        self._dropped = Counter(self._metrics_name + ".dropped")
+        self._deleted = Counter(self._metrics_name + ".deleted")
+        self._write_time = Histogram(self._metrics_name + ".write")
+
+    def _record(self):
+        """
+
+        Function used to keep encoding the newest frames and queueing them for writing.
+
+        """
+
+        number = 0
+        due = 0.0
+
+        while not self._stopping.is_set():
+
+            # Wait until the next frame is due and for a new frame, checking regularly whether to stop
+            if self._stopping.wait(max(due - monotonic(), 0)) or not self._source.wait(number, _WAIT_TIMEOUT):
+                continue
+
+            due = monotonic() + self._interval
+
+            # Encode the frame, it isn't overwritten by the capture meanwhile
+            with self._source.latest() as (frame, sequence, timestamp):
+                message = self._encoder.encode(frame, sequence, timestamp)
+
+            # Count the frames skipped since the previous one, and the frames dropped from the queue
+            if number and sequence > number + 1:
+                self._skipped.add(sequence - number - 1)
+            number = sequence
+
+            dropped = self._queue.dropped
+            self._queue.put((message, sequence, timestamp))
+            if self._queue.dropped != dropped:
+                self._dropped.add(self._queue.dropped - dropped)
+
+    def _write(self):
+        """
+
+        Function used to collect the queued frames, and write them in batches.
+
+        """
+
+        # Find the segments already recorded, so they count towards the quota before the first frame is written
+        self._find_segments()
+
+        batch, size = [], 0
+        deadline = monotonic() + BATCH_INTERVAL
+
+        while True:
+            frame = self._queue.get(min(max(deadline - monotonic(), 0), _WAIT_TIMEOUT))
+
+            if frame is not None:
+                batch.append(frame)
+                size += len(frame[0])
+
+            # Finish once stopped and all frames queued by the (finished) encoding thread are collected
+            finished = frame is None and self._stopping.is_set() and not self._threads[0].is_alive()
+
+            # Write the batch once it's due or big enough
+            if monotonic() >= deadline or size >= BATCH_SIZE or finished:
+                if batch:
+                    self._write_batch(batch)
+                batch, size = [], 0
+                deadline = monotonic() + BATCH_INTERVAL
+
+            if finished:
+                break
+
+        self._close_segment()
+
+    def _find_segments(self):
+        """
+
+        Function used to find the segments already recorded, the numbers of the new segments continue after them.
+
+        """
+
+        for number in _segment_numbers(self._directory, self._name):
+            paths = (_segment_path(self._directory, self._name, number, extension)
+                     for extension in (_SEGMENT_EXTENSION, _INDEX_EXTENSION))
+            self._segments.append((number, sum(path.getsize(file_path) for file_path in paths
+                                               if path.exists(file_path))))
+            self._number = number
+
+    def _write_batch(self, batch: list):
+        """
+
+        Function used to write a batch of frames, splitting it between the segments.
+
+        :param batch: List of tuples of the encoded frame, its sequence number and timestamp
+
+        """
+
+        start = perf_counter()
+
+        # Make room for the batch, and drop it if the disk's free space stays below the floor
+        self._enforce_quota()
+        full = self._free_space() < self._min_free
+
+        if full != self._full:
+            print("{} the video of {}, the disk is {}".format("Stopped recording" if full else "Resumed recording",
+                                                               self._name, "full" if full else "no longer full"))
+            self._full = full
+
+        if full:
+            self._dropped.add(len(batch))
+            return
+
+        # Inform about the errors (for example a full disk) without stopping, the next batch starts a new segment
+        try:
+            buffers, entries = [], []
+
+            for message, sequence, timestamp in batch:
+                prefix = self._framer.prefix(len(message))
+
+                # Write the frames collected so far and start a new segment if the current one is over
+                if self._segment is None or timestamp >= self._end or \
+                        self._size + len(prefix) + len(message) + _ENTRY.size > self._max_size:
+                    self._flush(buffers, entries)
+                    buffers, entries = [], []
+                    self._rotate(timestamp)
+
+                # Collect the frame and its index entry
+                buffers += (prefix, message)
+                entries.append(_ENTRY.pack(self._offset + len(prefix), len(message), sequence, timestamp))
+                self._offset += len(prefix) + len(message)
+                self._size += len(prefix) + len(message) + _ENTRY.size
+
+            self._flush(buffers, entries)
+
+        except OSError as e:
+            print("Failed to record the video: {}".format(e))
+            self._close_segment()
+            return
+
+        finally:
+            self._write_time.record(perf_counter() - start)
+
+        self._recorded.add(len(batch))
+        self._enforce_quota()
+
+    def _flush(self, buffers: list, entries: list):
+        """
+
+        Function used to write the frames into the current segment, then their entries into its index.
+
+        :param buffers: List of the prefixes and the encoded frames
+        :param entries: List of the encoded index entries
+
+        """
+
+        if not entries:
+            return
+
+        _write_all(self._segment, buffers)
+        fdatasync(self._segment)
+
+        _write_all(self._index, [b"".join(entries)])
+        fdatasync(self._index)
+
+    def _rotate(self, timestamp: float):
+        """
+
+        Function used to close the current segment and create the next one.
+
+        :param timestamp: Monotonic time of the segment's first frame
+
+        """
+
+        # Create the directory with the first segment, the numbers continue after the segments already recorded
+        makedirs(self._directory, exist_ok=True)
+
+        self._close_segment()
+        self._number += 1
+
+        # Create the segment and its index, each starting with the header
+        for extension, magic in ((_SEGMENT_EXTENSION, _SEGMENT_MAGIC), (_INDEX_EXTENSION, _INDEX_MAGIC)):
+            descriptor = open_file(_segment_path(self._directory, self._name, self._number, extension),
+                                   O_WRONLY | O_CREAT | O_EXCL, 0o644)
+            _write_all(descriptor, [_HEADER.pack(magic, _VERSION, self._encoder.codec.encode("ascii"), time(),
+                                                 monotonic())])
+
+            if extension == _SEGMENT_EXTENSION:
+                self._segment = descriptor
+            else:
+                self._index = descriptor
+
+        # The frames follow the header, the size accounts for both headers
+        self._offset = _HEADER.size
+        self._size = 2 * _HEADER.size
+        self._end = timestamp + self._duration
+
+    def _close_segment(self):
+        """
+
+        Function used to close the current segment and its index, and account for their size.
+
+        """
+
+        if self._segment is None:
+            return
+
+        for descriptor in (self._segment, self._index):
+            if descriptor is not None:
+                close(descriptor)
+
+        self._segments.append((self._number, self._size))
+        self._segment, self._index = None, None
+        self._offset, self._size = 0, 0
+
+    def _free_space(self) -> int:
+        """
+
+        Function used to retrieve the free space of the disk recorded into.
+
+        :return: Number of bytes available to the recorder
+
+        """
+
+        # Check the closest existing directory, the recording directory is only created with the first segment
+        directory = path.abspath(self._directory)
+        while not path.isdir(directory):
+            directory = path.dirname(directory)
+
+        stats = statvfs(directory)
+        return stats.f_bavail * stats.f_frsize
+
+    def _enforce_quota(self):
+        """
+
+        Function used to delete the oldest segments once the segments take up more than the quota, or the disk's free
+        space is below the floor.
+
+        """
+
+        while self._segments and (sum(size for _, size in self._segments) + self._size > self._quota or
+                                  self._free_space() < self._min_free):
+            number, _ = self._segments.popleft()
+
+            # Delete the segment and its index, ignore the files already deleted
+            for extension in (_SEGMENT_EXTENSION, _INDEX_EXTENSION):
+                try:
+                    remove(_segment_path(self._directory, self._name, number, extension))
+                except FileNotFoundError:
+                    pass
+
+            self._deleted.add()
+
+    def start(self):
+        """
+
+        Function used to start recording.
+
+        """
+
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """
+
+        Function used to stop recording, once the frames queued are written.
+
+        """
+
+        self._stopping.set()
+
+        for thread in self._threads:
+            thread.join()
+
+
+def list_segments(directory: str, name="video") -> list:
+    """
+
+    Function used to list the segments of a recorder.
+
+    :param directory: Directory the segments were created in
+    :param name: Name of the recorder
+    :return: List of the paths of the segments, from the oldest one
+
+    """
+
+    return [_segment_path(directory, name, number, _SEGMENT_EXTENSION) for number in _segment_numbers(directory, name)
+            if path.exists(_segment_path(directory, name, number, _SEGMENT_EXTENSION))]
+
+
+def _read_header(data: bytes, magic: bytes, file_path: str) -> tuple:
+    """
+
+    Function used to check the header of a segment or an index.
+
+    :param data: Bytes starting with the header
+    :param magic: Magic expected
+    :param file_path: Path to the file, to inform about errors
+    :return: Tuple of the codec, and the wall-clock and monotonic times of the segment's creation
+
+    """
+
+    if len(data) < _HEADER.size:
+        raise ValueError("{} isn't a valid recording".format(file_path))
+
+    found, version, codec, wall_clock, timestamp = _HEADER.unpack_from(data)
+
+    if (found, version) != (magic, _VERSION):
+        raise ValueError("{} isn't a valid recording".format(file_path))
+
+    return codec.rstrip(b"\x00").decode("ascii"), wall_clock, timestamp
+
+
+def read_index(segment_path: str) -> list:
+    """
+
+    Function used to read the entries of a segment's index.
+
+    :param segment_path: Path to the segment
+    :return: List of tuples of the offset and the size of each encoded frame, its sequence number and timestamp
+
+    """
+
+    index_path = path.splitext(segment_path)[0] + _INDEX_EXTENSION
+
+    with open(index_path, "rb") as f:
+        data = f.read()
+
+    _read_header(data, _INDEX_MAGIC, index_path)
+
+    # Ignore the entry written partially, if any
+    end = _HEADER.size + (len(data) - _HEADER.size) // _ENTRY.size * _ENTRY.size
+
+    return list(_ENTRY.iter_unpack(data[_HEADER.size:end]))
+
+
+def read_frames(segment_path: str, start=None):
+    """
+
+    Function used to read the frames of a segment, seeking to the given time.
+
+    :param segment_path: Path to the segment
+    :param start: Monotonic time of the first frame read (the first frame grabbed at or after it), or None to read all
+    :return: Generator of tuples of the encoded frame, its sequence number and timestamp
+
+    """
+
+    entries = read_index(segment_path)
+
+    # Find the first frame within the index, in the order of the time
+    first = bisect_left([entry[3] for entry in entries], start) if start is not None else 0
+
+    with open(segment_path, "rb") as f:
+        _read_header(f.read(_HEADER.size), _SEGMENT_MAGIC, segment_path)
+
+        for offset, size, sequence, timestamp in entries[first:]:
+            f.seek(offset)
+            yield f.read(size), sequence, timestamp
+
+
+def _recorded_files(directory: str) -> dict:
+    """
+
+    Function used to find the segments and the indices of all recorders in a directory.
+
+    :param directory: Directory the segments were created in
+    :return: Dictionary mapping the name of each file to its size
+
+    """
+
+    if not path.isdir(directory):
+        return {}
+
+    return {name: path.getsize(path.join(directory, name)) for name in sorted(listdir(directory))
+            if name.endswith((_SEGMENT_EXTENSION, _INDEX_EXTENSION)) and path.isfile(path.join(directory, name))}
+
+
+class _Connection:
+
+    def __init__(self, connection):
+        """
+
+        Function used to exchange the length-prefixed messages through a connection.
+
+        :param connection: Connected socket
+
+        """
+
+        self._socket = connection
+        self._parser = FrameParser("length", max_size=_CHUNK_SIZE)
+        self._messages = deque()
+
+    def send(self, data: dict):
+        self._socket.sendall(self._parser.frame(bytes(dumps(data), encoding="utf-8")))
+
+    def receive(self) -> bytes:
+        """
+
+        Function used to receive the next message.
+
+        :return: Message received
+        :raises ConnectionError: If the connection was closed
+
+        """
+
+        while not self._messages:
+            data = self._socket.recv(_CHUNK_SIZE)
+
+            if not data:
+                raise ConnectionError("Connection closed")
+
+            self._messages.extend(self._parser.feed(data))
+
+        return self._messages.popleft()
+
+    def send_file(self, file_path: str, offset: int):
+        """
+
+        Function used to send the size of the rest of a file, followed by the rest in messages, straight from the file.
+
+        :param file_path: Path to the file
+        :param offset: Offset to send the file from
+
+        """
+
+        with open(file_path, "rb") as f:
+            size = max(path.getsize(file_path) - offset, 0)
+            self.send({"size": size})
+
+            for position in range(offset, offset + size, _CHUNK_SIZE):
+                count = min(_CHUNK_SIZE, offset + size - position)
+                self._socket.sendall(self._parser.prefix(count))
+                self._socket.sendfile(f, position, count)
+
+
+def serve(directory="recordings", ip="localhost", port=SERVE_PORT):
+    """
+
+    Function used to serve the segments of a directory, one client at a time. The function never returns.
+
+    :param directory: Directory the segments were created in
+    :param ip: Raspberry Pi's IP address on the tether, the segments are served to anyone who can reach it
+    :param port: Port to serve the segments on
+
+    """
+
+    server_socket = socket()
+
+    # Bind the socket to the given address, inform about errors
+    try:
+        server_socket.bind((ip, port))
+    except error:
+        print("Failed to bind socket to the given address {}:{} ".format(ip, port))
+        raise
+
+    server_socket.listen(1)
+
+    while True:
+        client_socket, address = server_socket.accept()
+        connection = _Connection(client_socket)
+
+        # Reply to the requests until the client disconnects, inform about invalid requests
+        try:
+            while True:
+                request = loads(connection.receive().decode("utf-8"))
+                files = _recorded_files(directory)
+
+                if request.get("command") == "list":
+                    connection.send({"files": files})
+                elif request.get("command") == "get" and request.get("file") in files:
+                    connection.send_file(path.join(directory, request["file"]), int(request.get("offset", 0)))
+                else:
+                    connection.send({"error": "Invalid request: {}".format(request)})
+
+        except (ConnectionError, OSError):
+            pass
+
+        except (ValueError, AttributeError) as e:
+            print("Received invalid request from {}: {}".format(address, e))
+
+        client_socket.close()
+
+
+def fetch(ip: str, port=SERVE_PORT, directory="downloads") -> list:
+    """
+
+    Function used to download the segments served, resuming the files downloaded partially.
+
+    :param ip: Raspberry Pi's IP address
+    :param port: Port the segments are served on
+    :param directory: Directory to download the segments into
+    :return: List of the names of the files downloaded (fully or partially)
+
+    """
+
+    makedirs(directory, exist_ok=True)
+    downloaded = []
+
+    with create_connection((ip, port)) as client_socket:
+        connection = _Connection(client_socket)
+
+        connection.send({"command": "list"})
+        files = loads(connection.receive().decode("utf-8"))["files"]
+
+        for name, size in files.items():
+
+            # Skip the files already downloaded, resume the others
+            file_path = path.join(directory, path.basename(name))
+            offset = path.getsize(file_path) if path.exists(file_path) else 0
+            if offset >= size:
+                continue
+
+            connection.send({"command": "get", "file": name, "offset": offset})
+            remaining = loads(connection.receive().decode("utf-8"))["size"]
+
+            with open(file_path, "ab") as f:
+                while remaining > 0:
+                    chunk = connection.receive()
+                    f.write(chunk)
+                    remaining -= len(chunk)
+
+            downloaded.append(name)
+
+    return downloaded
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Serve the video recorded on board, or fetch it after the dive")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    serve_parser = commands.add_parser("serve", help="Serve the segments of a directory")
+    serve_parser.add_argument("directory", help="Directory the segments were created in")
+    serve_parser.add_argument("--ip", default="localhost", help="Raspberry Pi's IP address on the tether")
+    serve_parser.add_argument("--port", type=int, default=SERVE_PORT, help="Port to serve the segments on")
+
+    fetch_parser = commands.add_parser("fetch", help="Download the segments served")
+    fetch_parser.add_argument("ip", help="Raspberry Pi's IP address")
+    fetch_parser.add_argument("--port", type=int, default=SERVE_PORT, help="Port the segments are served on")
+    fetch_parser.add_argument("--directory", default="downloads", help="Directory to download the segments into")
+
+    arguments = parser.parse_args()
+
+    if arguments.command == "serve":
+        serve(arguments.directory, arguments.ip, arguments.port)
+    else:
+        for file_name in fetch(arguments.ip, arguments.port, arguments.directory):
+            print("Downloaded {}".format(file_name))
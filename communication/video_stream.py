@@ -13,6 +13,44 @@ to connect with the surface. Ip passed should be a string, whereas the port an i
 Once connected, the class should handle everything, including formatting, encoding and re-connecting in case of
 data loss. Additionally, the class allows you to access and set the frame through the 'frame' field.
 
+Setting the frame only stores its reference - the frame is encoded by the stream's thread, and only once it's about to be
+sent, so the capture is never slowed down by the encoding and the frames which are replaced before being sent are never
+encoded. The constructor takes additional, optional 'codec', 'quality', 'resolution' and 'scale' parameters, which are
+passed to the 'FrameEncoder' (see the 'video_encoding' module). The frames are JPEG-encoded by default, and should be
+decoded on the surface with 'cv2.imdecode'. Set the codec to "pickle" to send the frames pickled with 'dill' instead.
+
+By default, each frame is followed by the frame-end string, and the stream waits for the surface to acknowledge it before
+sending the next one. Set the additional, optional 'transport' parameter to "stream" to instead send each frame preceded
+by its length (as described in the 'framing' module) as soon as a new frame is set, without any acknowledgements. The
+surface should then only receive, parsing the frames with the 'FrameParser'. While the connection is backed up, only the
+newest frame is kept, so the latency doesn't grow under congestion.
+
+Set the transport to "fanout" to serve any number of clients at once on the same port. Each new frame is encoded once,
+framed as in the streaming transport, and shared by reference between all connected clients. Each client is sent its
+frames from its own thread (or task, within the event loop) and its own queue of the additional, optional 'queue_size'
+length, so a slow client only drops its own frames and never stalls the others. The additional, optional 'drop'
+parameter specifies which frame is dropped when a client's queue is full (see the 'fanout' module) - by default, the
+oldest one, so each client keeps up with the newest frames.
+
+Set the transport to "udp" to send the frames as datagrams instead, so a lost packet never stalls the stream while it's
+retransmitted. Each frame is split into datagrams fitting the network's MTU (as described in the 'fragmentation' module),
+and the frames which aren't received in full are dropped by the surface. Set the additional, optional 'fec' parameter to
+the number of datagrams protected by each parity datagram to let the surface recover a single lost datagram of each
+group. The frames are sent to every address which has sent any datagram to the stream within the timeout - the surface
+should keep sending such datagrams regularly (see the 'video_receiver' module, which implements the surface side).
+
+Instead of setting the frames, you may pass a 'FrameRing' (see the 'capture' module) as the additional, optional 'source'
+parameter. The stream then always sends the newest frame grabbed by the camera, encoding it directly from the ring.
+
+Set the codec to "raw" together with the "stream" transport to send full-fidelity frames without copying them - each
+message then holds the fixed raw header (shape, type, sequence number and timestamp of the frame) followed by the frame's
+own memory, passed straight to the socket's 'sendmsg' function. Frames from a source stay pinned in the ring until they
+are sent. On the surface, pass each message to the 'decode_raw' function of the 'video_encoding' module.
+
+The frames are counted by the 'videostream.<port>.encoded', 'videostream.<port>.sent' and 'videostream.<port>.dropped'
+counters (see the 'metrics' module). A frame is dropped if it was replaced before being encoded, if it didn't fit a
+fan-out client's queue, or if its datagrams couldn't be sent.
+
 You should modify any `_handle_data` functions to change how the data is processed.
 
 You should modify the '_on_surface_disconnected' function to modify behaviour when the connection between surface and
@@ -32,6 +70,8 @@ The port is 50001 by default, so it's not necessary to explicitly specify it. To
 
     video_stream.run()
 
+Alternatively, the stream can be run within an event loop together with the server (see the 'runtime' module).
+
 Let frame be a cv2 numpy array. To send it, call
 
     video_stream.frame = frame
@@ -42,45 +82,267 @@ Kacper Florianski
 
 """
 
+from asyncio import Event as AsyncEvent, TimeoutError, gather, get_event_loop, wait_for
+from communication.fanout import Subscriber, DROP_POLICIES
+from communication.fragmentation import Fragmenter
+from communication.framing import FrameParser
+from communication.metrics import Counter
 from communication.server import Server
-from dill import dumps
-from socket import timeout
-from threading import Thread
+from communication.video_encoding import FrameEncoder
+from contextlib import contextmanager
+from socket import socket, error, timeout, AF_INET, SOCK_DGRAM, IPPROTO_TCP, SOL_SOCKET, SO_SNDBUF, TCP_NODELAY
+from threading import Event, Lock, Thread
+from time import monotonic
 
 
 class VideoStream(Server):
 
-    def __init__(self, ip="localhost", port=50001):
+    def __init__(self, ip="localhost", port=50001, *, codec="jpeg", quality=None, resolution=None, scale=1,
+                 transport="ack", source=None, queue_size=2, drop="oldest", fec=0):
         """
 
         Function used to initialise the stream.
 
+        ** Modifications **
+
+            1. Modify the '_SEND_BUFFER_SIZE' constant to specify the size (bytes) of the socket's send buffer in the
+               streaming transport, which bounds the amount of data in flight.
+
+            2. Modify the '_MAX_FRAME_SIZE' constant to specify the maximum size (bytes) of a single frame sent in the
+               streaming transport.
+
+            3. Modify the '_BACKLOG' constant to specify the number of connections waiting to be accepted in the fan-out
+               transport.
+
+            4. Modify the '_DATAGRAM_SIZE' constant to specify the maximum size (bytes) of each datagram in the UDP
+               transport, which must fit the network's MTU.
+
         :param ip: Raspberry Pi's IP address
         :param port: Raspberry Pi's port
+        :param codec: Name of the codec to encode the frames with
+        :param quality: Quality or compression level of the codec, or None to use the default one
+        :param resolution: Tuple of width and height to resize the frames to
+        :param scale: Factor to resize the frames by
+        :param transport: Either "ack" to wait for an acknowledgement of each frame, "stream" to keep sending the
+                          newest frames as length-prefixed messages, "fanout" to stream to any number of clients, or
+                          "udp" to send the newest frames as datagrams
+        :param source: Frame ring to take the newest frames from (see the 'capture' module), or None to send the frames
+                       set through the 'frame' field
+        :param queue_size: Maximum number of frames queued for each client in the fan-out transport
+        :param drop: Policy applied when a client's queue is full in the fan-out transport
+        :param fec: Number of datagrams protected by each parity datagram in the UDP transport, or 0 to send no parity
 
         """
 
-        # Super the TCP data exchange functionality
-        super()._init_high_level(ip=ip, port=port)
+        # Make sure the transport is supported
+        if transport not in ("ack", "stream", "fanout", "udp"):
+            raise ValueError("Unsupported transport: {}".format(transport))
+
+        # Make sure the drop policy is supported
+        if drop not in DROP_POLICIES:
+            raise ValueError("Unsupported drop policy: {}".format(drop))
+
+        # Store the transport information
+        self._transport = transport
 
-        # Override the process as a thread to handle the frame correctly
-        self._process = Thread(target=self._listen_high_level)
+        # Super the TCP data exchange functionality, frame the messages with their length when streaming, and handle
+        # the frame in a thread rather than a process
+        super()._init_high_level(ip=ip, port=port, framing=None if transport == "ack" else "length", worker=Thread(
+            target={"fanout": self._listen_fanout, "udp": self._listen_udp}.get(transport, self._listen_high_level)))
 
         # Initialise the frame-end string to mark when a full frame was sent
         self._end_payload = bytes("Frame was successfully sent", encoding="ASCII")
 
-        # Initialise the frame
-        self._frame = dumps(b'')
+        # Initialise the send buffer size to keep only a few frames in flight when streaming
+        self._SEND_BUFFER_SIZE = 1 << 17
+
+        # Initialise the maximum frame size to fit raw, full-resolution frames
+        self._MAX_FRAME_SIZE = 1 << 26
+
+        # Initialise the number of connections waiting to be accepted when fanning out
+        self._BACKLOG = 8
+
+        # Store the queue information of each client
+        self._queue_size = queue_size
+        self._drop = drop
+
+        # Initialise the queues of the connected clients and the lock used to protect them
+        self._subscribers = set()
+        self._subscribers_lock = Lock()
+
+        # Accept multiple connections and create a parser to frame the shared frames when fanning out
+        if transport == "fanout":
+            self._socket.listen(self._BACKLOG)
+            self._parser = FrameParser(self._framing, max_size=self._MAX_FRAME_SIZE)
+
+        # Initialise the datagram size to fit the Ethernet's MTU (without the IPv4 and UDP headers)
+        self._DATAGRAM_SIZE = 1500 - 20 - 8
+
+        # Replace the TCP socket with a UDP socket bound to the same address when sending datagrams
+        if transport == "udp":
+            self._socket.close()
+            self._socket = socket(AF_INET, SOCK_DGRAM)
+
+            # Bind the socket to the given address, inform about errors
+            try:
+                self._socket.bind((self._ip, self._port))
+            except error:
+                print("Failed to bind socket to the given address {}:{} ".format(self._ip, self._port))
+
+            # Initialise the splitter of the frames into datagrams
+            self._fragmenter = Fragmenter(self._DATAGRAM_SIZE, fec)
+
+        # Initialise the addresses receiving the datagrams (mapped to the time they were last heard from)
+        self._peers = {}
+
+        # Initialise the event marking that a new frame was set
+        self._new_frame = Event()
+
+        # Initialise the encoder of the frames
+        self._encoder = FrameEncoder(codec=codec, quality=quality, resolution=resolution, scale=scale)
+
+        # Store the source of the frames
+        self._source = source
+
+        # Initialise the latest raw frame with its number and timestamp (stored together to be replaced at once)
+        self._latest = 0, None, 0.0
+
+        # Initialise the encoded frame and the number of the raw frame it was encoded from
+        self._frame = self._encoder.encode(b'') if codec == "pickle" else b''
+        self._encoded_number = 0
+
+        # Register the metrics of the frames
+        self._encoded = Counter(self._metrics_name + ".encoded")
+        self._sent = Counter(self._metrics_name + ".sent")
+        self._dropped = Counter(self._metrics_name + ".dropped")
 
     @property
     def frame(self):
-        return self._frame
+        return self._encoded_frame()
 
     @frame.setter
     def frame(self, value):
 
-        # Pickle the cv2 frame
-        self._frame = dumps(value)
+        # Store the reference to the cv2 frame only, it's encoded once it's about to be sent
+        self._latest = self._latest[0] + 1, value, monotonic()
+
+        # Wake up the streaming transport
+        self._new_frame.set()
+
+    @contextmanager
+    def _latest_frame(self):
+        """
+
+        Function used to access the latest frame, which isn't overwritten by the source until the context is exited.
+
+        :return: Tuple of the frame (None if there's none yet), its number and timestamp
+
+        """
+
+        # Take the newest frame from the source
+        if self._source:
+            with self._source.latest() as latest:
+                yield latest
+
+        # Otherwise take the frame set last
+        else:
+            number, frame, timestamp = self._latest
+            yield frame, number, timestamp
+
+    def _encoded_frame(self) -> bytes:
+        """
+
+        Function used to encode the latest frame, unless it was already encoded.
+
+        :return: Encoded frame
+
+        """
+
+        with self._latest_frame() as (frame, number, timestamp):
+
+            # Encode the frame if it's new
+            if frame is not None and number != self._encoded_number:
+                self._frame = self._encoder.encode(frame, number, timestamp)
+                self._count_encoded(number)
+
+        return self._frame
+
+    def _count_encoded(self, number: int):
+        """
+
+        Function used to count a newly encoded frame, and the frames replaced before it without being encoded.
+
+        :param number: Number of the frame
+
+        """
+
+        # The numbers start again after a new client connects, so the frames skipped are only counted in between
+        if self._encoded_number and number > self._encoded_number + 1:
+            self._dropped.add(number - self._encoded_number - 1)
+
+        self._encoded.add()
+        self._encoded_number = number
+
+    def _raw_parts(self, frame, number, timestamp) -> list:
+        """
+
+        Function used to build the parts of a length-prefixed raw frame, without copying the frame.
+
+        :param frame: cv2 frame, or None to send an empty message
+        :param number: Number of the frame
+        :param timestamp: Monotonic time at which the frame was captured
+        :return: List of the length prefix, the raw header and the frame's memory
+
+        """
+
+        # Encode the frame into the header and the frame's memory
+        parts = self._encoder.encode_parts(frame, number, timestamp) if frame is not None else []
+
+        if frame is not None and number != self._encoded_number:
+            self._count_encoded(number)
+
+        return [self._parser.prefix(sum(len(part) for part in parts))] + parts
+
+    def _send_parts(self, parts: list):
+        """
+
+        Function used to send the parts of a message one after another, directly from their memory.
+
+        :param parts: List of the bytes-like parts
+
+        """
+
+        while parts:
+            sent = self._client_socket.sendmsg(parts)
+
+            # Drop the parts sent fully
+            while parts and sent >= len(parts[0]):
+                sent -= len(parts[0])
+                parts.pop(0)
+
+            # Skip the sent bytes of the part sent partially
+            if parts:
+                parts[0] = memoryview(parts[0])[sent:]
+
+    def _wait_frame(self, timeout) -> bool:
+        """
+
+        Function used to block until a frame newer than the last encoded one is available.
+
+        :param timeout: Maximum time (seconds) to wait for
+        :return: True if a new frame is available
+
+        """
+
+        # Wait for the source's newer frame
+        if self._source:
+            return self._source.wait(self._encoded_number, timeout)
+
+        # Otherwise wait for a new frame to be set
+        result = self._new_frame.wait(timeout)
+        self._new_frame.clear()
+
+        return result
 
     def _handle_data(self):
         """
@@ -89,11 +351,15 @@ class VideoStream(Server):
 
         """
 
+        # Keep sending the newest frames if streaming
+        if self._transport == "stream":
+            return self._stream_frame()
+
         # Once connected, keep receiving and sending the data, raise exception in case of errors
         try:
 
             # Send the frame
-            self._client_socket.sendall(self._frame)
+            self._client_socket.sendall(self._encoded_frame())
 
             # Mark that the frame was sent
             self._client_socket.sendall(self._end_payload)
@@ -104,6 +370,459 @@ class VideoStream(Server):
         except (ConnectionResetError, ConnectionAbortedError, timeout):
             raise self.DataError
 
+        self._sent.add()
+
+    def _stream_frame(self):
+        """
+
+        Function used to send the newest frame, without waiting for an acknowledgement.
+
+        While the socket is backed up, the frames set in the meantime replace each other, so only the newest one is sent
+        once there's space again - stale frames are dropped instead of queued.
+
+        """
+
+        # Wait for a new frame, send the current one again if there's none for too long (to detect connection loss)
+        self._wait_frame(self._TIMEOUT)
+
+        # Send the length-prefixed frame, break in case of errors
+        try:
+
+            # Send the raw frame straight from its memory, keeping it pinned until it's sent
+            if self._encoder.codec == "raw":
+                with self._latest_frame() as latest:
+                    self._send_parts(self._raw_parts(*latest))
+
+            else:
+                self._client_socket.sendall(self._parser.frame(self._encoded_frame()))
+
+        except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError, timeout):
+            raise self.DataError
+
+        self._sent.add()
+
+    async def _handle_data_async(self, reader, writer):
+        """
+
+        Function used to exchange and process the frames within the event loop.
+
+        :param reader: Stream to receive the acknowledgements from
+        :param writer: Stream to send the frames to
+
+        """
+
+        # Keep sending the newest frames if streaming
+        if self._transport == "stream":
+            return await self._stream_frame_async(writer)
+
+        # Once connected, keep receiving and sending the data, raise exception in case of errors
+        try:
+
+            # Send the frame and mark that it was sent
+            writer.write(self._encoded_frame())
+            writer.write(self._end_payload)
+            await wait_for(writer.drain(), self._TIMEOUT)
+
+            # Wait for the acknowledgement
+            await wait_for(reader.read(128), self._TIMEOUT)
+
+        except (ConnectionResetError, ConnectionAbortedError, TimeoutError):
+            raise self.DataError
+
+        self._sent.add()
+
+    async def _stream_frame_async(self, writer):
+        """
+
+        Function used to send the newest frame within the event loop, without waiting for an acknowledgement.
+
+        :param writer: Stream to send the frames to
+
+        """
+
+        # Wait for a new frame without blocking the event loop (the frames are set from another thread)
+        await get_event_loop().run_in_executor(None, self._wait_frame, self._TIMEOUT)
+
+        # Send the length-prefixed frame, wait while the stream is backed up
+        try:
+
+            # Pass each part of the raw frame to the transport separately (joining them would copy the frame), which
+            # either sends it straight away or copies the rest into its buffer, so the frame can be released early
+            if self._encoder.codec == "raw":
+                with self._latest_frame() as latest:
+                    for part in self._raw_parts(*latest):
+                        writer.write(part)
+
+            else:
+                writer.write(self._parser.frame(self._encoded_frame()))
+
+            await wait_for(writer.drain(), self._TIMEOUT)
+
+        except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError, TimeoutError):
+            raise self.DataError
+
+        self._sent.add()
+
+    def _publish(self):
+        """
+
+        Function used to encode the latest frame once and queue it for each connected client.
+
+        """
+
+        with self._subscribers_lock:
+            subscribers = tuple(self._subscribers)
+
+        # Don't encode the frames if nobody is watching
+        if not subscribers:
+            return
+
+        # Frame the encoded frame once, each client queues the same message
+        message = self._parser.frame(self._encoded_frame())
+
+        # Count the frames each client had to drop to queue the new one
+        for subscriber in subscribers:
+            dropped = subscriber.dropped
+            subscriber.put(message)
+            if subscriber.dropped != dropped:
+                self._dropped.add(subscriber.dropped - dropped)
+
+    def _broadcast(self):
+        """
+
+        Function used to continuously publish the newest frames.
+
+        """
+
+        while True:
+
+            # Wait for a new frame, publish the current one again if there's none for long (to detect connection loss)
+            self._wait_frame(self._TIMEOUT)
+            self._publish()
+
+    def _configure_client(self, client_socket):
+        """
+
+        Function used to limit the data in flight and disable the delay of small packets of a streaming client.
+
+        :param client_socket: Socket of the client
+
+        """
+
+        client_socket.setsockopt(SOL_SOCKET, SO_SNDBUF, self._SEND_BUFFER_SIZE)
+        client_socket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+
+    def _add_subscriber(self, subscriber, address):
+        """
+
+        Function used to start sending the frames to a new client.
+
+        :param subscriber: Queue of the client
+        :param address: Address of the client
+
+        """
+
+        with self._subscribers_lock:
+            self._subscribers.add(subscriber)
+
+        # Count the connection
+        self._connections.add()
+
+        # Send the current frame to the new client straight away
+        self._new_frame.set()
+        self._encoded_number = 0
+
+        print("Client with address {} subscribed".format(address))
+
+    def _remove_subscriber(self, subscriber, address):
+        """
+
+        Function used to stop sending the frames to a disconnected client.
+
+        :param subscriber: Queue of the client
+        :param address: Address of the client
+
+        """
+
+        with self._subscribers_lock:
+            self._subscribers.discard(subscriber)
+
+        print("Video stream to {} address closed, {} frames dropped".format(address, subscriber.dropped))
+
+    def _listen_fanout(self):
+        """
+
+        Function used to accept any number of clients and run a thread sending the frames to each of them.
+
+        """
+
+        # Start publishing the frames
+        Thread(target=self._broadcast, daemon=True).start()
+
+        # Inform that the stream is ready to receive connections
+        print("{} is waiting for clients...".format(self._socket.getsockname()))
+
+        while True:
+
+            # Wait for a connection
+            client_socket, address = self._socket.accept()
+
+            # Set the timeout
+            client_socket.settimeout(self._TIMEOUT)
+            self._configure_client(client_socket)
+
+            # Create the client's queue and start sending the frames
+            subscriber = Subscriber(self._queue_size, self._drop)
+            self._add_subscriber(subscriber, address)
+            Thread(target=self._serve_subscriber, args=(client_socket, address, subscriber), daemon=True).start()
+
+    def _serve_subscriber(self, client_socket, address, subscriber):
+        """
+
+        Function used to keep sending the queued frames to a client, until the connection is lost.
+
+        :param client_socket: Socket of the client
+        :param address: Address of the client
+        :param subscriber: Queue of the client
+
+        """
+
+        try:
+            while True:
+
+                # Wait for the next frame, the broadcast is repeated regularly so there's always one eventually
+                message = subscriber.get(self._TIMEOUT)
+
+                if message is not None:
+                    client_socket.sendall(message)
+                    self._sent.add()
+
+        except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError, timeout):
+            pass
+
+        # Stop queueing the frames and close the connection
+        self._remove_subscriber(subscriber, address)
+        client_socket.close()
+
+    def _on_datagram(self, address):
+        """
+
+        Function used to subscribe an address to the datagrams, or keep its subscription alive.
+
+        :param address: Address the datagram was received from
+
+        """
+
+        with self._subscribers_lock:
+            subscribed = address in self._peers
+            self._peers[address] = monotonic()
+
+        # Count the new address, and send the current frame to it straight away
+        if not subscribed:
+            self._connections.add()
+            self._new_frame.set()
+            self._encoded_number = 0
+            print("Client with address {} subscribed to the datagrams".format(address))
+
+    def _publish_datagrams(self):
+        """
+
+        Function used to encode the latest frame once, and send its datagrams to each subscribed address.
+
+        """
+
+        now = monotonic()
+
+        # Forget the addresses which haven't been heard from within the timeout
+        with self._subscribers_lock:
+            expired = [address for address, time in self._peers.items() if now - time > self._TIMEOUT]
+            for address in expired:
+                del self._peers[address]
+            peers = tuple(self._peers)
+
+        for address in expired:
+            print("Video stream to {} address timed out".format(address))
+
+        # Don't encode the frames if nobody is watching
+        if not peers:
+            return
+
+        # Split the frame into datagrams, sharing the encoded frame's memory
+        datagrams = self._fragmenter.fragment(self._encoded_frame())
+
+        for address in peers:
+            for datagram in datagrams:
+
+                # Send the datagram, give up on the rest of the frame in case of errors (for example a full buffer)
+                try:
+                    self._socket.sendmsg(datagram, (), 0, address)
+                except OSError:
+                    self._dropped.add()
+                    break
+
+            else:
+                self._sent.add()
+
+    def _listen_udp(self):
+        """
+
+        Function used to receive the subscriptions and run a thread sending the datagrams.
+
+        """
+
+        # Start publishing the frames
+        Thread(target=self._send_datagrams, daemon=True).start()
+
+        # Inform that the stream is ready to receive subscriptions
+        print("{} is waiting for datagrams...".format(self._socket.getsockname()))
+
+        while True:
+
+            # Wait for a datagram, ignore the errors caused by the datagrams sent to closed ports
+            try:
+                _, address = self._socket.recvfrom(self._DATAGRAM_SIZE)
+            except ConnectionResetError:
+                continue
+
+            self._on_datagram(address)
+
+    def _send_datagrams(self):
+        """
+
+        Function used to continuously send the newest frames as datagrams.
+
+        """
+
+        while True:
+
+            # Wait for a new frame, send the current one again if there's none for long (to keep the surface updated)
+            self._wait_frame(self._TIMEOUT)
+            self._publish_datagrams()
+
+    def _receive_datagrams(self):
+        """
+
+        Function used to receive all pending datagrams within the event loop.
+
+        """
+
+        while True:
+            try:
+                _, address = self._socket.recvfrom(self._DATAGRAM_SIZE)
+            except (BlockingIOError, ConnectionResetError):
+                return
+
+            self._on_datagram(address)
+
+    async def _run_udp_async(self):
+        """
+
+        Function used to receive the subscriptions and send the datagrams within the event loop.
+
+        """
+
+        loop = get_event_loop()
+
+        # Receive the datagrams whenever the socket is readable, dropping the datagrams if the socket's buffer is full
+        self._socket.setblocking(False)
+        loop.add_reader(self._socket.fileno(), self._receive_datagrams)
+
+        print("{} is waiting for datagrams...".format(self._socket.getsockname()))
+
+        while True:
+
+            # Wait for a new frame without blocking the event loop (the frames are set from another thread)
+            await loop.run_in_executor(None, self._wait_frame, self._TIMEOUT)
+            self._publish_datagrams()
+
+    async def _broadcast_async(self):
+        """
+
+        Function used to continuously publish the newest frames within the event loop.
+
+        """
+
+        while True:
+
+            # Wait for a new frame without blocking the event loop (the frames are set from another thread)
+            await get_event_loop().run_in_executor(None, self._wait_frame, self._TIMEOUT)
+            self._publish()
+
+    async def _on_connection_async(self, reader, writer):
+        """
+
+        Function used to run a connection with a client within the event loop.
+
+        :param reader: Stream to receive the data from
+        :param writer: Stream to send the data to
+
+        """
+
+        # Handle the single client as the server does, unless fanning out
+        if self._transport != "fanout":
+            return await super()._on_connection_async(reader, writer)
+
+        address = writer.get_extra_info("peername")
+
+        # Limit the data buffered by the event loop as well
+        self._configure_client(writer.get_extra_info("socket"))
+        writer.transport.set_write_buffer_limits(self._SEND_BUFFER_SIZE)
+
+        # Create the client's queue, waking up this task whenever a frame is queued (always from the event loop)
+        queued = AsyncEvent()
+        subscriber = Subscriber(self._queue_size, self._drop, queued.set)
+        self._add_subscriber(subscriber, address)
+
+        try:
+            while True:
+
+                # Wait for the next frame, the broadcast is repeated regularly so there's always one eventually
+                await queued.wait()
+                queued.clear()
+
+                # Send all queued frames, wait while the stream is backed up
+                message = subscriber.get(0)
+                while message is not None:
+                    writer.write(message)
+                    await wait_for(writer.drain(), self._TIMEOUT)
+                    self._sent.add()
+                    message = subscriber.get(0)
+
+        except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError, TimeoutError):
+            pass
+
+        # Stop queueing the frames and close the connection
+        self._remove_subscriber(subscriber, address)
+        writer.close()
+
+    def _on_surface_connected(self):
+        """
+
+        Function used to reset the state of the connection when a new client connects.
+
+        """
+
+        super()._on_surface_connected()
+
+        # Limit the data in flight and disable the delay of small packets when streaming
+        if self._transport == "stream":
+
+            # Allow frames bigger than the default message size
+            self._parser = FrameParser(self._framing, max_size=self._MAX_FRAME_SIZE)
+
+            # Retrieve the socket (the event loop's connections are represented by their writers)
+            if isinstance(self._client_socket, socket):
+                client_socket = self._client_socket
+            else:
+                client_socket = self._client_socket.get_extra_info("socket")
+                self._client_socket.transport.set_write_buffer_limits(self._SEND_BUFFER_SIZE)
+
+            self._configure_client(client_socket)
+
+            # Send the current frame to the new client straight away
+            self._new_frame.set()
+            self._encoded_number = 0
+
     def _on_surface_disconnected(self):
         """
 
@@ -126,3 +845,18 @@ class VideoStream(Server):
 
         # Start the video stream process
         self._process.start()
+
+    async def run_async(self):
+        """
+
+        Function used to run the stream within the running event loop, instead of a separate thread.
+
+        """
+
+        # Publish the frames alongside serving the clients when fanning out
+        if self._transport == "fanout":
+            await gather(self._listen_high_level_async(), self._broadcast_async())
+        elif self._transport == "udp":
+            await self._run_udp_async()
+        else:
+            await self._listen_high_level_async()
@@ -1,19 +1,23 @@
+from time import monotonic, sleep
+
+# Mark the start of the program, so the imports are measured too
+STARTED = monotonic()
+
 import communication.data_manager as dm
+from communication.metrics import Phases, StatsService
 from communication.server import Server
-from communication.video_stream import VideoStream
-from cv2 import VideoCapture
-from time import sleep
 
+# Declare how the communication is run - "process" for a process per link, "asyncio" for a single event loop
+RUNTIME = "process"
 
-# TODO: Remove this test script
-def blocking_test_video_stream(streams):
-    caps = []
-    for iterator, stream in enumerate(streams):
-        caps.append(VideoCapture(iterator))
-    while True:
-        for iterator, stream in enumerate(streams):
-            ret, frame = caps[iterator].read()
-            stream.frame = frame
+# Declare the interval (seconds) of the metrics' summary lines, the metrics are also served on the stats socket
+STATS_INTERVAL = 10
+
+# Declare the directory the cameras are recorded into on board, served to fetch the recordings after the dive
+RECORDINGS = "recordings"
+
+# Declare the Raspberry Pi's address on the tether, the recordings are served only there (without authentication)
+TETHER_IP = "169.254.147.140"
 
 
 # TODO: Remove this test script
@@ -25,17 +29,62 @@ def blocking_test_text_debug():
 
 if __name__ == "__main__":
 
+    # Measure each phase of the start-up, reported by the 'startup.<phase>' gauges
+    phases = Phases("startup", STARTED)
+    phases.mark("imports")
+
+    # Keep the data in memory if all communication runs within a single process
+    if RUNTIME == "asyncio":
+        dm.use_backend("memory")
+
     # Clear the cache on start
     dm.clear()
+    phases.mark("data")
 
-    # Initialise the server
+    # Initialise the server, and bring the control up first (the processes must be started before any threads)
     server = Server()
+    if RUNTIME != "asyncio":
+        server.run()
+    phases.mark("control")
+
+    # Import the video only once the control is up, since it imports asyncio and (on the first frame) OpenCV
+    from communication.capture import CaptureService
+    from communication.video_stream import VideoStream
+    from communication.video_recorder import DISK_QUOTA, VideoRecorder, serve
+    from threading import Thread
+
+    # Initialise the capture of each camera
+    capture = CaptureService((0, 1))
 
     # Initialise the video streams
-    video_stream = VideoStream()
-    vs = VideoStream(port=50002)
+    video_stream = VideoStream(source=capture.ring(0))
+    vs = VideoStream(port=50002, source=capture.ring(1))
+
+    # Record each camera on board (sharing the disk quota), so the footage isn't lost if the tether's link drops, and
+    # serve the recordings on the tether only
+    recorders = [VideoRecorder(capture.ring(index), RECORDINGS, name="camera{}".format(index), quota=DISK_QUOTA // 2)
+                 for index in range(2)]
+    for recorder in recorders:
+        recorder.start()
+    Thread(target=serve, args=(RECORDINGS, TETHER_IP), daemon=True).start()
+
+    # Initialise the service serving and summarising the metrics
+    stats = StatsService(interval=STATS_INTERVAL)
 
     # Start the tasks
-    server.run()
-    video_stream.run()
-    vs.run()
+    if RUNTIME == "asyncio":
+        from communication.runtime import AsyncRuntime
+
+        capture.start()
+        stats.start()
+        phases.mark("video")
+        print(phases.summary())
+
+        AsyncRuntime(server, video_stream, vs).run()
+    else:
+        capture.start()
+        video_stream.run()
+        vs.run()
+        stats.start()
+        phases.mark("video")
+        print(phases.summary())
@@ -0,0 +1,51 @@
+from communication.control import ControlChannel
+from multiprocessing import get_context
+
+
+def test_submit_and_confirm():
+    channel = ControlChannel(("Thr_FS", "Thr_FP"))
+    assert channel.keys == ("Thr_FP", "Thr_FS")
+    assert channel.read() == (0, 0, 0.0, {})
+
+    # Each submission is numbered and pending until confirmed
+    assert channel.submit({"Thr_FP": 1700, "Sen_IMU_X": 1.0}, 12.5) == 1
+    assert channel.read() == (1, 0, 12.5, {"Thr_FP": 1700})
+
+    channel.confirm(1, 42)
+    assert channel.read() == (1, 42, 12.5, {"Thr_FP": 1700})
+
+
+def test_unchanged_commands_are_skipped():
+    channel = ControlChannel(("Thr_FP", "Thr_FS"))
+    channel.submit({"Thr_FP": 1700}, 1.0)
+
+    assert channel.submit({"Thr_FP": 1700}, 2.0) == 0
+    assert channel.submit({"Thr_FP": 1700, "Thr_FS": 1300}, 3.0) == 2
+    assert channel.read()[3] == {"Thr_FP": 1700, "Thr_FS": 1300}
+
+
+def test_newer_submission_stays_pending():
+    channel = ControlChannel(("Thr_FP",))
+    channel.submit({"Thr_FP": 1600}, 1.0)
+    channel.submit({"Thr_FP": 1700}, 2.0)
+
+    # The first submission's transaction can't confirm the second one
+    channel.confirm(1, 10)
+    assert channel.read()[:2] == (2, 0)
+
+
+def test_oversized_values_are_ignored():
+    channel = ControlChannel(("Thr_FP",))
+
+    assert channel.submit({"Thr_FP": "x" * 9}, 1.0) == 0
+    assert channel.read()[3] == {}
+
+
+def test_commands_are_shared_with_forked_processes():
+    channel = ControlChannel(("Thr_FP",))
+
+    process = get_context("fork").Process(target=channel.submit, args=({"Thr_FP": 1800}, 5.0))
+    process.start()
+    process.join()
+
+    assert channel.read() == (1, 0, 5.0, {"Thr_FP": 1800})
@@ -0,0 +1,46 @@
+import communication.data_manager as dm
+from communication.storage import _NAME_SIZE
+import pytest
+
+
+@pytest.fixture
+def manager():
+    return dm.DataManager()
+
+
+def test_surface_data_is_routed_to_the_arduino(manager):
+    version = manager.set_many(dm.SURFACE, {"Thr_FP": 1600, "Sen_IMU_X": 0.5})
+
+    data, read_version = manager.get_many(dm.ARDUINO_T, ["Thr_FP"], transmit=True)
+    assert data == {"Thr_FP": 1600} and read_version == version
+    assert manager.last_command(dm.ARDUINO_T)[0] == 1
+
+
+def test_output_values_must_fit_unsigned_16_bits(manager):
+
+    # The negative and oversized outputs used to reach the binary encoder, crashing the Arduino's process
+    for value in (-1, 1 << 16, 1500.5, "1500"):
+        with pytest.raises(ValueError):
+            manager.set_many(dm.SURFACE, {"Thr_FP": value})
+
+    manager.set_many(dm.SURFACE, {"Thr_FP": 0xFFFF})
+    assert manager.get_many(dm.ARDUINO_T, ["Thr_FP"], transmit=True)[0] == {"Thr_FP": 0xFFFF}
+
+
+def test_rejected_change_leaves_no_pending_command(manager):
+    manager.set_many(dm.SURFACE, {"Thr_FP": 1500})
+
+    # A key which can't be stored rejects the whole change, its commands must never reach the Arduino
+    with pytest.raises(ValueError):
+        manager.set_many(dm.SURFACE, {"Thr_FP": 1700, "k" * (_NAME_SIZE + 1): 1})
+
+    assert manager.get_many(dm.ARDUINO_T, ["Thr_FP"], transmit=True)[0] == {"Thr_FP": 1500}
+    assert manager.last_command(dm.ARDUINO_T)[0] == 1
+
+
+def test_arduino_data_is_forwarded_to_the_surface(manager):
+    key = dm.transmission_keys(dm.SURFACE)[0]
+    manager.set_many(dm.ARDUINO_I, {key: 1.5, "Unknown": 1})
+
+    assert manager.get_many(dm.SURFACE, [key, "Unknown"])[0] == {key: 1.5}
+    assert manager.get_many(dm.ARDUINO_I, [key, "Unknown"])[0] == {key: 1.5, "Unknown": 1}
@@ -0,0 +1,39 @@
+from communication.delta import DeltaEncoder
+
+
+def test_changed_values_only():
+    encoder = DeltaEncoder()
+
+    assert encoder.encode({"Thr_FP": 1500, "Thr_FS": 1500}, 7) == ({"Thr_FP": 1500, "Thr_FS": 1500}, True)
+    encoder.acknowledge()
+
+    assert encoder.encode({"Thr_FP": 1600, "Thr_FS": 1500}, 8) == ({"Thr_FP": 1600}, False)
+    encoder.acknowledge()
+
+    # Nothing is sent if the version hasn't changed
+    assert encoder.encode({"Thr_FP": 1600, "Thr_FS": 1500}, 8) == ({}, False)
+
+
+def test_unacknowledged_changes_are_sent_again():
+    encoder = DeltaEncoder()
+    encoder.encode({"a": 1, "b": 1}, 1)
+    encoder.acknowledge()
+
+    # The change is lost, so it's sent again together with the next one
+    encoder.encode({"a": 2, "b": 1}, 2)
+    assert encoder.encode({"a": 2, "b": 3}, 3) == ({"a": 2, "b": 3}, False)
+
+
+def test_keyframes():
+    encoder = DeltaEncoder(keyframe_interval=3)
+    flags = []
+
+    for version in range(1, 8):
+        flags.append(encoder.encode({"a": version}, version)[1])
+        encoder.acknowledge()
+
+    assert flags == [True, False, False, True, False, False, True]
+
+    # The full data is sent after a reset
+    encoder.reset()
+    assert encoder.encode({"a": 7}, 7) == ({"a": 7}, True)
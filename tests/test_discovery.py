@@ -0,0 +1,65 @@
+from communication.discovery import PortRegistry, identify
+from communication.serial_protocol import HANDSHAKE
+from threading import Event, Thread
+from time import monotonic
+import os
+import pty
+import tty
+import pytest
+
+
+@pytest.fixture
+def device():
+
+    # Open a pseudo-terminal standing in for the Arduino, the test drives the master side
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    stop = Event()
+
+    yield master, os.ttyname(slave), stop
+
+    stop.set()
+    os.close(master)
+    os.close(slave)
+
+
+def _serve(master: int, stop: Event, reply: bytes, stream=b""):
+
+    # Wait for the handshake, reply to it, then keep sending the stream (if any) until stopped
+    received = b""
+    while HANDSHAKE not in received:
+        received += os.read(master, 1024)
+
+    os.write(master, reply)
+    while stream and not stop.wait(0.02):
+        os.write(master, stream)
+
+
+def test_identify_from_the_handshake_reply(device):
+    master, port, stop = device
+    Thread(target=_serve, args=(master, stop, b'{"protocol": "binary", "deviceID": "Ard_T"}\n'), daemon=True).start()
+
+    arduino_id, serial = identify(port, 2)
+    assert arduino_id == "Ard_T" and serial.is_open
+    serial.close()
+
+
+def test_identify_gives_up_on_a_streaming_device(device):
+    master, port, stop = device
+    Thread(target=_serve, args=(master, stop, b'{"depth": 1}\n', b'{"depth": 1}\n'), daemon=True).start()
+
+    # The device never goes quiet and never sends its identifier, so only the timeout ends the identification
+    start = monotonic()
+    assert identify(port, 1) == (None, None)
+    assert monotonic() - start < 1.5
+
+
+def test_reserve_claims_a_free_port_only():
+    registry = PortRegistry(("Ard_T", "Ard_M"))
+
+    assert registry.reserve("Ard_T", "/dev/ttyACM0")
+    assert not registry.reserve("Ard_M", "/dev/ttyACM0")
+    assert registry.reserve("Ard_M", "/dev/ttyACM1")
+
+    registry.release("Ard_T")
+    assert registry.claimed() == {"/dev/ttyACM1"}
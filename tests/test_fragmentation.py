@@ -0,0 +1,61 @@
+from communication.fragmentation import Fragmenter, Reassembler, HEADER
+import pytest
+
+MESSAGE = bytes(range(256)) * 40
+
+
+def _datagrams(fragmenter, message=MESSAGE) -> list:
+    return [b"".join(datagram) for datagram in fragmenter.fragment(message)]
+
+
+def test_round_trip():
+    reassembler = Reassembler()
+    datagrams = _datagrams(Fragmenter(datagram_size=HEADER.size + 100))
+
+    assert len(datagrams) == len(MESSAGE) // 100 + 1
+    assert [reassembler.feed(datagram) for datagram in datagrams[::-1]][-1] == MESSAGE
+
+
+def test_empty_message():
+    assert Reassembler().feed(_datagrams(Fragmenter(), b"")[0]) == b""
+
+
+def test_parity_recovers_a_lost_fragment_in_each_group():
+    reassembler = Reassembler()
+    datagrams = _datagrams(Fragmenter(datagram_size=HEADER.size + 100, fec=4))
+
+    # 103 fragments in 26 groups, drop the first fragment of each group
+    count = len(MESSAGE) // 100 + 1
+    assert len(datagrams) == count + 26
+    received = [datagram for index, datagram in enumerate(datagrams) if index >= count or index % 4]
+
+    # The message is completed once, as soon as the last lost fragment is recovered
+    results = [reassembler.feed(datagram) for datagram in received]
+    assert results.count(MESSAGE) == 1 and results.count(None) == len(received) - 1
+    assert reassembler.recovered == 26
+
+
+def test_lost_message_is_dropped():
+    fragmenter = Fragmenter(datagram_size=HEADER.size + 100, fec=4)
+    reassembler = Reassembler()
+
+    # Two fragments of a group can't be recovered, the message is dropped once the next one completes
+    lost = _datagrams(fragmenter)
+    for datagram in lost[2:]:
+        assert reassembler.feed(datagram) is None
+
+    assert MESSAGE in [reassembler.feed(datagram) for datagram in _datagrams(fragmenter)]
+    assert reassembler.dropped == 1
+
+    # The late fragments of the dropped message are ignored
+    assert reassembler.feed(lost[0]) is None and reassembler.feed(lost[1]) is None
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError):
+        Fragmenter(datagram_size=HEADER.size)
+
+    with pytest.raises(ValueError):
+        Fragmenter(fec=256)
+
+    assert Reassembler().feed(b"\x00") is None
@@ -0,0 +1,57 @@
+from communication.framing import FrameParser, FramingError
+import pytest
+
+
+def test_length_framing_round_trip():
+    parser = FrameParser("length")
+    stream = parser.frame(b"{}") + parser.frame(b"") + parser.frame(b"abc")
+
+    assert parser.feed(stream) == [b"{}", b"", b"abc"]
+
+
+def test_length_framing_partial_messages():
+    parser = FrameParser("length")
+    stream = parser.frame(b"hello") + parser.frame(b"world")
+
+    # Feed the stream byte by byte, the messages are completed by their last bytes only
+    messages = []
+    for i in range(len(stream)):
+        messages += parser.feed(stream[i:i + 1])
+
+    assert messages == [b"hello", b"world"]
+
+
+def test_prefix_matches_frame():
+    parser = FrameParser("length")
+
+    assert parser.prefix(3) + b"abc" == parser.frame(b"abc")
+
+    with pytest.raises(ValueError):
+        FrameParser("newline").prefix(3)
+
+
+def test_newline_framing():
+    parser = FrameParser("newline")
+
+    # The empty messages are skipped, and the partial one is buffered
+    assert parser.feed(b'{"a": 1}\n\n  \n{"b"') == [b'{"a": 1}']
+    assert parser.feed(b': 2}\n') == [b'{"b": 2}']
+    assert parser.frame(b"{}") == b"{}\n"
+
+
+def test_message_too_big():
+    parser = FrameParser("length", max_size=4)
+
+    with pytest.raises(FramingError):
+        parser.frame(b"12345")
+
+    with pytest.raises(FramingError):
+        parser.feed(FrameParser("length").frame(b"12345"))
+
+    # The parser recovers once the buffer is dropped
+    assert parser.feed(parser.frame(b"1234")) == [b"1234"]
+
+
+def test_unsupported_mode():
+    with pytest.raises(ValueError):
+        FrameParser("xml")
@@ -0,0 +1,44 @@
+from communication.heartbeat import Heartbeat, HEARTBEAT_TIMEOUT, SURFACE_INTERVAL
+from multiprocessing import get_context
+from time import monotonic, sleep
+
+
+def test_default_threshold_is_a_few_surface_intervals():
+    assert SURFACE_INTERVAL < HEARTBEAT_TIMEOUT < 0.1
+
+
+def test_expires_without_beats():
+    heartbeat = Heartbeat(0.05)
+
+    # The surface wasn't heard from yet
+    assert heartbeat.expired
+
+    heartbeat.beat()
+    assert not heartbeat.expired and heartbeat.deadline <= monotonic() + 0.05
+
+    sleep(0.06)
+    assert heartbeat.expired
+
+
+def test_reset_expires_straight_away():
+    heartbeat = Heartbeat(10)
+    heartbeat.beat()
+    heartbeat.reset()
+
+    assert heartbeat.expired
+
+
+def test_disabled_never_expires():
+    heartbeat = Heartbeat(None)
+
+    assert not heartbeat.expired and heartbeat.timeout is None
+
+
+def test_beats_are_shared_with_forked_processes():
+    heartbeat = Heartbeat(10)
+
+    process = get_context("fork").Process(target=heartbeat.beat)
+    process.start()
+    process.join()
+
+    assert not heartbeat.expired
@@ -0,0 +1,50 @@
+from communication.message_encoding import CodecError, JsonCodec, MsgpackCodec
+import sys
+import pytest
+
+DATA = {"Thr_FP": 1500, "Sen_IMU_X": -0.125, "name": "rov", "flags": [True, None]}
+
+
+def test_json_round_trip():
+    codec = JsonCodec()
+
+    assert codec.decode(codec.encode(DATA)) == DATA
+    assert codec.decode(b" \n") is None
+    assert codec.decode(b"\xff") is None
+
+
+def test_json_corrupted_messages():
+    for message in (b"{", b"[1, 2]"):
+        with pytest.raises(CodecError):
+            JsonCodec().decode(message)
+
+
+def test_msgpack_requires_the_package(monkeypatch):
+
+    # Make the import fail, as if the package wasn't installed
+    monkeypatch.setitem(sys.modules, "msgpack", None)
+
+    with pytest.raises(CodecError):
+        MsgpackCodec()
+
+
+def test_msgpack_round_trip():
+    pytest.importorskip("msgpack")
+    codec = MsgpackCodec()
+
+    assert codec.encode({"Thr_FP": 1500}) == b"\x81\xa6Thr_FP\xcd\x05\xdc"
+    assert codec.decode(codec.encode(DATA)) == DATA
+    assert codec.decode(b"") is None
+
+
+def test_msgpack_corrupted_messages():
+    pytest.importorskip("msgpack")
+    codec = MsgpackCodec()
+
+    # Truncated message, a message not holding a dictionary, and a dictionary with keys which aren't strings
+    for message in (b"\x81\xa6Thr_FP\xcd\x05", b"\x92\x01\x02", b"\x81\x01\x02"):
+        with pytest.raises(CodecError):
+            codec.decode(message)
+
+    with pytest.raises(CodecError):
+        codec.encode({"a": object()})
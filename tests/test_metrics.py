@@ -0,0 +1,56 @@
+from communication.metrics import Counter, Gauge, Histogram, snapshot, summary
+from multiprocessing import get_context
+
+
+def test_counter_sums_the_shards_of_all_processes():
+    counter = Counter("test.counter")
+    counter.add()
+
+    # Each process writes into its own shard, the same name is the same counter in any process
+    process = get_context("fork").Process(target=lambda: Counter("test.counter").add(5))
+    process.start()
+    process.join()
+
+    assert snapshot()["counters"]["test.counter"] == 6
+
+
+def test_gauge_holds_the_latest_value():
+    gauge = Gauge("test.gauge")
+    gauge.set(1.5)
+    gauge.set(2.5)
+
+    assert snapshot()["gauges"]["test.gauge"] == 2.5
+
+
+def test_histogram_percentiles_are_accurate():
+    histogram = Histogram("test.histogram")
+    for value in range(1, 1001):
+        histogram.record(value / 1000000)
+
+    # The times are reported in milliseconds, within the precision of the buckets
+    statistics = snapshot()["histograms"]["test.histogram"]
+    assert statistics["count"] == 1000 and statistics["max"] == 1.0
+    assert abs(statistics["mean"] - 0.5005) < 0.001
+    assert abs(statistics["p50"] - 0.5) < 0.5 * 0.03
+    assert abs(statistics["p99"] - 0.99) < 0.99 * 0.03
+
+
+def test_histogram_times_the_context():
+    histogram = Histogram("test.timed")
+    with histogram.time():
+        pass
+
+    assert snapshot()["histograms"]["test.timed"]["count"] == 1
+
+
+def test_summary_shows_the_counters_rates():
+    counter = Counter("test.rate")
+    previous = snapshot()
+    counter.add(10)
+
+    # Pretend a second passed between the snapshots
+    current = snapshot()
+    current["time"] = previous["time"] + 1
+
+    assert "test.rate 10" in summary(current)
+    assert "test.rate 10.0/s" in summary(current, previous)
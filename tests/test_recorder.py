@@ -0,0 +1,69 @@
+import communication.data_manager as dm
+from communication.metrics import snapshot
+from communication.recorder import Recorder, read_recording, replay
+from multiprocessing import get_context
+
+
+def _dropped() -> int:
+    return snapshot()["counters"].get("recorder.dropped", 0)
+
+
+def test_changes_are_read_back_in_order(tmp_path):
+    recorder = Recorder(str(tmp_path))
+    recorder.record(dm.SURFACE, {"Thr_FP": 1700, "status_T": True}, 1.0)
+    recorder.record(dm.ARDUINO_I, {"Sen_IMU_X": 0.25, "error_I": "x" * 100}, 2.0)
+    recorder.close()
+
+    # Long values continue in the following records
+    assert list(read_recording(str(tmp_path))) == [
+        (1.0, dm.SURFACE, {"Thr_FP": 1700, "status_T": True}),
+        (2.0, dm.ARDUINO_I, {"Sen_IMU_X": 0.25, "error_I": "x" * 100})
+    ]
+
+
+def test_full_segments_rotate(tmp_path):
+    recorder = Recorder(str(tmp_path), segment_size=64 * 4)
+    for timestamp in range(10):
+        recorder.record(dm.SURFACE, {"Thr_FP": timestamp}, float(timestamp))
+    recorder.close()
+
+    assert len(list(tmp_path.iterdir())) == 4
+    assert [change[0] for change in read_recording(str(tmp_path))] == [float(t) for t in range(10)]
+
+
+def test_processes_are_merged_by_time(tmp_path):
+    recorder = Recorder(str(tmp_path))
+    recorder.record(dm.SURFACE, {"Thr_FP": 1}, 1.0)
+
+    # The forked process writes its own segments
+    process = get_context("fork").Process(target=recorder.record, args=(dm.ARDUINO_T, {"Thr_FP": 2}, 0.5))
+    process.start()
+    process.join()
+    recorder.close()
+
+    assert [change[1] for change in read_recording(str(tmp_path))] == [dm.ARDUINO_T, dm.SURFACE]
+
+
+def test_unrecordable_changes_are_dropped_and_counted(tmp_path):
+    recorder = Recorder(str(tmp_path), segment_size=64 * 4)
+    dropped = _dropped()
+
+    recorder.record(dm.SURFACE, {"k" * 33: 1}, 1.0)
+    recorder.record(dm.SURFACE, {"status_T": "x" * 500}, 2.0)
+    recorder.record(dm.SURFACE, {"status_T": 1}, 3.0)
+    recorder.close()
+
+    assert _dropped() == dropped + 2
+    assert list(read_recording(str(tmp_path))) == [(3.0, dm.SURFACE, {"status_T": 1})]
+
+
+def test_replay(tmp_path):
+    recorder = Recorder(str(tmp_path))
+    recorder.record(dm.SURFACE, {"Thr_FP": 1600}, 1.0)
+    recorder.record(dm.SURFACE, {"Thr_FP": 1700}, 1.05)
+    recorder.close()
+
+    # Replay at the original pace into a function of our own
+    changes = []
+    assert replay(str(tmp_path), set_many=lambda index, data: changes.append((index, data))) == 2
+    assert changes == [(dm.SURFACE, {"Thr_FP": 1600}), (dm.SURFACE, {"Thr_FP": 1700})]
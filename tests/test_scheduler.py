@@ -0,0 +1,64 @@
+from communication.scheduler import Scheduler
+from time import sleep
+
+
+def _exchange(scheduler: Scheduler, replied=True, duration=0.0) -> float:
+
+    # Run a single exchange taking the given time
+    scheduler.start()
+    sleep(duration)
+    return scheduler.finish(replied)
+
+
+def test_first_exchange_starts_straight_away():
+    scheduler = Scheduler("test.first", 100, 0.05, 0.02)
+
+    assert scheduler.earliest == scheduler.latest == 0.0
+    assert scheduler.timeout == 0.05
+
+
+def test_exchanges_are_paced_by_the_rate_and_the_keep_alive():
+    scheduler = Scheduler("test.paced", 100, 0.05, 0.2)
+    _exchange(scheduler)
+
+    # Never faster than the target rate, at least once per keep-alive interval
+    assert abs(scheduler.earliest - scheduler.latest + 0.19) < 1e-9
+
+
+def test_missed_exchanges_back_off_up_to_the_maximum():
+    scheduler = Scheduler("test.backoff", 100, 0.05, 0.02)
+
+    _exchange(scheduler, replied=False)
+    assert scheduler.interval == 0.02 and scheduler.timeout == 0.1
+
+    for _ in range(10):
+        _exchange(scheduler, replied=False)
+    assert scheduler.interval == 0.08 and scheduler.timeout == 0.4
+
+    # Each exchange completed in time tightens the schedule towards the target
+    _exchange(scheduler)
+    assert abs(scheduler.interval - 0.072) < 1e-9
+
+    for _ in range(100):
+        _exchange(scheduler)
+    assert scheduler.interval == 0.01 and scheduler.timeout == 0.05
+
+
+def test_exchange_past_the_deadline_backs_off():
+    scheduler = Scheduler("test.deadline", 100, 0.01, 0.02)
+
+    assert _exchange(scheduler, duration=0.02) > 0.01
+    assert scheduler.interval == 0.02
+
+
+def test_fit_lengthens_the_deadline_and_the_timeout():
+    scheduler = Scheduler("test.fit", 100, 0.01, 0.02)
+    scheduler.fit(0.05)
+
+    # The exchange lasting longer than the original deadline is still in time
+    _exchange(scheduler, duration=0.02)
+    assert scheduler.deadline == 0.05 and scheduler.interval == 0.01
+
+    # The timeout may exceed its maximum to fit a single exchange
+    scheduler.fit(2)
+    assert scheduler.timeout == 2
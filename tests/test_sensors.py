@@ -0,0 +1,26 @@
+import communication.data_manager as dm
+from communication.sensors import SensorPipeline, SENSORS, TIMESTAMPS
+
+
+def test_readings_are_published_at_the_rate():
+    pipeline = SensorPipeline(dm.ARDUINO_I, rate=10, filters=())
+
+    # The first reading is published straight away, together with its time
+    assert pipeline.process({"Sen_IMU_X": 0.5, "status_I": 1}, 0.0) == {"status_I": 1, "Sen_IMU_X": 0.5,
+                                                                         "time_I": 0.0}
+
+    # The next readings are only kept until the next publishing interval
+    assert pipeline.process({"Sen_IMU_X": 0.75}, 0.05) == {}
+    assert pipeline.process({"Sen_IMU_X": 1.0}, 0.15) == {"Sen_IMU_X": 1.0, "time_I": 0.15}
+
+
+def test_invalid_readings_are_dropped():
+    pipeline = SensorPipeline(dm.ARDUINO_I, filters=())
+
+    assert pipeline.process({"Sen_IMU_X": float("nan"), "Sen_IMU_Y": "1", "Sen_IMU_Z": True}, 1.0) == {}
+
+
+def test_timestamps_only_reach_the_surface():
+    for key in TIMESTAMPS.values():
+        assert key in dm.transmission_keys(dm.SURFACE)
+        assert all(key not in dm.transmission_keys(index) for index in SENSORS)
@@ -0,0 +1,105 @@
+import communication.data_manager as dm
+from communication.serial_protocol import BinaryProtocol, ProtocolError, DEVICES, HEADER_SIZE, SYNC, accepts_binary, \
+    handshake_id, handshake_line
+from binascii import crc_hqx
+from io import BytesIO
+from struct import Struct
+import pytest
+
+
+# Declare the layouts of the values sent by the Arduino, by the types of their keys (untyped keys are 32-bit floats)
+LAYOUTS = {"float64": "d", None: "f"}
+
+
+def _received_frame(values: dict, device=dm.ARDUINO_T) -> bytes:
+
+    # Build a frame as the Arduino does, holding the given values of the surface's transmission keys in their types
+    keys = BinaryProtocol(device).received_keys
+    types = dm.key_types()
+    bits = sorted(keys.index(key) for key in values)
+    body = Struct("<BI").pack(DEVICES.index(device), sum(1 << bit for bit in bits))
+    layout = Struct("<" + "".join(LAYOUTS[types.get(keys[bit])] for bit in bits))
+    body += layout.pack(*(values[keys[bit]] for bit in bits))
+
+    return SYNC + body + Struct("<H").pack(crc_hqx(body, 0xFFFF))
+
+
+def test_encode_layout_and_checksum():
+    protocol = BinaryProtocol(dm.ARDUINO_T)
+    keys = dm.transmission_keys(dm.ARDUINO_T)
+    frame = protocol.encode({keys[0]: 1500, keys[2]: 1600, "unknown": 1})
+
+    # Sync byte, device byte, bitmap of the keys present, their values and the checksum of everything but the sync
+    assert frame[:1] == SYNC
+    device, bitmap = Struct("<BI").unpack_from(frame, 1)
+    assert device == 0 and bitmap == 0b101
+    assert Struct("<HH").unpack_from(frame, 1 + HEADER_SIZE) == (1500, 1600)
+    assert Struct("<H").unpack(frame[-2:])[0] == crc_hqx(frame[1:-2], 0xFFFF)
+
+
+def test_decode_round_trip():
+    protocol = BinaryProtocol(dm.ARDUINO_T)
+    keys = protocol.received_keys
+    frame = _received_frame({keys[0]: 0.5, keys[-1]: -2.25})
+
+    # Read the frame after some noise, as the non-blocking readers do (the IMU's value is a 64-bit float)
+    header = frame[1:1 + HEADER_SIZE]
+    assert keys[0].startswith("Sen_IMU_") and protocol.payload_size(header) == 8 + 4 + 2
+    assert protocol.decode(header, frame[1 + HEADER_SIZE:]) == {keys[0]: 0.5, keys[-1]: -2.25,
+                                                                "deviceID": dm.ARDUINO_T}
+    assert protocol.read(BytesIO(b"\x00\x01" + frame)) == {keys[0]: 0.5, keys[-1]: -2.25, "deviceID": dm.ARDUINO_T}
+
+    # A read timeout returns no data
+    assert protocol.read(BytesIO(b"")) == {}
+
+
+def test_received_keys_exclude_the_pi_timestamps():
+    keys = BinaryProtocol(dm.ARDUINO_I).received_keys
+
+    assert "time_I" not in keys and "Sen_IMU_X" in keys
+    assert keys == tuple(key for key in dm.transmission_keys(dm.SURFACE) if key != "time_I")
+
+
+def test_corrupted_frames():
+    protocol = BinaryProtocol(dm.ARDUINO_T)
+    keys = protocol.received_keys
+    frame = bytearray(_received_frame({keys[0]: 0.5}))
+
+    # Flip a bit of the value
+    frame[-3] ^= 1
+    with pytest.raises(ProtocolError):
+        protocol.read(BytesIO(bytes(frame)))
+
+    # Cut the frame short
+    with pytest.raises(ProtocolError):
+        protocol.read(BytesIO(bytes(frame[:-1])))
+
+    # Set a bit beyond the keys
+    with pytest.raises(ProtocolError):
+        protocol.payload_size(Struct("<BI").pack(0, 1 << len(keys)))
+
+
+def test_encode_clamps_to_unsigned_16_bits():
+    protocol = BinaryProtocol(dm.ARDUINO_T)
+    keys = dm.transmission_keys(dm.ARDUINO_T)
+
+    # The values out of range used to raise struct.error, crashing the Arduino's process
+    frame = protocol.encode({keys[0]: -1, keys[1]: 70000})
+    assert Struct("<HH").unpack_from(frame, 1 + HEADER_SIZE) == (0, 0xFFFF)
+
+
+@pytest.mark.parametrize("value", ["1500", None, float("nan"), float("inf"), [1500]])
+def test_encode_rejects_invalid_values(value):
+    protocol = BinaryProtocol(dm.ARDUINO_T)
+
+    with pytest.raises(ProtocolError):
+        protocol.encode({dm.transmission_keys(dm.ARDUINO_T)[0]: value})
+
+
+def test_handshake_lines():
+    assert accepts_binary(b'{"protocol": "binary", "deviceID": "Ard_T"}')
+    assert not accepts_binary(b'{"deviceID": "Ard_T"}')
+    assert not accepts_binary(b"\xff")
+    assert handshake_id(b'{"deviceID": "Ard_T"}') == "Ard_T"
+    assert handshake_id(b"[]") is None
+    assert b'"watchdog": 250' in handshake_line(0.25)
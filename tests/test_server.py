@@ -0,0 +1,50 @@
+import communication.data_manager as dm
+from communication.server import Arduino
+from serial import Serial
+import os
+import pty
+import tty
+import pytest
+
+
+@pytest.fixture
+def arduino():
+
+    # Connect to a pseudo-terminal standing in for the Arduino, at the default baud rate
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    serial = Serial(os.ttyname(slave))
+
+    yield Arduino(dm.ARDUINO_T, connection=serial, protocol="json"), master
+
+    serial.close()
+    os.close(master)
+    os.close(slave)
+
+
+def test_deadline_fits_the_largest_exchange_at_the_baud_rate(arduino):
+    arduino, _ = arduino
+    deadline = arduino._scheduler.deadline
+
+    # Binary frames of the thrusters take tens of ms at 9600 baud, JSON lines take far longer
+    arduino._binary = True
+    arduino._fit_schedule()
+    binary = arduino._scheduler.deadline
+    assert binary > deadline and binary == arduino._protocol().exchange_size * 10 / 9600
+
+    arduino._binary = False
+    arduino._fit_schedule()
+    assert arduino._scheduler.deadline > binary and arduino._scheduler.timeout >= arduino._scheduler.deadline
+
+
+def test_json_line_cut_short_is_dropped(arduino):
+    arduino, master = arduino
+    arduino._binary = False
+    arduino._set_timeout(0.05)
+
+    # A reply cut short by the timeout isn't decoded, nor counted as invalid data
+    os.write(master, b'{"status_T": 1')
+    assert arduino._exchange_json() == {}
+
+    os.write(master, b'{"status_T": 2}\n')
+    assert arduino._exchange_json() == {"status_T": 2}
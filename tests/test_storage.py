@@ -0,0 +1,83 @@
+from communication.storage import SharedMemoryBackend, _NAME_SIZE, _SPARE_SLOTS
+from threading import Thread
+import pytest
+
+
+def _backend():
+    return SharedMemoryBackend({0: ("surface", {"axis_x", "axis_y", "name"}, {"axis_x": "int16", "axis_y": "int16"})})
+
+
+def test_update_and_snapshot():
+    backend = _backend()
+
+    with backend.transaction() as version:
+        backend.store(0).update({"axis_x": 10, "axis_y": -20, "name": "rov", "extra": [1, 2]}, version)
+
+    data, read_version = backend.store(0).snapshot()
+    assert data == {"axis_x": 10, "axis_y": -20, "name": "rov", "extra": [1, 2]}
+    assert read_version == version
+
+    # Retrieve a subset of the keys, the unknown keys are skipped
+    assert backend.store(0).snapshot(["axis_y", "missing"])[0] == {"axis_y": -20}
+
+
+def test_typed_value_out_of_range():
+    backend = _backend()
+
+    with pytest.raises(ValueError):
+        with backend.transaction() as version:
+            backend.store(0).update({"axis_x": 1, "axis_y": 1 << 20}, version)
+
+    # Nothing is written if any value doesn't fit
+    assert "axis_x" not in backend.store(0).snapshot()[0]
+
+
+def test_key_too_long_raises_value_error():
+    backend = _backend()
+
+    # The key which can't be stored used to raise KeyError, crashing the surface's process
+    with pytest.raises(ValueError):
+        with backend.transaction() as version:
+            backend.store(0).update({"axis_x": 1, "k" * (_NAME_SIZE + 1): 1}, version)
+
+    assert backend.store(0).snapshot()[0] == {}
+
+
+def test_no_spare_slots_raises_value_error():
+    backend = _backend()
+
+    # Nothing is written if the keys outside of the schema don't fit in the spare slots
+    with pytest.raises(ValueError):
+        with backend.transaction() as version:
+            backend.store(0).update({"key{}".format(i): i for i in range(_SPARE_SLOTS + 1)}, version)
+
+    assert backend.store(0).snapshot()[0] == {}
+
+    # The spare slots are still available afterwards
+    with backend.transaction() as version:
+        backend.store(0).update({"key{}".format(i): i for i in range(_SPARE_SLOTS)}, version)
+
+    assert len(backend.store(0).snapshot()[0]) == _SPARE_SLOTS
+
+
+def test_snapshot_is_consistent_during_writes():
+    backend = _backend()
+    store = backend.store(0)
+    stopped = []
+
+    def write():
+        for i in range(20000):
+            with backend.transaction() as version:
+                store.update({"axis_x": i % 1000, "axis_y": i % 1000, "name": str(i % 1000)}, version)
+        stopped.append(True)
+
+    writer = Thread(target=write)
+    writer.start()
+
+    # Each snapshot must come from a single write, never mixing two of them
+    while not stopped:
+        data, _ = store.snapshot()
+        if data:
+            assert data["axis_x"] == data["axis_y"] == int(data["name"])
+
+    writer.join()
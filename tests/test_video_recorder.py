@@ -0,0 +1,101 @@
+from communication.framing import FrameParser
+from communication.video_recorder import VideoRecorder, list_segments, read_frames, read_index, _HEADER, _ENTRY
+import pytest
+
+
+def _record(directory, frames, **kwargs):
+
+    # Write the frames the way the writer thread does, without any capture
+    recorder = VideoRecorder(None, str(directory), name="camera0", codec="raw", **kwargs)
+    recorder._find_segments()
+    recorder._write_batch(frames)
+    recorder._close_segment()
+
+    return recorder
+
+
+def test_index_and_frames(tmp_path):
+    frames = [(bytes([i]) * (100 + i), i, 10.0 + i / 10) for i in range(1, 21)]
+    _record(tmp_path, frames)
+
+    segments = list_segments(str(tmp_path), "camera0")
+    assert len(segments) == 1
+
+    # Each entry refers to its frame within the segment
+    entries = read_index(segments[0])
+    assert [(size, sequence, timestamp) for _, size, sequence, timestamp in entries] == \
+           [(len(message), sequence, timestamp) for message, sequence, timestamp in frames]
+    assert list(read_frames(segments[0])) == frames
+
+    # Seek to the first frame grabbed at or after the given time
+    assert list(read_frames(segments[0], start=10.95)) == frames[9:]
+    assert list(read_frames(segments[0], start=100)) == []
+
+    # The segment can be parsed without its index as well
+    with open(segments[0], "rb") as f:
+        assert FrameParser("length").feed(f.read()[_HEADER.size:]) == [message for message, _, _ in frames]
+
+
+def test_partial_entry_is_ignored(tmp_path):
+    frames = [(b"frame", i, float(i)) for i in range(1, 4)]
+    _record(tmp_path, frames)
+    segment = list_segments(str(tmp_path), "camera0")[0]
+
+    # Cut the last entry short, as a power cut during the write would
+    index_path = segment[:-len(".vid")] + ".idx"
+    with open(index_path, "r+b") as f:
+        f.truncate(_HEADER.size + 2 * _ENTRY.size + 3)
+
+    assert list(read_frames(segment)) == frames[:2]
+
+
+def test_segments_rotate_and_keep_within_quota(tmp_path):
+    frames = [(b"x" * 1000, i, float(i)) for i in range(1, 41)]
+
+    # Segments span 5 seconds each, and the quota holds only a few of them
+    recorder = _record(tmp_path, frames, segment_duration=5, quota=20000, min_free=0)
+
+    segments = list_segments(str(tmp_path), "camera0")
+    sequences = [entry[2] for segment in segments for entry in read_index(segment)]
+    assert 1 < len(segments) < 8
+    assert sequences == list(range(41 - len(sequences), 41))
+
+    # The numbers continue after the segments already recorded
+    _record(tmp_path, frames[:1], min_free=0)
+    assert list_segments(str(tmp_path), "camera0")[-1].endswith("-{:06d}.vid".format(recorder._number + 1))
+
+
+def test_frames_dropped_below_free_space_floor(tmp_path):
+    recorder = _record(tmp_path, [(b"frame", 1, 1.0)], min_free=1 << 62)
+
+    assert list_segments(str(tmp_path), "camera0") == []
+    assert not recorder._segments
+
+
+def test_invalid_segment(tmp_path):
+    segment = tmp_path / "camera0-000001.vid"
+    segment.write_bytes(b"\x00" * _HEADER.size)
+    (tmp_path / "camera0-000001.idx").write_bytes(b"\x00" * _HEADER.size)
+
+    with pytest.raises(ValueError):
+        read_index(str(segment))
+
+
+def test_frames_recorded_at_most_at_the_rate(tmp_path):
+    from communication.capture import FrameRing
+    from time import monotonic, sleep
+
+    ring = FrameRing()
+    ring.allocate((2, 2, 3), "uint8")
+    recorder = VideoRecorder(ring, str(tmp_path), name="camera0", codec="raw", rate=5, min_free=0)
+    recorder.start()
+
+    # Grab frames at 100 fps for a second, only about 5 of them are recorded
+    for sequence in range(1, 101):
+        index, _ = ring.acquire()
+        ring.commit(index, sequence, monotonic())
+        sleep(0.01)
+
+    recorder.stop()
+    recorded = [entry[2] for segment in list_segments(str(tmp_path), "camera0") for entry in read_index(segment)]
+    assert 3 <= len(recorded) <= 7
@@ -0,0 +1,18 @@
+import communication.server as server
+from communication.video_stream import VideoStream
+from threading import Thread
+import pytest
+
+
+@pytest.mark.parametrize("transport", ["ack", "stream", "fanout", "udp"])
+def test_stream_runs_in_a_thread_without_creating_a_process(monkeypatch, transport):
+
+    # Fail on any attempt to create a process (which imports pathos)
+    def fail(target):
+        raise AssertionError("A process was created")
+
+    monkeypatch.setattr(server, "_process", fail)
+
+    stream = VideoStream(port=0, transport=transport)
+    assert isinstance(stream._process, Thread)
+    stream._socket.close()